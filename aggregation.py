@@ -0,0 +1,161 @@
+import numpy as np
+from dataclasses import dataclass
+
+from classes import History, HISTORY_VARIABLES
+from batch_simulation import WINNERS, REASONS
+from quantiles import QuantileSketch, QUANTILES
+
+def proportion_half_width(successes: int, count: int, z_score=1.96) -> float:
+    # Wilson score interval, which stays honest for shares near 0 or 1
+    p = successes / count
+    return z_score * np.sqrt(p * (1 - p) / count + z_score ** 2 / (4 * count ** 2)) / (1 + z_score ** 2 / count)
+
+def interval_columns(prefix: str, means: np.ndarray, lower_bounds: np.ndarray, upper_bounds: np.ndarray, quantiles: np.ndarray = None) -> dict[str, np.ndarray]:
+    # export columns for (variables x days) interval arrays in HISTORY_VARIABLES order, quantiles is (QUANTILES x variables x days)
+    columns = {}
+    for i, variable in enumerate(HISTORY_VARIABLES):
+        name = "gdp" if variable == "economic_capital" else variable
+        columns[f"{prefix}_{name}"] = means[i]
+        columns[f"{prefix}_{name}_lower"] = lower_bounds[i]
+        columns[f"{prefix}_{name}_upper"] = upper_bounds[i]
+        if quantiles is not None:
+            for q, band in zip(QUANTILES, quantiles):
+                columns[f"{prefix}_{name}_p{round(q * 100):02d}"] = band[i]
+    return columns
+
+RESOLUTIONS = {"daily": 1, "weekly": 7, "monthly": 30}
+WINDOWS = ("sample", "mean")
+PRECISIONS = ("float64", "float32")
+
+@dataclass(slots=True, frozen=True)
+class ExportOptions:
+    resolution: int = 1
+    # "sample" keeps every resolution-th day, "mean" averages each window of resolution days
+    window: str = "sample"
+    precision: str = "float64"
+    # column stems to keep, e.g. "russia_gdp" keeps its mean, bounds and quantiles; None keeps them all
+    columns: tuple[str, ...] = None
+
+    def __post_init__(self) -> None:
+        # checked when the options are built, so a typo fails before any run is simulated
+        if self.columns is not None:
+            unknown = sorted(set(self.columns) - set(column_stems()))
+            if unknown:
+                raise ValueError(f"Unknown export columns: {', '.join(unknown)}; expected stems such as {', '.join(column_stems()[:3])}")
+
+def parse_resolution(value: str) -> int:
+    return RESOLUTIONS[value] if value in RESOLUTIONS else int(value)
+
+def column_stem(name: str) -> str:
+    for suffix in ("_lower", "_upper", *(f"_p{round(q * 100):02d}" for q in QUANTILES)):
+        if name.endswith(suffix):
+            return name[:-len(suffix)]
+    return name
+
+def column_stems() -> list[str]:
+    # every exportable stem, e.g. "russia_gdp", in export order
+    return [f"{side}_{'gdp' if variable == 'economic_capital' else variable}" for side in ("russia", "ukraine") for variable in HISTORY_VARIABLES]
+
+def export_columns(columns: dict[str, np.ndarray], options: ExportOptions = None) -> dict[str, np.ndarray]:
+    # the day column records which day each exported row stands for, so readers do not assume one row per day
+    options = options or ExportOptions()
+    if options.columns is not None:
+        columns = {name: values for name, values in columns.items() if column_stem(name) in options.columns}
+    length = len(next(iter(columns.values())))
+    if options.resolution <= 1:
+        days = np.arange(length)
+        return {"day": days, **{name: values.astype(options.precision, copy=False) for name, values in columns.items()}}
+
+    starts = np.arange(0, length, options.resolution)
+    if options.window == "mean":
+        counts = np.diff(np.append(starts, length))
+        return {"day": starts, **{name: (np.add.reduceat(values, starts) / counts).astype(options.precision) for name, values in columns.items()}}
+    # the last day is always kept, it holds every run's final state
+    days = np.append(starts, length - 1) if starts[-1] != length - 1 else starts
+    return {"day": days, **{name: values[days].astype(options.precision) for name, values in columns.items()}}
+
+class TrajectoryStatistics:
+    __slots__ = ("count", "mean", "m2", "sketch")
+
+    def __init__(self, max_length: int, count: int = 0, mean: np.ndarray = None, m2: np.ndarray = None, sketch: QuantileSketch = None) -> None:
+        # running per-day moments and quantile sketch of every HISTORY_VARIABLES trajectory, runs forward-filled past termination
+        self.count: int = count
+        self.mean: np.ndarray = np.zeros((len(HISTORY_VARIABLES), max_length)) if mean is None else mean
+        self.m2: np.ndarray = np.zeros((len(HISTORY_VARIABLES), max_length)) if m2 is None else m2
+        self.sketch: QuantileSketch = QuantileSketch() if sketch is None else sketch
+
+    def add(self, history: History) -> None:
+        values = history.padded_variables(self.mean.shape[1])
+        self.count += 1
+        delta = values - self.mean
+        self.mean += delta / self.count
+        self.m2 += delta * (values - self.mean)
+        self.sketch.add(values)
+
+    def merge(self, other: 'TrajectoryStatistics') -> None:
+        if other.count == 0:
+            return
+        count = self.count + other.count
+        delta = other.mean - self.mean
+        self.mean = self.mean + delta * other.count / count
+        self.m2 = self.m2 + other.m2 + delta ** 2 * self.count * other.count / count
+        self.count = count
+        self.sketch.merge(other.sketch)
+
+    def confidence_interval(self, z_score=1.96):
+        std_errs = np.sqrt(self.m2 / (self.count - 1)) / np.sqrt(self.count)
+        intervals = std_errs * z_score
+        return self.mean, self.mean - intervals, self.mean + intervals
+
+    def columns(self, prefix: str, z_score=1.96) -> dict[str, np.ndarray]:
+        return interval_columns(prefix, *self.confidence_interval(z_score), self.sketch.quantiles())
+
+class ScenarioAggregate:
+    __slots__ = ("winners", "reasons", "lengths", "russia", "ukraine")
+
+    def __init__(self, max_length: int) -> None:
+        self.winners: list[str] = []
+        self.reasons: list[str] = []
+        self.lengths: list[int] = []
+        self.russia: TrajectoryStatistics = TrajectoryStatistics(max_length)
+        self.ukraine: TrajectoryStatistics = TrajectoryStatistics(max_length)
+
+    @property
+    def count(self) -> int:
+        return len(self.lengths)
+
+    def add_outcome(self, length: int, winner: str, reason: str) -> None:
+        self.lengths.append(length)
+        self.winners.append(winner)
+        self.reasons.append(reason)
+
+    def add(self, russia, ukraine, length: int, winner: str, reason: str) -> None:
+        self.add_outcome(length, winner, reason)
+        self.russia.add(russia.history)
+        self.ukraine.add(ukraine.history)
+
+    def merge(self, other: 'ScenarioAggregate') -> None:
+        self.winners.extend(other.winners)
+        self.reasons.extend(other.reasons)
+        self.lengths.extend(other.lengths)
+        self.russia.merge(other.russia)
+        self.ukraine.merge(other.ukraine)
+
+    def outcome_half_widths(self, z_score=1.96) -> dict[str, float]:
+        half_widths = {}
+        for winner in WINNERS:
+            half_widths[f"winner_{winner}"] = proportion_half_width(self.winners.count(winner), self.count, z_score)
+        for reason in REASONS:
+            half_widths[f"reason_{reason}"] = proportion_half_width(self.reasons.count(reason), self.count, z_score)
+        half_widths["length"] = z_score * np.std(self.lengths, ddof=1) / np.sqrt(self.count)
+        return half_widths
+
+    def converged(self, tolerance: float, length_tolerance: float, z_score=1.96) -> bool:
+        # shares to within +-tolerance and the mean length to within +-length_tolerance days
+        if self.count < 2:
+            return False
+        half_widths = self.outcome_half_widths(z_score)
+        return half_widths.pop("length") <= length_tolerance and max(half_widths.values()) <= tolerance
+
+    def columns(self, z_score=1.96) -> dict[str, np.ndarray]:
+        return {**self.russia.columns("russia", z_score), **self.ukraine.columns("ukraine", z_score)}
@@ -1,8 +1,15 @@
 import data_analysis as da
 import polars as pl
+import os
 
-file_name = input("Enter the csv file name (excluding the .csv extension): ")
-data = pl.read_csv(f"data/{file_name}.csv", glob=False)
+file_name = input("Enter the csv file name (excluding the .csv extension) or a scenario_id: ")
+if os.path.exists(f"data/{file_name}.csv"):
+    data = pl.read_csv(f"data/{file_name}.csv", glob=False)
 
-da.plot_monte_carlo_histograms(data['lengths'], data['winners'], data['reasons'])
-da.plot_dashboard_from_csv(data)
\ No newline at end of file
+    da.plot_monte_carlo_histograms(data['lengths'], data['winners'], data['reasons'])
+    da.plot_dashboard_from_csv(data)
+else:
+    # scenarios from a parquet sweep have no file of their own
+    from query import plot_scenario
+
+    plot_scenario(file_name)
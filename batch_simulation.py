@@ -0,0 +1,363 @@
+import numpy as np
+from typing import Tuple
+
+from classes import Coefficients, HISTORY_VARIABLES
+from schedules import ScenarioSchedule, get_schedule
+from quantiles import batch_level, batch_sample
+
+WINNERS = ("None", "Russian Federation", "Ukraine")
+REASONS = ("None", "Enemy Economic Collapse", "Enemy Military Collapse", "Military Superiority")
+
+class BatchBelligerant:
+    def __init__(
+        self,
+        name: str,
+        coefficients: Coefficients,
+        num_runs: int,
+        timesteps: int,
+        military_technology,
+        industrial_technology,
+        military_industrial_capacity,
+        civilian_industrial_capacity,
+        military_capability,
+        military_technology_investment_percentage: float,
+        industrial_technology_investment_percentage: float,
+        military_industrial_investment_percentage: float,
+        civilian_industrial_investment_percentage: float,
+        tax_revenue_percentage,
+        attacking_intensity,
+        sanctions_policy,
+        foreign_aid_policy,
+        record_history: bool = False,
+        sanctions_schedule=None,
+        foreign_aid_schedule=None,
+    ) -> None:
+        self.name: str = name
+        self.coefficients: Coefficients = coefficients
+        self.num_runs: int = num_runs
+
+        # stocks, one entry per run
+        self.military_technology: np.ndarray = self._broadcast(military_technology)
+        self.industrial_technology: np.ndarray = self._broadcast(industrial_technology)
+        self.military_industrial_capacity: np.ndarray = self._broadcast(military_industrial_capacity)
+        self.civilian_industrial_capacity: np.ndarray = self._broadcast(civilian_industrial_capacity)
+        self.military_capability: np.ndarray = self._broadcast(military_capability)
+        self.economic_capital: np.ndarray = self._broadcast(0.0)
+
+        # independent variables
+        self.military_technology_investment_percentage: float = military_technology_investment_percentage
+        self.industrial_technology_investment_percentage: float = industrial_technology_investment_percentage
+        self.military_industrial_investment_percentage: float = military_industrial_investment_percentage
+        self.civilian_industrial_investment_percentage: float = civilian_industrial_investment_percentage
+        self.tax_revenue_percentage: np.ndarray = self._broadcast(tax_revenue_percentage)
+        self.sanctions_policy = sanctions_policy
+        self.foreign_aid_policy = foreign_aid_policy
+        self.attacking_intensity: np.ndarray = self._broadcast(attacking_intensity)
+        self.sanctions_schedule = sanctions_schedule
+        self.foreign_aid_schedule = foreign_aid_schedule
+
+        initial_capital = self.economic_capital_equation(0)
+        self.current_budget: np.ndarray = self.budget(0, initial_capital)
+        self.current_spending: np.ndarray = self.spending(self.current_budget)
+        self.initial_economic_capital: np.ndarray = (
+            self.coefficients.production_efficiency *
+            self.industrial_technology *
+            self.civilian_industrial_capacity
+        )
+
+        # per-day mean and sum of squared deviations across the batch, frozen runs included
+        self.history_mean: np.ndarray = np.zeros((len(HISTORY_VARIABLES), timesteps + 1))
+        self.history_m2: np.ndarray = np.zeros((len(HISTORY_VARIABLES), timesteps + 1))
+        # a sorted subsample of the batch per day, the seed of each side's QuantileSketch
+        self.sketch_level: int = batch_level(num_runs)
+        # days first, so each day's write is one contiguous block
+        self.history_sketch: np.ndarray = np.zeros((timesteps + 1, len(range(2 ** self.sketch_level // 2, num_runs, 2 ** self.sketch_level)), len(HISTORY_VARIABLES)), dtype=np.float32)
+        self.history: np.ndarray | None = None
+        if record_history:
+            self.history = np.zeros((len(HISTORY_VARIABLES), timesteps + 1, num_runs))
+
+        self.record_history(0, self.state(self.initial_economic_capital))
+
+    def _broadcast(self, value) -> np.ndarray:
+        return np.broadcast_to(np.asarray(value, dtype=np.float64), (self.num_runs,)).copy()
+
+    def state(self, economic_capital: np.ndarray = None) -> np.ndarray:
+        return np.stack([
+            self.economic_capital if economic_capital is None else economic_capital,
+            self.military_capability,
+            self.civilian_industrial_capacity,
+            self.military_industrial_capacity,
+            self.military_technology,
+            self.industrial_technology,
+            self.price_level(),
+            self.current_budget,
+            self.current_spending,
+        ])
+
+    def record_history(self, index: int, state: np.ndarray) -> None:
+        mean = state.mean(axis=1)
+        self.history_mean[:, index] = mean
+        self.history_m2[:, index] = ((state - mean[:, None]) ** 2).sum(axis=1)
+        self.history_sketch[index] = batch_sample(state, self.sketch_level)
+        if self.history is not None:
+            self.history[:, index, :] = state
+
+    def freeze_history(self, index: int) -> None:
+        self.history_mean[:, index + 1:] = self.history_mean[:, index:index + 1]
+        self.history_m2[:, index + 1:] = self.history_m2[:, index:index + 1]
+        self.history_sketch[index + 1:] = self.history_sketch[index]
+        if self.history is not None:
+            self.history[:, index + 1:, :] = self.history[:, index:index + 1, :]
+
+    def update(self, t: int, M_neg: np.ndarray, active: np.ndarray) -> None:
+        economic_capital = self.economic_capital_equation(t)
+        current_budget = self.budget(t, economic_capital)
+        current_spending = self.spending(current_budget)
+        positive_budget = np.maximum(current_budget, 0)
+
+        economic_capital = economic_capital + np.minimum(current_budget, 0)
+        industrial_technology = self.industrial_technology + self.industrial_technology_growth(positive_budget)
+        military_technology = self.military_technology + self.military_technology_growth(positive_budget)
+        civilian_industrial_capacity = self.civilian_industrial_capacity + self.civilian_industrial_capacity_growth(positive_budget, M_neg)
+        military_industrial_capacity = self.military_industrial_capacity + self.military_industrial_capacity_growth(positive_budget, M_neg)
+        military_capability = self.military_capability + self.military_capability_growth(
+            military_technology, industrial_technology, military_industrial_capacity, M_neg
+        )
+
+        # finished runs keep their last state
+        self.economic_capital = np.where(active, economic_capital, self.economic_capital)
+        self.current_budget = np.where(active, current_budget, self.current_budget)
+        self.current_spending = np.where(active, current_spending, self.current_spending)
+        self.industrial_technology = np.where(active, industrial_technology, self.industrial_technology)
+        self.military_technology = np.where(active, military_technology, self.military_technology)
+        self.civilian_industrial_capacity = np.where(active, civilian_industrial_capacity, self.civilian_industrial_capacity)
+        self.military_industrial_capacity = np.where(active, military_industrial_capacity, self.military_industrial_capacity)
+        self.military_capability = np.where(active, military_capability, self.military_capability)
+
+    def economic_capital_equation(self, t: int) -> np.ndarray:
+        return (
+            self.coefficients.production_efficiency *
+            self.industrial_technology *
+            self.civilian_industrial_capacity *
+            self.sanctions_effect(t)
+        )
+
+    def budget(self, t: int, capital: np.ndarray) -> np.ndarray:
+        return ((capital *
+                self.tax_revenue_percentage *
+                0.35 /
+                365 +
+                self.foreign_aid(t)) /
+                self.price_level() -
+                self.coefficients.military_consumption_cost_coefficient *
+                self.military_capability)
+
+    def spending(self, budget: np.ndarray) -> np.ndarray:
+        return (
+            np.maximum(budget, 0) *
+            (self.military_industrial_investment_percentage +
+             self.civilian_industrial_investment_percentage +
+             self.military_technology_investment_percentage +
+             self.industrial_technology_investment_percentage)
+        )
+
+    def sanctions_effect(self, t: int) -> np.ndarray:
+        if self.sanctions_schedule is not None:
+            return self.sanctions_schedule(t, self.coefficients.sanctions_delay)
+        return 1 - self.sanctions_function(t - self.coefficients.sanctions_delay, self.sanctions_policy)
+
+    def foreign_aid(self, t: int) -> np.ndarray:
+        if self.foreign_aid_schedule is not None:
+            return self.foreign_aid_schedule(t, self.coefficients.foreign_aid_delay)
+        return self.foreign_aid_function(t - self.coefficients.foreign_aid_delay, self.foreign_aid_policy)
+
+    def industrial_technology_growth(self, positive_budget: np.ndarray) -> np.ndarray:
+        return (
+            self.coefficients.industrial_technology_investment_coefficient *
+            self.industrial_technology_investment_percentage *
+            positive_budget
+        )
+
+    def military_technology_growth(self, positive_budget: np.ndarray) -> np.ndarray:
+        return (
+            self.coefficients.military_technology_investment_coefficient *
+            self.military_technology_investment_percentage *
+            positive_budget
+        )
+
+    def civilian_industrial_capacity_growth(self, positive_budget: np.ndarray, M_neg: np.ndarray) -> np.ndarray:
+        return (
+            self.coefficients.civilian_industrial_investment_coefficient *
+            self.civilian_industrial_investment_percentage *
+            positive_budget -
+            self.industrial_attrition(M_neg) *
+            self.civilian_industrial_capacity
+        )
+
+    def military_industrial_capacity_growth(self, positive_budget: np.ndarray, M_neg: np.ndarray) -> np.ndarray:
+        return (
+            self.coefficients.military_industrial_investment_coefficient *
+            self.military_industrial_investment_percentage *
+            positive_budget -
+            self.industrial_attrition(M_neg) *
+            self.military_industrial_capacity
+        )
+
+    def military_capability_growth(self, military_technology: np.ndarray, industrial_technology: np.ndarray, military_industrial_capacity: np.ndarray, M_neg: np.ndarray) -> np.ndarray:
+        return (
+            self.coefficients.military_capability_weight *
+            military_technology *
+            self.coefficients.production_efficiency *
+            industrial_technology *
+            military_industrial_capacity -
+            self.military_attrition(M_neg)
+        )
+
+    def military_attrition(self, M_neg: np.ndarray) -> np.ndarray:
+        return (
+            self.attacking_intensity *
+            self.coefficients.conflict_intensity *
+            self.coefficients.military_attrition_coefficient *
+            M_neg ** 1.5
+        )
+
+    def industrial_attrition(self, M_neg: np.ndarray) -> np.ndarray:
+        return (
+            self.coefficients.industrial_attrition_coefficient *
+            M_neg ** 1.1
+        )
+
+    def price_level(self) -> np.ndarray:
+        return 1 * (
+            1 + self.coefficients.elasticity_coefficient *
+            np.maximum(
+                0,
+                self.coefficients.military_demand_coefficient *
+                self.military_capability -
+                self.coefficients.production_efficiency *
+                self.industrial_technology *
+                self.military_industrial_capacity
+            )
+        )
+
+    def sanctions_function(self, t, max_sanctions: float) -> np.ndarray:
+        return np.maximum(0, np.minimum(max_sanctions, .001 + ((max_sanctions - .001) * t / 180)))
+
+    def foreign_aid_function(self, t, max_foreign_aid: float) -> np.ndarray:
+        return np.broadcast_to(np.float64(max_foreign_aid), np.shape(t))
+
+def create_batch_belligerants(coefficients: Coefficients, international_interference: dict, investment_policies: dict, num_runs: int, timesteps: int, record_history: bool = False, rng=np.random, schedule: ScenarioSchedule = None) -> Tuple[BatchBelligerant, BatchBelligerant]:
+    if schedule is None:
+        schedule = get_schedule(timesteps, international_interference)
+
+    russia_attacking_intensity = rng.normal(.62, .02, size=num_runs)
+    russian_federation = BatchBelligerant(
+        name="Russian Federation",
+        coefficients=coefficients,
+        num_runs=num_runs,
+        timesteps=timesteps,
+        military_technology=1.0,
+        industrial_technology=1.0,
+        military_industrial_capacity=100,
+        civilian_industrial_capacity=850,
+        military_capability=175,
+        military_technology_investment_percentage=investment_policies.get('russia')[0],
+        industrial_technology_investment_percentage=investment_policies.get('russia')[1],
+        military_industrial_investment_percentage=investment_policies.get('russia')[2],
+        civilian_industrial_investment_percentage=investment_policies.get('russia')[3],
+        attacking_intensity=russia_attacking_intensity,
+        tax_revenue_percentage=rng.normal(0.11, 0.01, size=num_runs),
+        sanctions_policy=international_interference.get('sanctions_russia'),
+        foreign_aid_policy=international_interference.get('foreign_aid_russia'),
+        record_history=record_history,
+        sanctions_schedule=schedule.sanctions_effect['russia'],
+        foreign_aid_schedule=schedule.foreign_aid['russia'],
+    )
+
+    ukraine = BatchBelligerant(
+        name="Ukraine",
+        coefficients=coefficients,
+        num_runs=num_runs,
+        timesteps=timesteps,
+        military_technology=1.0,
+        industrial_technology=1.0,
+        military_industrial_capacity=100,
+        civilian_industrial_capacity=100,
+        military_capability=100,
+        military_technology_investment_percentage=investment_policies.get('ukraine')[0],
+        industrial_technology_investment_percentage=investment_policies.get('ukraine')[1],
+        military_industrial_investment_percentage=investment_policies.get('ukraine')[2],
+        civilian_industrial_investment_percentage=investment_policies.get('ukraine')[3],
+        attacking_intensity=1 - russia_attacking_intensity,
+        tax_revenue_percentage=rng.normal(0.19, 0.01, size=num_runs),
+        sanctions_policy=international_interference.get('sanctions_ukraine'),
+        foreign_aid_policy=international_interference.get('foreign_aid_ukraine'),
+        record_history=record_history,
+        sanctions_schedule=schedule.sanctions_effect['ukraine'],
+        foreign_aid_schedule=schedule.foreign_aid['ukraine'],
+    )
+
+    return russian_federation, ukraine
+
+def check_termination_conditions(russian_federation: BatchBelligerant, ukraine: BatchBelligerant) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    winner = np.zeros(russian_federation.num_runs, dtype=np.int8)
+    reason = np.zeros(russian_federation.num_runs, dtype=np.int8)
+
+    # same precedence as simulation.check_termination_conditions: later matches overwrite earlier ones
+    for belligerant, adversary_index in ((russian_federation, 2), (ukraine, 1)):
+        economic_collapse = belligerant.economic_capital < 0.6 * belligerant.initial_economic_capital
+        military_collapse = ~economic_collapse & (belligerant.military_capability <= 15)
+        winner[economic_collapse | military_collapse] = adversary_index
+        reason[economic_collapse] = 1
+        reason[military_collapse] = 2
+
+    russia_superiority = russian_federation.military_capability > 4 * ukraine.military_capability
+    ukraine_superiority = ~russia_superiority & (ukraine.military_capability > 4 * russian_federation.military_capability)
+    winner[russia_superiority] = 1
+    winner[ukraine_superiority] = 2
+    reason[russia_superiority | ukraine_superiority] = 3
+
+    return reason > 0, winner, reason
+
+def run_batch_simulation(timesteps: int, coefficients: Coefficients, international_interference, investment_policies, num_runs: int, record_history: bool = False, rng=np.random, schedule: ScenarioSchedule = None) -> Tuple[BatchBelligerant, BatchBelligerant, np.ndarray, np.ndarray, np.ndarray]:
+    if schedule is None:
+        schedule = get_schedule(timesteps, international_interference)
+
+    russian_federation, ukraine = create_batch_belligerants(coefficients, international_interference, investment_policies, num_runs, timesteps, record_history, rng, schedule)
+    baseline_russian_attacking_intensity = rng.normal(.62, .02, size=num_runs)
+
+    active = np.ones(num_runs, dtype=bool)
+    lengths = np.full(num_runs, timesteps, dtype=np.int64)
+    winners = np.zeros(num_runs, dtype=np.int8)
+    reasons = np.zeros(num_runs, dtype=np.int8)
+
+    for t in range(timesteps):
+        coefficients.conflict_intensity = schedule.conflict_intensity.item(t)
+        ru_military_capability = russian_federation.military_capability
+        ua_military_capability = ukraine.military_capability
+
+        if t < 270:
+            russian_federation.attacking_intensity[:] = 0.7
+            ukraine.attacking_intensity[:] = 0.25
+        elif t < 540:
+            russian_federation.attacking_intensity = 0.7 - (.7 - baseline_russian_attacking_intensity) / 270 * (t - 270)
+            ukraine.attacking_intensity = 1 - russian_federation.attacking_intensity
+
+        russian_federation.update(t, ua_military_capability, active)
+        ukraine.update(t, ru_military_capability, active)
+
+        end, winner, reason = check_termination_conditions(russian_federation, ukraine)
+        finished = active & end
+        lengths[finished] = t
+        winners[finished] = winner[finished]
+        reasons[finished] = reason[finished]
+        active &= ~end
+
+        russian_federation.record_history(t + 1, russian_federation.state())
+        ukraine.record_history(t + 1, ukraine.state())
+        if not active.any():
+            russian_federation.freeze_history(t + 1)
+            ukraine.freeze_history(t + 1)
+            break
+
+    return russian_federation, ukraine, lengths, np.array(WINNERS)[winners], np.array(REASONS)[reasons]
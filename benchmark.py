@@ -0,0 +1,154 @@
+from simulation import create_belligerants, run_simulation
+from monte_carlo_simulation import run_monte_carlo_simulation, write_results
+from aggregation import ScenarioAggregate
+from sampling import sample_run_coefficients
+from data_analysis import combine_simulation_results, calc_confidence_interval_time_series
+from contextlib import redirect_stdout
+from time import perf_counter
+import argparse
+import io
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import numpy as np
+import polars as pl
+
+INTERNATIONAL_INTERFERENCE = {'foreign_aid_russia': 0, 'sanctions_ukraine': 0, 'foreign_aid_ukraine': .24, 'sanctions_russia': .14}
+INVESTMENT_POLICIES = {'ukraine': [.25, .25, .25, .25], 'russia': [.25, .25, .25, .25]}
+TIMESTEPS = 3650
+COMBINE_RUNS = 200
+
+def time_case(function, repeats: int, setup=None) -> dict[str, float]:
+    times = []
+    for _ in range(repeats):
+        state = setup() if setup else None
+        with redirect_stdout(io.StringIO()):
+            start = perf_counter()
+            function(state)
+            times.append(perf_counter() - start)
+    return {"median": float(np.median(times)), "min": float(np.min(times)), "repeats": repeats}
+
+def object_runs(num_runs: int, seed: int = 0) -> list:
+    runs = []
+    for child in np.random.SeedSequence(seed).spawn(num_runs):
+        rng = np.random.default_rng(child)
+        runs.append(run_simulation(TIMESTEPS, sample_run_coefficients(rng), INTERNATIONAL_INTERFERENCE, INVESTMENT_POLICIES, monte_carlo=True, rng=rng))
+    return runs
+
+def fresh_belligerants():
+    rng = np.random.default_rng(0)
+    return create_belligerants(sample_run_coefficients(rng), INTERNATIONAL_INTERFERENCE, INVESTMENT_POLICIES, True, rng=rng)
+
+def update_steps(belligerants) -> None:
+    # a single update is too short to time on its own, so this is 1000 consecutive ones
+    russian_federation, ukraine = belligerants
+    for t in range(1000):
+        russian_federation.update(t, ukraine.military_capability)
+
+def full_simulation(_) -> None:
+    rng = np.random.default_rng(0)
+    run_simulation(TIMESTEPS, sample_run_coefficients(rng), INTERNATIONAL_INTERFERENCE, INVESTMENT_POLICIES, monte_carlo=True, rng=rng)
+
+def import_module(module: str):
+    # a fresh interpreter each time, which is what a pool worker or a short CLI run pays
+    return lambda _: subprocess.run([sys.executable, "-c", f"import {module}"], check=True, cwd=os.path.dirname(os.path.abspath(__file__)))
+
+def monte_carlo(num_simulations: int, engine: str):
+    return lambda _: run_monte_carlo_simulation(num_simulations, engine=engine, seed=0)
+
+def benchmark_cases(runs: list, export_dir: str) -> dict:
+    russia_runs = [run[0] for run in runs]
+    combined = combine_simulation_results(russia_runs, TIMESTEPS + 1)
+
+    aggregate = ScenarioAggregate(TIMESTEPS + 1)
+    for run in runs:
+        aggregate.add(*run)
+    columns = aggregate.columns()
+    export_path = os.path.join(export_dir, "data")
+    os.makedirs(export_path, exist_ok=True)
+
+    def export(_):
+        cwd = os.getcwd()
+        os.chdir(export_dir)
+        try:
+            write_results(aggregate, columns, INTERNATIONAL_INTERFERENCE, INVESTMENT_POLICIES)
+        finally:
+            os.chdir(cwd)
+
+    def load(_):
+        # what analyze.py does before plotting
+        for file in os.listdir(export_path):
+            pl.read_csv(os.path.join(export_path, file), glob=False)
+
+    # name: (function, repeats, problem size, setup run outside the timing)
+    return {
+        "import_interpreter": (lambda _: subprocess.run([sys.executable, "-c", "pass"], check=True), 10, 1, None),
+        "import_simulation": (import_module("simulation"), 10, 1, None),
+        "import_monte_carlo_simulation": (import_module("monte_carlo_simulation"), 10, 1, None),
+        "import_data_analysis": (import_module("data_analysis"), 10, 1, None),
+        "belligerant_update_1000_steps": (update_steps, 20, 1000, fresh_belligerants),
+        "run_simulation_3650_days": (full_simulation, 10, TIMESTEPS, None),
+        "monte_carlo_object_1k": (monte_carlo(1000, "object"), 1, 1000, None),
+        "monte_carlo_object_10k": (monte_carlo(10000, "object"), 1, 10000, None),
+        "monte_carlo_batch_1k": (monte_carlo(1000, "batch"), 3, 1000, None),
+        "monte_carlo_batch_10k": (monte_carlo(10000, "batch"), 1, 10000, None),
+        "combine_simulation_results": (lambda _: combine_simulation_results(russia_runs, TIMESTEPS + 1), 5, COMBINE_RUNS, None),
+        "calc_confidence_interval_time_series": (lambda _: calc_confidence_interval_time_series(combined[0]), 20, COMBINE_RUNS, None),
+        "csv_export": (export, 20, COMBINE_RUNS, None),
+        "csv_load": (load, 20, COMBINE_RUNS, None),
+    }
+
+def environment() -> dict:
+    try:
+        commit = subprocess.run(["git", "rev-parse", "HEAD"], capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    return {"commit": commit, "python": platform.python_version(), "numpy": np.__version__, "polars": pl.__version__, "machine": platform.machine(), "cpus": os.cpu_count()}
+
+def run_benchmarks(only: list[str] = None) -> dict:
+    results = {}
+    with tempfile.TemporaryDirectory() as export_dir:
+        runs = object_runs(COMBINE_RUNS)
+        for name, (function, repeats, size, setup) in benchmark_cases(runs, export_dir).items():
+            if only and not any(pattern in name for pattern in only):
+                continue
+            results[name] = {**time_case(function, repeats, setup), "size": size}
+            print(f"{name}: {results[name]['median']:.4f}s")
+    return {"environment": environment(), "results": results}
+
+def compare(results: dict, baseline: dict, threshold: float = 1.2) -> list[str]:
+    regressions = []
+    for name, result in results["results"].items():
+        if name not in baseline["results"]:
+            continue
+        ratio = result["median"] / baseline["results"][name]["median"]
+        flag = "REGRESSION" if ratio > threshold else ""
+        print(f"{name:40s} {baseline['results'][name]['median']:10.4f}s -> {result['median']:10.4f}s  x{ratio:.2f} {flag}")
+        if ratio > threshold:
+            regressions.append(name)
+    return regressions
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--only", nargs="*", help="run only cases whose name contains one of these")
+    parser.add_argument("--output", default="benchmark_results.json")
+    parser.add_argument("--baseline", default="benchmark_baseline.json")
+    parser.add_argument("--save-baseline", action="store_true")
+    parser.add_argument("--threshold", type=float, default=1.2, help="median slowdown ratio reported as a regression")
+    args = parser.parse_args()
+
+    results = run_benchmarks(args.only)
+    with open(args.output, "w") as f:
+        json.dump(results, f, indent=2)
+
+    if args.save_baseline:
+        with open(args.baseline, "w") as f:
+            json.dump(results, f, indent=2)
+    elif os.path.exists(args.baseline):
+        with open(args.baseline) as f:
+            regressions = compare(results, json.load(f), args.threshold)
+        if regressions:
+            raise SystemExit(f"Slower than baseline: {', '.join(regressions)}")
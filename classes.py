@@ -1,4 +1,5 @@
 from dataclasses import dataclass, fields
+import numpy as np
 
 class Belligerant:
     def __init__(
@@ -18,6 +19,10 @@ class Belligerant:
         attacking_intensity: float,
         sanctions_policy,
         foreign_aid_policy,
+        history_capacity: int = 3651,
+        history_dtype=np.float64,
+        sanctions_schedule=None,
+        foreign_aid_schedule=None,
     ) -> None:
         self.name: str = name
         self.coefficients: Coefficients = coefficients
@@ -40,23 +45,39 @@ class Belligerant:
         self.foreign_aid_policy = foreign_aid_policy
         self.attacking_intensity: float = attacking_intensity
 
+        # precomputed schedules.DelayedSeries, shifted by this run's delays and used instead of the policy functions when given
+        self.sanctions_by_day: list[float] | None = None
+        self.foreign_aid_by_day: list[float] | None = None
+        if sanctions_schedule is not None:
+            self.sanctions_by_day = sanctions_schedule.by_day(coefficients.sanctions_delay, history_capacity)
+        if foreign_aid_schedule is not None:
+            self.foreign_aid_by_day = foreign_aid_schedule.by_day(coefficients.foreign_aid_delay, history_capacity)
+
         self.current_budget: float = 0.0
         self.current_spending: float = 0.0
 
         self.adversary_military_capability: float = 0.0
 
-        self.history: History = History(
-            [0.0],
-            [self.coefficients.production_efficiency * self.industrial_technology * self.civilian_industrial_capacity],
-            [industrial_technology],
-            [military_technology],
-            [civilian_industrial_capacity],
-            [military_industrial_capacity],
-            [military_capability],
-            [self.price_level()],
-            [self.budget(0, self.economic_capital_equation(0))],
-            [self.spending(0, self.economic_capital_equation(0))]
-        )
+        self.history: History = History(history_capacity, history_dtype)
+        self.history.append((
+            0.0,
+            self.coefficients.production_efficiency * self.industrial_technology * self.civilian_industrial_capacity,
+            industrial_technology,
+            military_technology,
+            civilian_industrial_capacity,
+            military_industrial_capacity,
+            military_capability,
+            self.price_level(),
+            self.budget(0, self.economic_capital_equation(0)),
+            self.spending(0, self.economic_capital_equation(0)),
+        ))
+
+    def __getstate__(self) -> dict:
+        # schedules are only needed while stepping, so results sent back from workers leave them behind
+        state = self.__dict__.copy()
+        state["sanctions_by_day"] = None
+        state["foreign_aid_by_day"] = None
+        return state
 
     def update(self, t: int, M_neg: float) -> None:
         self.adversary_military_capability = M_neg
@@ -76,16 +97,18 @@ class Belligerant:
         self.update_history(t)
 
     def update_history(self, t: int) -> None:
-        self.history.time.append(t)
-        self.history.economic_capital.append(self.economic_capital)
-        self.history.industrial_technology.append(self.industrial_technology)
-        self.history.military_technology.append(self.military_technology)
-        self.history.civilian_industrial_capacity.append(self.civilian_industrial_capacity)
-        self.history.military_industrial_capacity.append(self.military_industrial_capacity)
-        self.history.military_capability.append(self.military_capability)
-        self.history.price_level.append(self.price_level())
-        self.history.budget.append(self.current_budget)
-        self.history.spending.append(self.current_spending)
+        self.history.append((
+            t,
+            self.economic_capital,
+            self.industrial_technology,
+            self.military_technology,
+            self.civilian_industrial_capacity,
+            self.military_industrial_capacity,
+            self.military_capability,
+            self.price_level(),
+            self.current_budget,
+            self.current_spending,
+        ))
 
     def economic_capital_equation(self, t: int) -> float:
         return (
@@ -115,9 +138,13 @@ class Belligerant:
         )
     
     def sanctions_effect(self, t: int) -> float:
+        if self.sanctions_by_day is not None:
+            return self.sanctions_by_day[t]
         return 1 - self.sanctions_function(t - self.coefficients.sanctions_delay, self.sanctions_policy)
     
     def foreign_aid(self, t: int) -> float:
+        if self.foreign_aid_by_day is not None:
+            return self.foreign_aid_by_day[t]
         return self.foreign_aid_function(t - self.coefficients.foreign_aid_delay, self.foreign_aid_policy)
     
     def industrial_technology_growth(self) -> float:
@@ -220,15 +247,82 @@ class Coefficients:
     def set_by_index(self, index: int, value: float) -> None:
         setattr(self, fields(self)[index].name, value)
 
-@dataclass(slots=True)
+HISTORY_FIELDS = (
+    "time",
+    "economic_capital",
+    "industrial_technology",
+    "military_technology",
+    "civilian_industrial_capacity",
+    "military_industrial_capacity",
+    "military_capability",
+    "price_level",
+    "budget",
+    "spending",
+)
+
+# the nine trajectory variables summarised across Monte Carlo runs, in export order
+HISTORY_VARIABLES = (
+    "economic_capital",
+    "military_capability",
+    "civilian_industrial_capacity",
+    "military_industrial_capacity",
+    "military_technology",
+    "industrial_technology",
+    "price_level",
+    "budget",
+    "spending",
+)
+HISTORY_VARIABLE_ROWS = [HISTORY_FIELDS.index(name) for name in HISTORY_VARIABLES]
+
+def _field_view(index: int) -> property:
+    return property(lambda self: self.data[index, :self.length])
+
 class History:
-    time: list[float]
-    economic_capital: list[float]
-    industrial_technology: list[float]
-    military_technology: list[float]
-    civilian_industrial_capacity: list[float]
-    military_industrial_capacity: list[float]
-    military_capability: list[float]
-    price_level: list[float]
-    budget: list[float]
-    spending: list[float]
+    __slots__ = ("data", "length")
+
+    def __init__(self, capacity: int = 3651, dtype=np.float64) -> None:
+        # one row per field, one column per recorded day
+        self.data: np.ndarray = np.empty((len(HISTORY_FIELDS), capacity), dtype=dtype)
+        self.length: int = 0
+
+    # views are invalidated if append has to grow the buffer
+    time = _field_view(0)
+    economic_capital = _field_view(1)
+    industrial_technology = _field_view(2)
+    military_technology = _field_view(3)
+    civilian_industrial_capacity = _field_view(4)
+    military_industrial_capacity = _field_view(5)
+    military_capability = _field_view(6)
+    price_level = _field_view(7)
+    budget = _field_view(8)
+    spending = _field_view(9)
+
+    @property
+    def termination_index(self) -> int:
+        return self.length - 1
+
+    def append(self, values: tuple) -> None:
+        if self.length == self.data.shape[1]:
+            self.data = np.concatenate([self.data, np.empty_like(self.data)], axis=1)
+        self.data[:, self.length] = values
+        self.length += 1
+
+    def field(self, name: str) -> np.ndarray:
+        return self.data[HISTORY_FIELDS.index(name), :self.length]
+
+    def padded(self, name: str, max_length: int) -> np.ndarray:
+        values = self.field(name)[:max_length]
+        return np.concatenate([values, np.full(max_length - len(values), values[-1], dtype=values.dtype)])
+
+    def variables(self, max_length: int) -> np.ndarray:
+        return self.data[HISTORY_VARIABLE_ROWS, :min(self.length, max_length)]
+
+    def padded_variables(self, max_length: int) -> np.ndarray:
+        values = self.variables(max_length)
+        return np.concatenate([values, np.repeat(values[:, -1:], max_length - values.shape[1], axis=1)], axis=1)
+
+    def __getstate__(self):
+        return self.data[:, :self.length].copy(), self.length
+
+    def __setstate__(self, state) -> None:
+        self.data, self.length = state
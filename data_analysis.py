@@ -1,17 +1,15 @@
-import matplotlib.pyplot as plt
-import seaborn as sns
-from classes import Belligerant
-import polars as pl
-from multiprocessing import Pool
-import altair as alt
-import pandas as pd
+from classes import Belligerant, HISTORY_VARIABLES
+from aggregation import TrajectoryStatistics, ExportOptions, export_columns
 import numpy as np
 
-def history_to_dict(belligerant: Belligerant, max_length=0, monte_carlo=False) -> dict[str, list]:
+# the plotting and dataframe libraries are imported inside the functions that use them,
+# so the simulation core and its pool workers never pay for loading them
+
+def history_to_dict(belligerant: Belligerant, max_length=0, monte_carlo=False) -> dict[str, np.ndarray]:
     data: dict = {}
     if not monte_carlo:
         data = {
-            "Time": [i / 365.0 for i in belligerant.history.time],
+            "Time": belligerant.history.time / 365.0,
             "GDP (Billions, PPP$)": belligerant.history.economic_capital,
             "Military Capability": belligerant.history.military_capability,
             "Civilian Industrial Capacity": belligerant.history.civilian_industrial_capacity,
@@ -25,33 +23,26 @@ def history_to_dict(belligerant: Belligerant, max_length=0, monte_carlo=False) -
         }
     else:
         data = {
-            "Time": [i / 365.0 for i in range(max_length)],
-            "GDP (Billions, PPP$)": (belligerant.history.economic_capital + [belligerant.history.economic_capital[-1]] * (max_length - len(belligerant.history.economic_capital)))[:max_length],
-            "Military Capability": (belligerant.history.military_capability + [belligerant.history.military_capability[-1]] * (max_length - len(belligerant.history.military_capability)))[:max_length],
-            "Civilian Industrial Capacity": (belligerant.history.civilian_industrial_capacity + [belligerant.history.civilian_industrial_capacity[-1]] * (max_length - len(belligerant.history.civilian_industrial_capacity)))[:max_length],
-            "Military Industrial Capacity": (belligerant.history.military_industrial_capacity + [belligerant.history.military_industrial_capacity[-1]] * (max_length - len(belligerant.history.military_industrial_capacity)))[:max_length],
-            "Military Technology": (belligerant.history.military_technology + [belligerant.history.military_technology[-1]] * (max_length - len(belligerant.history.military_technology)))[:max_length],
-            "Industrial Technology": (belligerant.history.industrial_technology + [belligerant.history.industrial_technology[-1]] * (max_length - len(belligerant.history.industrial_technology)))[:max_length],
-            "Price Level": (belligerant.history.price_level + [belligerant.history.price_level[-1]] * (max_length - len(belligerant.history.price_level)))[:max_length],
-            "Budget (Billions, PPP$)": (belligerant.history.budget + [belligerant.history.budget[-1]] * (max_length - len(belligerant.history.budget)))[:max_length],
-            "Spending (Billions, PPP$)": (belligerant.history.spending + [belligerant.history.spending[-1]] * (max_length - len(belligerant.history.spending)))[:max_length],
+            "Time": np.arange(max_length) / 365.0,
+            "GDP (Billions, PPP$)": belligerant.history.padded("economic_capital", max_length),
+            "Military Capability": belligerant.history.padded("military_capability", max_length),
+            "Civilian Industrial Capacity": belligerant.history.padded("civilian_industrial_capacity", max_length),
+            "Military Industrial Capacity": belligerant.history.padded("military_industrial_capacity", max_length),
+            "Military Technology": belligerant.history.padded("military_technology", max_length),
+            "Industrial Technology": belligerant.history.padded("industrial_technology", max_length),
+            "Price Level": belligerant.history.padded("price_level", max_length),
+            "Budget (Billions, PPP$)": belligerant.history.padded("budget", max_length),
+            "Spending (Billions, PPP$)": belligerant.history.padded("spending", max_length),
             "Belligerant": belligerant.name
         }
 
     return data
 
-def process_belligerent(belligerant, max_length):
-    return pl.DataFrame(history_to_dict(belligerant, max_length, monte_carlo=True), strict=False)
-
-def monte_carlo_to_df(belligerant_runs: list[list[Belligerant]], max_length: int):
-    combined_data = []
-    for belligerants in belligerant_runs:
-        with Pool(processes=12) as pool:
-            combined_data = pool.starmap(process_belligerent, [(b, max_length) for belligerants_group in belligerant_runs for b in belligerants_group])
-
-    return pl.concat(combined_data)
-
 def plot_dashboard(belligerants: list[Belligerant]):
+    import matplotlib.pyplot as plt
+    import seaborn as sns
+    import polars as pl
+
     combined_data = []
     for belligerant in belligerants:
         df = history_to_dict(belligerant)
@@ -75,114 +66,116 @@ def plot_dashboard(belligerants: list[Belligerant]):
     plt.tight_layout()
     plt.show()
 
+DASHBOARD_PANELS = (
+    # (axis, column stem, y label, title, legend location)
+    ((0, 0), "gdp", "GDP (Billions, PPP$)", "GDP Over Time", "upper right"),
+    ((0, 1), "military_capability", "Military Capability", "Military Capability Over Time", "lower right"),
+    ((0, 2), "price_level", "Price Level", "Price Level Over Time", "lower right"),
+    ((1, 0), "civilian_industrial_capacity", "Civilian Industrial Capacity", "Civilian Industrial Capacity Over Time", "right"),
+    ((1, 1), "military_industrial_capacity", "Military Industrial Capacity", "Military Industrial Capacity Over Time", "right"),
+    ((1, 2), "budget", "Budget (Billions, PPP$)", "Budget Over Time", "upper right"),
+    ((2, 0), "military_technology", "Military Technology", "Military Technology Over Time", "lower right"),
+    ((2, 1), "industrial_technology", "Industrial Technology", "Industrial Technology Over Time", "lower right"),
+    ((2, 2), "spending", "Spending (Billions, PPP$)", "Spending Over Time", "upper right"),
+)
+
 def plot_dashboard_from_csv(data: dict):
+    import matplotlib.pyplot as plt
+    import seaborn as sns
+
     sns.set_theme(style="darkgrid")
     fig, axs = plt.subplots(3, 3, figsize=(14, 10))
-    time = [i / 365.0 for i in range(len(data['ukraine_gdp']))]
-
-    sns.lineplot(x=time, y=data['ukraine_gdp'], label="Ukraine", ax=axs[0, 0])
-    sns.lineplot(x=time, y=data['russia_gdp'], label="Russia", ax=axs[0, 0])
-    axs[0, 0].fill_between(x=time, y1=data['ukraine_gdp_lower'], y2=data['ukraine_gdp_upper'], alpha=0.3)
-    axs[0, 0].fill_between(x=time, y1=data['russia_gdp_lower'], y2=data['russia_gdp_upper'], alpha=0.3)
-    axs[0, 0].set_xlabel("Time (Years)")
-    axs[0, 0].set_ylabel("GDP (Billions, PPP$)")
-    axs[0, 0].set_title("GDP Over Time")
-    axs[0, 0].legend(loc="upper right")
-
-    sns.lineplot(x=time, y=data['ukraine_military_capability'], label="Ukraine", ax=axs[0, 1])
-    sns.lineplot(x=time, y=data['russia_military_capability'], label="Russia", ax=axs[0, 1])
-    axs[0, 1].fill_between(x=time, y1=data['ukraine_military_capability_lower'], y2=data['ukraine_military_capability_upper'], alpha=0.3)
-    axs[0, 1].fill_between(x=time, y1=data['russia_military_capability_lower'], y2=data['russia_military_capability_upper'], alpha=0.3)
-    axs[0, 1].set_xlabel("Time (Years)")
-    axs[0, 1].set_ylabel("Military Capability")
-    axs[0, 1].set_title("Military Capability Over Time")
-    axs[0, 1].legend(loc="lower right")
-
-    sns.lineplot(x=time, y=data['ukraine_price_level'], label="Ukraine", ax=axs[0, 2])
-    sns.lineplot(x=time, y=data['russia_price_level'], label="Russia", ax=axs[0, 2])
-    axs[0, 2].fill_between(x=time, y1=data['ukraine_price_level_lower'], y2=data['ukraine_price_level_upper'], alpha=0.3)
-    axs[0, 2].fill_between(x=time, y1=data['russia_price_level_lower'], y2=data['russia_price_level_upper'], alpha=0.3)
-    axs[0, 2].set_xlabel("Time (Years)")
-    axs[0, 2].set_ylabel("Price Level")
-    axs[0, 2].set_title("Price Level Over Time")
-    axs[0, 2].legend(loc="lower right")
-
-    sns.lineplot(x=time, y=data['ukraine_civilian_industrial_capacity'], label="Ukraine", ax=axs[1, 0])
-    sns.lineplot(x=time, y=data['russia_civilian_industrial_capacity'], label="Russia", ax=axs[1, 0])
-    axs[1, 0].fill_between(x=time, y1=data['ukraine_civilian_industrial_capacity_lower'], y2=data['ukraine_civilian_industrial_capacity_upper'], alpha=0.3)
-    axs[1, 0].fill_between(x=time, y1=data['russia_civilian_industrial_capacity_lower'], y2=data['russia_civilian_industrial_capacity_upper'], alpha=0.3)
-    axs[1, 0].set_xlabel("Time (Years)")
-    axs[1, 0].set_ylabel("Civilian Industrial Capacity")
-    axs[1, 0].set_title("Civilian Industrial Capacity Over Time")
-    axs[1, 0].legend(loc="right")
-
-    sns.lineplot(x=time, y=data['ukraine_military_industrial_capacity'], label="Ukraine", ax=axs[1, 1])
-    sns.lineplot(x=time, y=data['russia_military_industrial_capacity'], label="Russia", ax=axs[1, 1])
-    axs[1, 1].fill_between(x=time, y1=data['ukraine_military_industrial_capacity_lower'], y2=data['ukraine_military_industrial_capacity_upper'], alpha=0.3)
-    axs[1, 1].fill_between(x=time, y1=data['russia_military_industrial_capacity_lower'], y2=data['russia_military_industrial_capacity_upper'], alpha=0.3)
-    axs[1, 1].set_xlabel("Time (Years)")
-    axs[1, 1].set_ylabel("Military Industrial Capacity")
-    axs[1, 1].set_title("Military Industrial Capacity Over Time")
-    axs[1, 1].legend(loc="right")
-
-    sns.lineplot(x=time, y=data['ukraine_budget'], label="Ukraine", ax=axs[1, 2])
-    sns.lineplot(x=time, y=data['russia_budget'], label="Russia", ax=axs[1, 2])
-    axs[1, 2].fill_between(x=time, y1=data['ukraine_budget_lower'], y2=data['ukraine_budget_upper'], alpha=0.3)
-    axs[1, 2].fill_between(x=time, y1=data['russia_budget_lower'], y2=data['russia_budget_upper'], alpha=0.3)
-    axs[1, 2].set_xlabel("Time (Years)")
-    axs[1, 2].set_ylabel("Budget (Billions, PPP$)")
-    axs[1, 2].set_title("Budget Over Time")
-    axs[1, 2].legend(loc="upper right")
-
-    sns.lineplot(x=time, y=data['ukraine_military_technology'], label="Ukraine", ax=axs[2, 0])
-    sns.lineplot(x=time, y=data['russia_military_technology'], label="Russia", ax=axs[2, 0])
-    axs[2, 0].fill_between(x=time, y1=data['ukraine_military_technology_lower'], y2=data['ukraine_military_technology_upper'], alpha=0.3)
-    axs[2, 0].fill_between(x=time, y1=data['russia_military_technology_lower'], y2=data['russia_military_technology_upper'], alpha=0.3)
-    axs[2, 0].set_xlabel("Time (Years)")
-    axs[2, 0].set_ylabel("Military Technology")
-    axs[2, 0].set_title("Military Technology Over Time")
-    axs[2, 0].legend(loc="lower right")
-
-    sns.lineplot(x=time, y=data['ukraine_industrial_technology'], label="Ukraine", ax=axs[2, 1])
-    sns.lineplot(x=time, y=data['russia_industrial_technology'], label="Russia", ax=axs[2, 1])
-    axs[2, 1].fill_between(x=time, y1=data['ukraine_industrial_technology_lower'], y2=data['ukraine_industrial_technology_upper'], alpha=0.3)
-    axs[2, 1].fill_between(x=time, y1=data['russia_industrial_technology_lower'], y2=data['russia_industrial_technology_upper'], alpha=0.3)
-    axs[2, 1].set_xlabel("Time (Years)")
-    axs[2, 1].set_ylabel("Industrial Technology")
-    axs[2, 1].set_title("Industrial Technology Over Time")
-    axs[2, 1].legend(loc="lower right")
-
-    sns.lineplot(x=time, y=data['ukraine_spending'], label="Ukraine", ax=axs[2, 2])
-    sns.lineplot(x=time, y=data['russia_spending'], label="Russia", ax=axs[2, 2])
-    axs[2, 2].fill_between(x=time, y1=data['ukraine_spending_lower'], y2=data['ukraine_spending_upper'], alpha=0.3)
-    axs[2, 2].fill_between(x=time, y1=data['russia_spending_lower'], y2=data['russia_spending_upper'], alpha=0.3)
-    axs[2, 2].set_xlabel("Time (Years)")
-    axs[2, 2].set_ylabel("Spending (Billions, PPP$)")
-    axs[2, 2].set_title("Spending Over Time")
-    axs[2, 2].legend(loc="upper right")
+    # decimated exports carry the day each row stands for, older daily ones do not
+    columns = list(data.keys()) if isinstance(data, dict) else data.columns
+    length = len(data[next(name for name in columns if name != "day")])
+    time = data['day'].to_numpy() / 365.0 if 'day' in columns else [i / 365.0 for i in range(length)]
+
+    for (row, column), stem, label, title, legend in DASHBOARD_PANELS:
+        ax = axs[row, column]
+        sides = [(side, name) for side, name in (("Ukraine", f"ukraine_{stem}"), ("Russia", f"russia_{stem}")) if name in columns]
+        if not sides:
+            # exports limited to some columns leave the other panels empty
+            ax.set_title(f"{title} (not exported)")
+            ax.set_axis_off()
+            continue
+        for side, name in sides:
+            sns.lineplot(x=time, y=data[name], label=side, ax=ax)
+        for side, name in sides:
+            if f"{name}_lower" in columns and f"{name}_upper" in columns:
+                ax.fill_between(x=time, y1=data[f"{name}_lower"], y2=data[f"{name}_upper"], alpha=0.3)
+        ax.set_xlabel("Time (Years)")
+        ax.set_ylabel(label)
+        ax.set_title(title)
+        ax.legend(loc=legend)
 
     plt.tight_layout()
     plt.show()
 
 
+VARIABLE_LABELS = {
+    "economic_capital": "GDP (Billions, PPP$)",
+    "military_capability": "Military Capability",
+    "civilian_industrial_capacity": "Civilian Industrial Capacity",
+    "military_industrial_capacity": "Military Industrial Capacity",
+    "military_technology": "Military Technology",
+    "industrial_technology": "Industrial Technology",
+    "price_level": "Price Level",
+    "budget": "Budget (Billions, PPP$)",
+    "spending": "Spending (Billions, PPP$)",
+}
+
+def history_variable(variable: str) -> str:
+    # accepts a History variable or its dashboard label
+    labels = {label: name for name, label in VARIABLE_LABELS.items()}
+    if variable not in VARIABLE_LABELS and variable not in labels:
+        raise ValueError(f"Unknown variable: {variable}")
+    return labels.get(variable, variable)
+
+def trajectory_summary(statistics: dict[str, TrajectoryStatistics], variable: str, max_length: int = None, resolution: int = 7):
+    # per-day mean, confidence bounds and quantiles of one variable per belligerant, one row per resolution days
+    import polars as pl
+
+    variable = history_variable(variable)
+    prefix = f"value_{'gdp' if variable == 'economic_capital' else variable}"
+    frames = []
+    for belligerant, trajectory_statistics in statistics.items():
+        columns = {name: values[:max_length] for name, values in trajectory_statistics.columns("value").items()}
+        columns = export_columns(columns, ExportOptions(resolution, columns=(prefix,)))
+        frames.append(pl.DataFrame({
+            "Time": columns.pop("day") / 365.0,
+            "Belligerant": belligerant,
+            **{name[len(prefix) + 1:] or "mean": values for name, values in columns.items()},
+        }))
+    return pl.concat(frames)
+
+def plot_trajectory_bands(statistics: dict[str, TrajectoryStatistics], variable: str, max_length: int = None):
+    import altair as alt
+
+    df = trajectory_summary(statistics, variable, max_length)
+    label = VARIABLE_LABELS[history_variable(variable)]
+    base = alt.Chart(df).encode(x=alt.X('Time:Q', title='Time (Years)'), color='Belligerant:N')
+
+    mean_line = base.mark_line().encode(y=alt.Y('mean:Q', title=f'Mean {label}'))
+    band = base.mark_area(opacity=.3).encode(y='lower:Q', y2='upper:Q')
+    spread = base.mark_area(opacity=.1).encode(y='p05:Q', y2='p95:Q')
+
+    (spread + band + mean_line).properties(width=800, height=400).interactive().show()
+
 def plot_monte_carlo_line(belligerants: list[list[Belligerant]], variable: str, max_length: int):
-    df = monte_carlo_to_df(belligerants, max_length)
-
-    mean_line = alt.Chart(df).mark_line().encode(
-        x='Time',
-        y=alt.Y(f'mean({variable}):Q', title=f'Mean {variable}'),
-        color='Belligerant'
-    )
-        
-    band = alt.Chart(df).mark_errorband(extent='ci').encode(
-        x='Time',
-        y='GDP (Billions, PPP$)',
-        color='Belligerant',
-    )
-
-    (mean_line + band).properties(width=800, height=400).interactive().show()
+    # runs are reduced to per-day statistics first, so the chart holds one row per plotted day and side
+    statistics = {}
+    for runs in belligerants:
+        trajectory_statistics = TrajectoryStatistics(max_length)
+        for belligerant in runs:
+            trajectory_statistics.add(belligerant.history)
+        statistics[runs[0].name] = trajectory_statistics
+    plot_trajectory_bands(statistics, variable, max_length)
 
 def plot_monte_carlo_histograms(lengths: list, winners: list, reasons: list):
+    import matplotlib.pyplot as plt
+    import seaborn as sns
+    import pandas as pd
+
     sns.set_theme(style="darkgrid")
     fig, axs = plt.subplots(1, 3, figsize=(15, 8))
 
@@ -222,48 +215,33 @@ def plot_monte_carlo_histograms(lengths: list, winners: list, reasons: list):
     plt.show()
 
 def calc_confidence_interval_time_series(data: np.ndarray, z_score=1.96):
-    means = np.mean(data, axis=1)
-    std_errs = np.std(data, axis=1, ddof=1) / np.sqrt(data.shape[1])
+    # runs are on the last axis, so this takes (days x runs) or (variables x days x runs) alike
+    means = np.mean(data, axis=-1)
+    std_errs = np.std(data, axis=-1, ddof=1) / np.sqrt(data.shape[-1])
     intervals = std_errs * z_score
     lower_bounds = means - intervals
     upper_bounds = means + intervals
     return means, lower_bounds, upper_bounds
 
-def calc_extend_means(data, max_length):
-    values_at_index = [[] for _ in range(max_length)]
-
-    for lst in data:
-        for i, val in enumerate(lst):
-            values_at_index[i].append(val)
-    means = np.array([np.mean(vals) for vals in values_at_index])
-
-    padded_data = []
-    for lst in data:
-        padded = lst + means[len(lst):].tolist()
-        padded_data.append(padded)
-        
-    return padded_data
-
-def combine_simulation_results(data: list[Belligerant], max_length: int, interpolate_means=False):
+def combine_histories(data: list[Belligerant], max_length: int, interpolate_means=False) -> np.ndarray:
+    # every run's HISTORY_VARIABLES as one (variables x days x runs) array; past a run's termination
+    # it is forward-filled, or with interpolate_means filled with the mean of the runs still going that day
+    values = np.empty((len(HISTORY_VARIABLES), max_length, len(data)))
+    lengths = np.empty(len(data), dtype=np.int64)
+    for run, belligerant in enumerate(data):
+        recorded = belligerant.history.variables(max_length)
+        lengths[run] = recorded.shape[1]
+        values[:, :lengths[run], run] = recorded
+
+    ended = np.arange(max_length)[:, None] >= lengths[None, :]
     if interpolate_means:
-        gdp = np.stack(calc_extend_means([b.history.economic_capital for b in data], max_length), axis=1)
-        military_capability = np.stack(calc_extend_means([b.history.military_capability for b in data], max_length), axis=1)
-        civilian_industrial_capacity = np.stack(calc_extend_means([b.history.civilian_industrial_capacity for b in data], max_length), axis=1)
-        military_industrial_capacity = np.stack(calc_extend_means([b.history.military_industrial_capacity for b in data], max_length), axis=1)
-        military_technology = np.stack(calc_extend_means([b.history.military_technology for b in data], max_length), axis=1)
-        industrial_technology = np.stack(calc_extend_means([b.history.industrial_technology for b in data], max_length), axis=1)
-        price_level = np.stack(calc_extend_means([b.history.price_level for b in data], max_length), axis=1)
-        budget = np.stack(calc_extend_means([b.history.budget for b in data], max_length), axis=1)
-        spending = np.stack(calc_extend_means([b.history.spending for b in data], max_length), axis=1)
+        running = (~ended).sum(axis=1)
+        sums = np.where(ended, 0, values).sum(axis=2)
+        fill = np.divide(sums, running, out=np.full_like(sums, np.nan), where=running > 0)[:, :, None]
     else:
-        gdp = np.stack([(b.history.economic_capital + [b.history.economic_capital[-1]] * (max_length - len(b.history.economic_capital)))[:max_length] for b in data], axis=1)
-        military_capability = np.stack([(b.history.military_capability + [b.history.military_capability[-1]] * (max_length - len(b.history.military_capability)))[:max_length] for b in data], axis=1)
-        civilian_industrial_capacity = np.stack([(b.history.civilian_industrial_capacity + [b.history.civilian_industrial_capacity[-1]] * (max_length - len(b.history.civilian_industrial_capacity)))[:max_length] for b in data], axis=1)
-        military_industrial_capacity = np.stack([(b.history.military_industrial_capacity + [b.history.military_industrial_capacity[-1]] * (max_length - len(b.history.military_industrial_capacity)))[:max_length] for b in data], axis=1)
-        military_technology = np.stack([(b.history.military_technology + [b.history.military_technology[-1]] * (max_length - len(b.history.military_technology)))[:max_length] for b in data], axis=1)
-        industrial_technology = np.stack([(b.history.industrial_technology + [b.history.industrial_technology[-1]] * (max_length - len(b.history.industrial_technology)))[:max_length] for b in data], axis=1)
-        price_level = np.stack([(b.history.price_level + [b.history.price_level[-1]] * (max_length - len(b.history.price_level)))[:max_length] for b in data], axis=1)
-        budget = np.stack([(b.history.budget + [b.history.budget[-1]] * (max_length - len(b.history.budget)))[:max_length] for b in data], axis=1)
-        spending = np.stack([(b.history.spending + [b.history.spending[-1]] * (max_length - len(b.history.spending)))[:max_length] for b in data], axis=1)
-
-    return gdp, military_capability, civilian_industrial_capacity, military_industrial_capacity, military_technology, industrial_technology, price_level, budget, spending
\ No newline at end of file
+        fill = values[:, lengths - 1, np.arange(len(data))][:, None, :]
+    np.copyto(values, fill, where=ended[None, :, :])
+    return values
+
+def combine_simulation_results(data: list[Belligerant], max_length: int, interpolate_means=False):
+    return tuple(combine_histories(data, max_length, interpolate_means))
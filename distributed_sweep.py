@@ -0,0 +1,297 @@
+from run_full_simulation_space import ChunkMerger, create_manifest, load_manifest, save_manifest, pending_scenarios, export_scenario
+from monte_carlo_simulation import simulate_chunk, chunk_sizes
+from aggregation import ExportOptions, RESOLUTIONS, WINDOWS, PRECISIONS, parse_resolution
+from sampling import SAMPLERS
+from instrumentation import RunMetrics, timed_call
+from multiprocessing import Process
+from time import sleep, time
+import argparse
+import json
+import os
+import pickle
+import socket
+import threading
+import numpy as np
+
+LEASE_TIMEOUT = 600
+
+class LeaseQueue:
+    def __init__(self, root: str) -> None:
+        # a directory on storage every host can reach; a job moves pending -> leased -> results, each step an atomic rename
+        self.root: str = root
+        for folder in ("pending", "leased", "results"):
+            os.makedirs(os.path.join(root, folder), exist_ok=True)
+
+    def path(self, folder: str, name: str) -> str:
+        return os.path.join(self.root, folder, name)
+
+    def names(self, folder: str) -> list[str]:
+        return sorted(name for name in os.listdir(os.path.join(self.root, folder)) if not name.endswith(".tmp"))
+
+    def put(self, name: str, job: dict) -> None:
+        with open(f"{self.path('pending', name)}.tmp", "w") as f:
+            json.dump(job, f)
+        os.replace(f"{self.path('pending', name)}.tmp", self.path("pending", name))
+
+    def claim(self) -> tuple[str, dict]:
+        # the rename succeeds for exactly one worker, the others move on to the next job
+        for name in self.names("pending"):
+            try:
+                os.rename(self.path("pending", name), self.path("leased", name))
+            except FileNotFoundError:
+                continue
+            # the lease runs from the claim, not from when the job was queued
+            os.utime(self.path("leased", name))
+            with open(self.path("leased", name)) as f:
+                return name, json.load(f)
+        return None
+
+    def renew(self, name: str) -> None:
+        try:
+            os.utime(self.path("leased", name))
+        except FileNotFoundError:
+            pass
+
+    def complete(self, name: str, result) -> None:
+        with open(f"{self.path('results', name)}.tmp", "wb") as f:
+            pickle.dump(result, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(f"{self.path('results', name)}.tmp", self.path("results", name))
+        self.remove("leased", name)
+
+    def results(self):
+        for name in self.names("results"):
+            with open(self.path("results", name), "rb") as f:
+                result = pickle.load(f)
+            self.remove("results", name)
+            yield name, result
+
+    def remove(self, folder: str, name: str) -> None:
+        try:
+            os.remove(self.path(folder, name))
+        except FileNotFoundError:
+            pass
+
+    def requeue_expired(self, lease_timeout: float) -> list[str]:
+        # a worker renews its leases while it runs them, so a stale lease means the worker died
+        expired = []
+        for name in self.names("leased"):
+            try:
+                if time() - os.path.getmtime(self.path("leased", name)) > lease_timeout:
+                    os.rename(self.path("leased", name), self.path("pending", name))
+                    expired.append(name)
+            except FileNotFoundError:
+                continue
+        return expired
+
+    def stopped(self, since: float = 0) -> bool:
+        # a stop flag older than the worker is left over from an earlier sweep
+        try:
+            return os.path.getmtime(os.path.join(self.root, "stop")) >= since
+        except FileNotFoundError:
+            return False
+
+    def stop(self) -> None:
+        open(os.path.join(self.root, "stop"), "w").close()
+
+    def clear(self) -> None:
+        for folder in ("pending", "leased", "results"):
+            for name in os.listdir(os.path.join(self.root, folder)):
+                self.remove(folder, name)
+        self.remove("", "stop")
+
+def job_name(index: int, chunk_index: int) -> str:
+    # zero padded so workers, which take the first name, finish scenarios in order
+    return f"{index:06d}_{chunk_index:05d}"
+
+def scenario_jobs(manifest: dict, indices: list[int]):
+    # jobs carry everything a worker needs, so workers never read the manifest
+    for index in indices:
+        scenario = manifest["scenarios"][index]
+        for chunk_index, size in enumerate(chunk_sizes(manifest["num_simulations"], manifest["chunk_size"])):
+            yield index, chunk_index, {
+                "index": index,
+                "chunk_index": chunk_index,
+                "timesteps": manifest["timesteps"],
+                "international_interference": scenario["international_interference"],
+                "investment_policies": scenario["investment_policies"],
+                "size": size,
+                "engine": manifest["engine"],
+                "entropy": str(manifest["entropy"]),
+                "spawn_key": scenario["spawn_key"],
+                "sampler": manifest.get("sampler", "random"),
+                "history_dtype": manifest.get("history_dtype", "float64"),
+            }
+
+def job_task(job: dict) -> tuple:
+    # the chunk's seed is the same child of the scenario's SeedSequence that run_simulation_sweep spawns
+    seed = np.random.SeedSequence(int(job["entropy"]), spawn_key=(*job["spawn_key"], job["chunk_index"]))
+    return (job["index"], job["chunk_index"]), job["timesteps"], job["international_interference"], job["investment_policies"], job["size"], job["engine"], seed, job["sampler"], job["history_dtype"]
+
+def heartbeat(queue: LeaseQueue, name: str, finished: threading.Event, interval: float) -> None:
+    while not finished.wait(interval):
+        queue.renew(name)
+
+def run_worker(queue_dir: str, lease_timeout: float = LEASE_TIMEOUT, poll: float = 1.0, name: str = None) -> int:
+    queue = LeaseQueue(queue_dir)
+    name = name or f"{socket.gethostname()}-{os.getpid()}"
+    started = time()
+    completed = 0
+    while not queue.stopped(started):
+        claimed = queue.claim()
+        if claimed is None:
+            sleep(poll)
+            continue
+        job_file, job = claimed
+        running = threading.Event()
+        threading.Thread(target=heartbeat, args=(queue, job_file, running, lease_timeout / 4), daemon=True).start()
+        try:
+            result = timed_call((simulate_chunk, job_task(job)))
+        except Exception as error:
+            # reported instead of left to expire, a chunk that fails here would fail again on every other worker
+            result = {"error": f"{type(error).__name__}: {error}", "worker": name}
+        finally:
+            running.set()
+        queue.complete(job_file, result)
+        completed += 1
+    print(f"Worker {name} stopping after {completed} chunks")
+    return completed
+
+def run_coordinator(manifest: dict, manifest_path: str, queue_dir: str, indices: list[int] = None, lease_timeout: float = LEASE_TIMEOUT, max_pending: int = 64, poll: float = 1.0, metrics_path: str = None, local_workers: int = 0) -> RunMetrics:
+    queue = LeaseQueue(queue_dir)
+    # jobs are rebuilt from the manifest, so anything left from an earlier coordinator is stale
+    queue.clear()
+    workers = start_local_workers(queue_dir, local_workers, lease_timeout)
+    export_options = ExportOptions(**manifest.get("export", {}))
+    scenarios = manifest["scenarios"]
+    pending = pending_scenarios(manifest)
+    print(f"{len(scenarios) - len(pending)} of {len(scenarios)} scenarios already complete")
+    if indices is not None:
+        selected = set(indices)
+        pending = [index for index in pending if index in selected]
+
+    merger = ChunkMerger(manifest)
+    sweep_metrics = RunMetrics(1, manifest["timesteps"] + 1)
+    metrics_path = metrics_path or f"{os.path.splitext(manifest_path)[0]}_metrics.json"
+    store = None
+    if manifest.get("export_format") == "parquet":
+        from results_store import ResultsStore
+
+        store = ResultsStore()
+
+    jobs = scenario_jobs(manifest, pending)
+    outstanding: dict[str, int] = {}
+    exhausted = False
+    with sweep_metrics.phase("simulate"):
+        while not exhausted or outstanding:
+            # queued a bounded number of chunks ahead, so chunks of scenarios that converge are mostly never queued
+            while not exhausted and len(outstanding) < max_pending:
+                index, chunk_index, job = next(jobs, (None, None, None))
+                if job is None:
+                    exhausted = True
+                elif index not in merger.done:
+                    queue.put(job_name(index, chunk_index), job)
+                    outstanding[job_name(index, chunk_index)] = index
+
+            received = 0
+            for name, item in queue.results():
+                received += 1
+                if isinstance(item, dict):
+                    index = outstanding.pop(name, None)
+                    if index is None or index in merger.done:
+                        continue
+                    # the scenario is marked failed and left for a resumed sweep; the rest of the sweep goes on
+                    print(f"Chunk {name} failed on {item['worker']}: {item['error']}")
+                    merger.done.add(index)
+                    drop_queued(queue, outstanding, index)
+                    scenarios[index]["status"] = "failed"
+                    scenarios[index]["error"] = item["error"]
+                    save_manifest(manifest, manifest_path)
+                    continue
+
+                (index, chunk_index), chunk = sweep_metrics.receive(item)
+                outstanding.pop(name, None)
+                aggregate = merger.add(index, chunk_index, chunk)
+                if aggregate is None:
+                    continue
+
+                drop_queued(queue, outstanding, index)
+                with sweep_metrics.phase("export"):
+                    completed = export_scenario(manifest, index, aggregate, store, export_options)
+                sweep_metrics.add_runs(aggregate.lengths)
+                for completed_index in completed:
+                    scenarios[completed_index]["status"] = "complete"
+                if completed:
+                    save_manifest(manifest, manifest_path)
+
+            for name in queue.requeue_expired(lease_timeout):
+                print(f"Lease on {name} expired, requeued")
+            if not received:
+                sleep(poll)
+
+    if store is not None:
+        with sweep_metrics.phase("export"):
+            flushed = store.flush()
+        for completed_index in flushed:
+            scenarios[completed_index]["status"] = "complete"
+        save_manifest(manifest, manifest_path)
+    queue.stop()
+    for worker in workers:
+        worker.join()
+    failed = [index for index, scenario in enumerate(scenarios) if scenario["status"] == "failed"]
+    if failed:
+        print(f"{len(failed)} scenarios failed and are rerun by --resume: {failed}")
+
+    sweep_metrics.finish()
+    sweep_metrics.write_json(metrics_path, queue=queue_dir)
+    return sweep_metrics
+
+def drop_queued(queue: LeaseQueue, outstanding: dict[str, int], index: int) -> None:
+    # chunks of the scenario still queued are dropped; ones already running finish and are ignored
+    for other, other_index in list(outstanding.items()):
+        if other_index == index:
+            queue.remove("pending", other)
+            del outstanding[other]
+
+def start_local_workers(queue_dir: str, count: int, lease_timeout: float = LEASE_TIMEOUT) -> list[Process]:
+    # stand-ins for worker hosts, sharing the queue directory instead of a network file system
+    workers = [Process(target=run_worker, args=(queue_dir, lease_timeout), kwargs={"name": f"local-{i}"}) for i in range(count)]
+    for worker in workers:
+        worker.start()
+    return workers
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("role", choices=["coordinator", "worker"])
+    parser.add_argument("--queue-dir", default="data/queue", help="a directory every coordinator and worker host can reach")
+    parser.add_argument("--lease-timeout", type=float, default=LEASE_TIMEOUT, help="seconds without a heartbeat before a chunk is handed to another worker")
+    parser.add_argument("--manifest", default="data/sweep_manifest.json")
+    parser.add_argument("--num-simulations", type=int, default=12000)
+    parser.add_argument("--chunk-size", type=int, default=500)
+    parser.add_argument("--seed", type=int, default=None)
+    parser.add_argument("--resume", action="store_true")
+    parser.add_argument("--local-workers", type=int, default=0, help="also start this many workers on this host")
+    parser.add_argument("--workers", type=int, default=1, help="worker processes to run on this host")
+    # the coordinator's sweep settings, as in run_full_simulation_space.py
+    parser.add_argument("--engine", choices=["object", "kernel", "ode", "batch"], default="object")
+    parser.add_argument("--format", choices=["csv", "parquet"], default="csv")
+    parser.add_argument("--tolerance", type=float, default=None, help="stop a scenario once every win and reason share is known to within this half-width")
+    parser.add_argument("--length-tolerance", type=float, default=30, help="half-width in days required of the mean conflict length when --tolerance is set")
+    parser.add_argument("--sampler", choices=SAMPLERS, default="random")
+    parser.add_argument("--resolution", type=parse_resolution, default=1, help=f"days per exported row, a number or one of {', '.join(RESOLUTIONS)}")
+    parser.add_argument("--window", choices=WINDOWS, default="sample", help="keep one day per row or average each window")
+    parser.add_argument("--precision", choices=PRECISIONS, default="float64")
+    parser.add_argument("--history-dtype", choices=PRECISIONS, default="float64", help="precision of each run's history while it is aggregated")
+    parser.add_argument("--columns", nargs="*", default=None, help="column stems to export, e.g. russia_gdp ukraine_military_capability")
+    args = parser.parse_args()
+
+    if args.role == "worker":
+        for worker in start_local_workers(args.queue_dir, args.workers, args.lease_timeout):
+            worker.join()
+    else:
+        if args.resume and os.path.exists(args.manifest):
+            manifest = load_manifest(args.manifest)
+        else:
+            export_options = ExportOptions(args.resolution, args.window, args.precision, tuple(args.columns) if args.columns else None)
+            manifest = create_manifest(args.num_simulations, args.chunk_size, args.engine, seed=args.seed, export_format=args.format, tolerance=args.tolerance, length_tolerance=args.length_tolerance, sampler=args.sampler, export_options=export_options, history_dtype=args.history_dtype)
+            save_manifest(manifest, args.manifest)
+        run_coordinator(manifest, args.manifest, args.queue_dir, lease_timeout=args.lease_timeout, local_workers=args.local_workers)
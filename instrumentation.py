@@ -0,0 +1,126 @@
+from collections import defaultdict
+from contextlib import contextmanager
+from time import perf_counter
+import json
+import pickle
+import sys
+import numpy as np
+
+try:
+    import resource
+except ImportError:
+    resource = None
+
+def peak_rss_mb() -> float:
+    if resource is None:
+        return None
+    # ru_maxrss is in kilobytes on Linux
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+def timed_call(args: tuple) -> tuple:
+    # runs in a worker; the result is pickled here so the cost of sending it back can be measured on both ends
+    function, function_args = args
+    start = perf_counter()
+    result = function(function_args)
+    compute = perf_counter() - start
+    start = perf_counter()
+    payload = pickle.dumps(result, protocol=pickle.HIGHEST_PROTOCOL)
+    return compute, perf_counter() - start, peak_rss_mb(), payload
+
+class RunMetrics:
+    def __init__(self, processes: int = 1, max_length: int = 3651) -> None:
+        self.processes: int = processes
+        self.phases: dict[str, float] = defaultdict(float)
+        self.simulations: int = 0
+        self.worker_peak_rss_mb: float = 0
+        # run lengths as counts per day, so records from many scenarios merge exactly
+        self.length_counts: np.ndarray = np.zeros(max_length, dtype=np.int64)
+        self.start: float = perf_counter()
+        self.wall_seconds: float = None
+
+    @contextmanager
+    def phase(self, name: str):
+        start = perf_counter()
+        try:
+            yield
+        finally:
+            self.phases[name] += perf_counter() - start
+
+    def receive(self, item: tuple):
+        compute, serialize, worker_rss, payload = item
+        self.phases["worker_compute"] += compute
+        self.phases["worker_serialize"] += serialize
+        self.worker_peak_rss_mb = max(self.worker_peak_rss_mb, worker_rss or 0)
+        with self.phase("deserialize"):
+            return pickle.loads(payload)
+
+    def add_runs(self, lengths: list[int]) -> None:
+        self.simulations += len(lengths)
+        self.length_counts += np.bincount(np.asarray(lengths, dtype=np.int64), minlength=len(self.length_counts))[:len(self.length_counts)]
+
+    def finish(self, lengths: list[int] = ()) -> 'RunMetrics':
+        self.add_runs(lengths)
+        self.wall_seconds = perf_counter() - self.start
+        return self
+
+    def merge(self, other: 'RunMetrics') -> None:
+        for name, seconds in other.phases.items():
+            self.phases[name] += seconds
+        self.simulations += other.simulations
+        self.worker_peak_rss_mb = max(self.worker_peak_rss_mb, other.worker_peak_rss_mb)
+        self.length_counts += other.length_counts
+
+    def length_percentiles(self) -> dict[str, float]:
+        if self.length_counts.sum() == 0:
+            return {}
+        cumulative = np.cumsum(self.length_counts) / self.length_counts.sum()
+        percentiles = {f"p{q:02d}": int(np.searchsorted(cumulative, q / 100)) for q in (5, 25, 50, 75, 95)}
+        days = np.arange(len(self.length_counts))
+        return {"mean": float(days @ self.length_counts / self.length_counts.sum()), "min": int(days[self.length_counts > 0][0]), **percentiles, "max": int(days[self.length_counts > 0][-1])}
+
+    def record(self) -> dict:
+        wall = self.wall_seconds if self.wall_seconds is not None else perf_counter() - self.start
+        simulate = self.phases.get("simulate", 0)
+        return {
+            "wall_seconds": wall,
+            "phases": dict(self.phases),
+            "simulations": self.simulations,
+            "simulations_per_second": self.simulations / wall if wall else None,
+            "processes": self.processes,
+            # share of the pool's time spent simulating rather than idle, pickling or waiting on the parent
+            "worker_utilization": self.phases.get("worker_compute", 0) / (self.processes * simulate) if simulate else None,
+            "peak_rss_mb": {"main": peak_rss_mb(), "worker": self.worker_peak_rss_mb},
+            "lengths": self.length_percentiles(),
+        }
+
+    def write_json(self, path: str, **extra) -> None:
+        with open(path, "w") as f:
+            json.dump({**self.record(), **extra}, f, indent=2)
+
+class Progress:
+    def __init__(self, total: int, label: str = "runs", interval: float = 2.0, stream=sys.stderr) -> None:
+        self.total: int = total
+        self.label: str = label
+        self.interval: float = interval
+        self.stream = stream
+        self.done: int = 0
+        self.start: float = perf_counter()
+        self.last: float = 0
+
+    def update(self, count: int = 1) -> None:
+        self.done += count
+        now = perf_counter()
+        if now - self.last >= self.interval or self.done >= self.total:
+            self.last = now
+            rate = self.done / (now - self.start)
+            eta = (self.total - self.done) / rate if rate else float("inf")
+            self.stream.write(f"\r{self.done}/{self.total} {self.label}, {rate:.1f}/s, eta {eta:.0f}s  ")
+            if self.done >= self.total:
+                self.stream.write("\n")
+            self.stream.flush()
+
+    def close(self) -> None:
+        # an adaptive run can stop short of total, which would leave the line unterminated
+        if self.done < self.total:
+            self.stream.write("\n")
+            self.stream.flush()
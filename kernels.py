@@ -0,0 +1,224 @@
+import numpy as np
+from typing import Tuple
+
+from classes import Belligerant, Coefficients, HISTORY_FIELDS
+from simulation import create_belligerants, check_termination_conditions
+from schedules import ScenarioSchedule, get_schedule
+# the kernel returns indices into these, the same codes the batch engine uses
+from batch_simulation import WINNERS, REASONS
+
+try:
+    from numba import njit
+    HAS_NUMBA = True
+except ImportError:
+    HAS_NUMBA = False
+
+    def njit(*args, **kwargs):
+        if len(args) == 1 and callable(args[0]):
+            return args[0]
+        return lambda function: function
+
+# per-side parameter columns passed to the kernel
+MILITARY_TECHNOLOGY_INVESTMENT, INDUSTRIAL_TECHNOLOGY_INVESTMENT, MILITARY_INDUSTRIAL_INVESTMENT, CIVILIAN_INDUSTRIAL_INVESTMENT, TAX_REVENUE = range(5)
+# per-side stock columns, initial values in and final values out
+MILITARY_TECHNOLOGY, INDUSTRIAL_TECHNOLOGY, MILITARY_INDUSTRIAL_CAPACITY, CIVILIAN_INDUSTRIAL_CAPACITY, MILITARY_CAPABILITY, ECONOMIC_CAPITAL, BUDGET, SPENDING, ATTACKING_INTENSITY = range(9)
+
+@njit(cache=True)
+def _price_level(coefficients, state, side):
+    return 1 * (
+        1 + coefficients[4] *
+        max(
+            0.0,
+            coefficients[10] *
+            state[side, MILITARY_CAPABILITY] -
+            coefficients[0] *
+            state[side, INDUSTRIAL_TECHNOLOGY] *
+            state[side, MILITARY_INDUSTRIAL_CAPACITY]
+        )
+    )
+
+@njit(cache=True)
+def _delayed(series, offset, t, delay):
+    return series[min(max(int(t - delay) + offset, 0), len(series) - 1)]
+
+@njit(cache=True)
+def simulate_trajectory(timesteps, coefficients, parameters, state, baseline_russian_attacking_intensity, conflict_intensities, sanctions_effect, foreign_aid, offset, history):
+    # coefficients follow the Coefficients field order; history is (side, HISTORY_FIELDS, timesteps + 1)
+    # sanctions_effect and foreign_aid are the per-side ScenarioSchedule series sharing one offset
+    production_efficiency = coefficients[0]
+    initial_economic_capital = np.empty(2)
+
+    for side in range(2):
+        initial_economic_capital[side] = production_efficiency * state[side, INDUSTRIAL_TECHNOLOGY] * state[side, CIVILIAN_INDUSTRIAL_CAPACITY]
+        capital = initial_economic_capital[side] * _delayed(sanctions_effect[side], offset, 0, coefficients[2])
+        price_level = _price_level(coefficients, state, side)
+        budget = ((capital * parameters[side, TAX_REVENUE] * 0.35 / 365 + _delayed(foreign_aid[side], offset, 0, coefficients[3])) / price_level -
+                  coefficients[9] * state[side, MILITARY_CAPABILITY])
+        history[side, 0, 0] = 0.0
+        history[side, 1, 0] = initial_economic_capital[side]
+        history[side, 2, 0] = state[side, INDUSTRIAL_TECHNOLOGY]
+        history[side, 3, 0] = state[side, MILITARY_TECHNOLOGY]
+        history[side, 4, 0] = state[side, CIVILIAN_INDUSTRIAL_CAPACITY]
+        history[side, 5, 0] = state[side, MILITARY_INDUSTRIAL_CAPACITY]
+        history[side, 6, 0] = state[side, MILITARY_CAPABILITY]
+        history[side, 7, 0] = price_level
+        history[side, 8, 0] = budget
+        history[side, 9, 0] = max(budget, 0) * (
+            parameters[side, MILITARY_INDUSTRIAL_INVESTMENT] +
+            parameters[side, CIVILIAN_INDUSTRIAL_INVESTMENT] +
+            parameters[side, MILITARY_TECHNOLOGY_INVESTMENT] +
+            parameters[side, INDUSTRIAL_TECHNOLOGY_INVESTMENT]
+        )
+
+    military_capability = np.empty(2)
+    for t in range(timesteps):
+        conflict_intensity = conflict_intensities[t]
+        if t < 270:
+            state[0, ATTACKING_INTENSITY] = 0.7
+            state[1, ATTACKING_INTENSITY] = 0.25
+        elif t < 540:
+            state[0, ATTACKING_INTENSITY] = 0.7 - (.7 - baseline_russian_attacking_intensity) / 270 * (t - 270)
+            state[1, ATTACKING_INTENSITY] = 1 - state[0, ATTACKING_INTENSITY]
+
+        military_capability[0] = state[0, MILITARY_CAPABILITY]
+        military_capability[1] = state[1, MILITARY_CAPABILITY]
+
+        for side in range(2):
+            M_neg = military_capability[1 - side]
+
+            capital = production_efficiency * state[side, INDUSTRIAL_TECHNOLOGY] * state[side, CIVILIAN_INDUSTRIAL_CAPACITY] * _delayed(sanctions_effect[side], offset, t, coefficients[2])
+            budget = ((capital * parameters[side, TAX_REVENUE] * 0.35 / 365 + _delayed(foreign_aid[side], offset, t, coefficients[3])) /
+                      _price_level(coefficients, state, side) -
+                      coefficients[9] * state[side, MILITARY_CAPABILITY])
+            positive_budget = max(budget, 0)
+            industrial_attrition = coefficients[12] * M_neg ** 1.1
+
+            state[side, ECONOMIC_CAPITAL] = capital + min(budget, 0)
+            state[side, BUDGET] = budget
+            state[side, SPENDING] = positive_budget * (
+                parameters[side, MILITARY_INDUSTRIAL_INVESTMENT] +
+                parameters[side, CIVILIAN_INDUSTRIAL_INVESTMENT] +
+                parameters[side, MILITARY_TECHNOLOGY_INVESTMENT] +
+                parameters[side, INDUSTRIAL_TECHNOLOGY_INVESTMENT]
+            )
+            state[side, INDUSTRIAL_TECHNOLOGY] += coefficients[6] * parameters[side, INDUSTRIAL_TECHNOLOGY_INVESTMENT] * positive_budget
+            state[side, MILITARY_TECHNOLOGY] += coefficients[5] * parameters[side, MILITARY_TECHNOLOGY_INVESTMENT] * positive_budget
+            state[side, CIVILIAN_INDUSTRIAL_CAPACITY] += (
+                coefficients[8] * parameters[side, CIVILIAN_INDUSTRIAL_INVESTMENT] * positive_budget -
+                industrial_attrition * state[side, CIVILIAN_INDUSTRIAL_CAPACITY]
+            )
+            state[side, MILITARY_INDUSTRIAL_CAPACITY] += (
+                coefficients[7] * parameters[side, MILITARY_INDUSTRIAL_INVESTMENT] * positive_budget -
+                industrial_attrition * state[side, MILITARY_INDUSTRIAL_CAPACITY]
+            )
+            state[side, MILITARY_CAPABILITY] += (
+                coefficients[1] * state[side, MILITARY_TECHNOLOGY] * production_efficiency *
+                state[side, INDUSTRIAL_TECHNOLOGY] * state[side, MILITARY_INDUSTRIAL_CAPACITY] -
+                state[side, ATTACKING_INTENSITY] * conflict_intensity * coefficients[11] * M_neg ** 1.5
+            )
+
+            history[side, 0, t + 1] = t
+            history[side, 1, t + 1] = state[side, ECONOMIC_CAPITAL]
+            history[side, 2, t + 1] = state[side, INDUSTRIAL_TECHNOLOGY]
+            history[side, 3, t + 1] = state[side, MILITARY_TECHNOLOGY]
+            history[side, 4, t + 1] = state[side, CIVILIAN_INDUSTRIAL_CAPACITY]
+            history[side, 5, t + 1] = state[side, MILITARY_INDUSTRIAL_CAPACITY]
+            history[side, 6, t + 1] = state[side, MILITARY_CAPABILITY]
+            history[side, 7, t + 1] = _price_level(coefficients, state, side)
+            history[side, 8, t + 1] = state[side, BUDGET]
+            history[side, 9, t + 1] = state[side, SPENDING]
+
+        # same precedence as simulation.check_termination_conditions
+        winner = 0
+        reason = 0
+        for side in range(2):
+            if state[side, ECONOMIC_CAPITAL] < 0.6 * initial_economic_capital[side]:
+                winner = 2 - side
+                reason = 1
+            elif state[side, MILITARY_CAPABILITY] <= 15:
+                winner = 2 - side
+                reason = 2
+        if state[0, MILITARY_CAPABILITY] > 4 * state[1, MILITARY_CAPABILITY]:
+            winner = 1
+            reason = 3
+        elif state[1, MILITARY_CAPABILITY] > 4 * state[0, MILITARY_CAPABILITY]:
+            winner = 2
+            reason = 3
+        if reason > 0:
+            return t, winner, reason
+
+    return timesteps, 0, 0
+
+def _kernel_inputs(belligerant: Belligerant) -> Tuple[list, list]:
+    parameters = [
+        belligerant.military_technology_investment_percentage,
+        belligerant.industrial_technology_investment_percentage,
+        belligerant.military_industrial_investment_percentage,
+        belligerant.civilian_industrial_investment_percentage,
+        belligerant.tax_revenue_percentage,
+    ]
+    state = [
+        belligerant.military_technology,
+        belligerant.industrial_technology,
+        belligerant.military_industrial_capacity,
+        belligerant.civilian_industrial_capacity,
+        belligerant.military_capability,
+        belligerant.economic_capital,
+        belligerant.current_budget,
+        belligerant.current_spending,
+        belligerant.attacking_intensity,
+    ]
+    return parameters, state
+
+def _restore_belligerant(belligerant: Belligerant, state: np.ndarray, history: np.ndarray, length: int) -> None:
+    belligerant.military_technology = float(state[MILITARY_TECHNOLOGY])
+    belligerant.industrial_technology = float(state[INDUSTRIAL_TECHNOLOGY])
+    belligerant.military_industrial_capacity = float(state[MILITARY_INDUSTRIAL_CAPACITY])
+    belligerant.civilian_industrial_capacity = float(state[CIVILIAN_INDUSTRIAL_CAPACITY])
+    belligerant.military_capability = float(state[MILITARY_CAPABILITY])
+    belligerant.economic_capital = float(state[ECONOMIC_CAPITAL])
+    belligerant.current_budget = float(state[BUDGET])
+    belligerant.current_spending = float(state[SPENDING])
+    belligerant.attacking_intensity = float(state[ATTACKING_INTENSITY])
+    belligerant.history.data = history.astype(belligerant.history.data.dtype, copy=False)
+    belligerant.history.length = length
+
+def run_simulation_kernel(timesteps: int, coefficients: Coefficients, international_interference, investment_policies, monte_carlo=False, rng=np.random, schedule: ScenarioSchedule = None, history_dtype=np.float64) -> Tuple[Belligerant, Belligerant, int, str, str]:
+    if not international_interference:
+        international_interference: dict[str, float] = {}
+        international_interference['foreign_aid_russia'] = 0
+        international_interference['sanctions_ukraine'] = 0
+        international_interference['foreign_aid_ukraine'] = .24
+        international_interference['sanctions_russia'] = .14
+
+    if not investment_policies:
+        investment_policies: dict[str, list] = {}
+        investment_policies['ukraine'] = [.25, .25, .25, .25]
+        investment_policies['russia'] = [.25, .25, .25, .25]
+
+    if schedule is None:
+        schedule = get_schedule(timesteps, international_interference)
+
+    russian_federation, ukraine = create_belligerants(coefficients, international_interference, investment_policies, monte_carlo, timesteps + 1, rng, schedule, history_dtype)
+    baseline_russian_attacking_intensity = rng.normal(.62,.02)
+    sanctions_effect = np.stack([schedule.sanctions_effect['russia'].values, schedule.sanctions_effect['ukraine'].values])
+    foreign_aid = np.stack([schedule.foreign_aid['russia'].values, schedule.foreign_aid['ukraine'].values])
+
+    russia_parameters, russia_state = _kernel_inputs(russian_federation)
+    ukraine_parameters, ukraine_state = _kernel_inputs(ukraine)
+    parameters = np.array([russia_parameters, ukraine_parameters], dtype=np.float64)
+    state = np.array([russia_state, ukraine_state], dtype=np.float64)
+    history = np.empty((2, len(HISTORY_FIELDS), timesteps + 1))
+    kernel_coefficients = np.array([coefficients.get_by_index(i) for i in range(13)], dtype=np.float64)
+
+    t, winner, reason = simulate_trajectory(
+        timesteps, kernel_coefficients, parameters, state, baseline_russian_attacking_intensity,
+        schedule.conflict_intensity, sanctions_effect, foreign_aid, schedule.sanctions_effect['russia'].offset, history
+    )
+    length = min(t, timesteps - 1) + 2
+    _restore_belligerant(russian_federation, state[0], history[0], length)
+    _restore_belligerant(ukraine, state[1], history[1], length)
+
+    if reason > 0 and not monte_carlo:
+        check_termination_conditions([russian_federation, ukraine], monte_carlo=monte_carlo)
+    return russian_federation, ukraine, t, WINNERS[winner], REASONS[reason]
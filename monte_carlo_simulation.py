@@ -1,38 +1,93 @@
 from simulation import run_simulation
+from batch_simulation import run_batch_simulation
+from aggregation import TrajectoryStatistics, ScenarioAggregate, ExportOptions, interval_columns, export_columns
+from quantiles import QuantileSketch, QUANTILES
 from classes import Coefficients
+from instrumentation import RunMetrics, Progress, timed_call
+from sampling import sample_coefficients, sample_run_coefficients, coefficients_row
+from result_cache import ResultCache, result_key
 import numpy as np
-from data_analysis import plot_monte_carlo_histograms, plot_monte_carlo_line, combine_simulation_results, calc_confidence_interval_time_series
+from data_analysis import plot_monte_carlo_histograms, plot_monte_carlo_line, plot_trajectory_bands, combine_histories, calc_confidence_interval_time_series
 from multiprocessing import Pool
-import polars as pl
-
-def individual_simulation(args: tuple[int, dict[str, float], dict[str, list]]):
-    timesteps, international_interference, investment_policies = args
-    global_sampled_coefficients: Coefficients = Coefficients(
-            production_efficiency=8,
-            military_capability_weight=np.random.uniform(5e-5, 7e-4),
-            sanctions_delay=int(np.random.normal(60, 10)),
-            foreign_aid_delay=int(np.random.normal(60, 10)),
-            elasticity_coefficient=np.random.uniform(8e-5, 6e-4),
-            military_technology_investment_coefficient=np.random.uniform(5e-4, 5e-3),
-            industrial_technology_investment_coefficient=np.random.uniform(1e-4, 1e-3),
-            military_industrial_investment_coefficient=np.random.uniform(1e-1, 1e0),
-            civilian_industrial_investment_coefficient=np.random.uniform(1e-2, 5e-1),
-            military_consumption_cost_coefficient=np.random.uniform(1e-4, 5e-3),
-            military_demand_coefficient=np.random.uniform(.5, 6),
-            military_attrition_coefficient=np.random.uniform(5e-6, 6e-4),
-            industrial_attrition_coefficient=np.random.uniform(8e-8, 1e-6),
-            spending_scaling_coefficient=np.random.uniform(1e-1, 1e0),
-            conflict_intensity=2.5,
-            epsilon=1e-10,
-        )
-        
-    return run_simulation(timesteps, global_sampled_coefficients, international_interference, investment_policies, monte_carlo=True)
+import os
+
+def individual_simulation(args: tuple[int, dict[str, float], dict[str, list], np.random.SeedSequence, str, Coefficients, type]):
+    timesteps, international_interference, investment_policies, seed, engine, coefficients, history_dtype = args
+    rng = np.random.default_rng(seed)
+    simulate = run_simulation
+    if engine == "kernel":
+        # numba is slow to import, so only runs that ask for the kernel load it
+        from kernels import run_simulation_kernel
+
+        simulate = run_simulation_kernel
+    elif engine == "ode":
+        from ode_simulation import run_ode_simulation
+
+        simulate = run_ode_simulation
+    # coefficients come from a quasi-random design built by the caller, or are drawn here from the priors
+    if coefficients is None:
+        coefficients = sample_run_coefficients(rng)
+
+    return simulate(timesteps, coefficients, international_interference, investment_policies, monte_carlo=True, rng=rng, history_dtype=history_dtype)
+
+def design_rows(num_runs: int, sampler: str, seed: np.random.SeedSequence) -> list:
+    if sampler == "random":
+        return [None] * num_runs
+    design = sample_coefficients(num_runs, np.random.default_rng(seed), sampler)
+    return [coefficients_row(design, i) for i in range(num_runs)]
+
+def batch_simulation(args: tuple[int, dict[str, float], dict[str, list], int, np.random.SeedSequence, str]) -> ScenarioAggregate:
+    timesteps, international_interference, investment_policies, num_runs, seed, sampler = args
+    rng = np.random.default_rng(seed)
+    russia, ukraine, lengths, winners, reasons = run_batch_simulation(timesteps, sample_coefficients(num_runs, rng, sampler), international_interference, investment_policies, num_runs, rng=rng)
+    aggregate = ScenarioAggregate(timesteps + 1)
+    aggregate.russia = TrajectoryStatistics(timesteps + 1, num_runs, russia.history_mean, russia.history_m2, QuantileSketch.from_sample(russia.history_sketch.transpose(1, 2, 0), russia.sketch_level))
+    aggregate.ukraine = TrajectoryStatistics(timesteps + 1, num_runs, ukraine.history_mean, ukraine.history_m2, QuantileSketch.from_sample(ukraine.history_sketch.transpose(1, 2, 0), ukraine.sketch_level))
+    aggregate.lengths = lengths.tolist()
+    aggregate.winners = winners.tolist()
+    aggregate.reasons = reasons.tolist()
+    return aggregate
+
+def simulate_chunk(args: tuple) -> tuple:
+    key, timesteps, international_interference, investment_policies, num_runs, engine, seed, sampler, history_dtype = args
+    if engine == "batch":
+        return key, batch_simulation((timesteps, international_interference, investment_policies, num_runs, seed, sampler))
+
+    design_seed, seed = seed.spawn(2) if sampler != "random" else (None, seed)
+    rng = np.random.default_rng(seed)
+    aggregate = ScenarioAggregate(timesteps + 1)
+    for coefficients in design_rows(num_runs, sampler, design_seed):
+        aggregate.add(*individual_simulation((timesteps, international_interference, investment_policies, rng, engine, coefficients, history_dtype)))
+    return key, aggregate
+
+def chunk_sizes(num_simulations: int, chunk_size: int) -> list[int]:
+    return [chunk_size] * (num_simulations // chunk_size) + ([num_simulations % chunk_size] if num_simulations % chunk_size else [])
+
+def print_summary(aggregate: ScenarioAggregate) -> None:
+    print("-----------------")
+    print(f"Ran {aggregate.count} Simulations")
+    print(f"Average length of conflict: {np.mean(aggregate.lengths) / 365.0} years")
+    print(f"Standard deviation of conflict length: {np.std(aggregate.lengths) / 365.0} years")
+    print(f"Most wins: {max(set(aggregate.winners), key=aggregate.winners.count)}")
+    print(f"Number of inconclusive simulations: {aggregate.winners.count('None')}")
+
+def results_path(international_interference: dict[str, float], investment_policies: dict[str, list]) -> str:
+    return f"data/ukraine_{investment_policies.get('ukraine')}_russia_{investment_policies.get('russia')}_aid_{international_interference.get('foreign_aid_ukraine')}_sanctions_{international_interference.get('sanctions_russia')}.csv"
 
-def run_monte_carlo_simulation(num_simulations: int, international_interference: dict[str, float] = None, investment_policies: dict[str, list] = None, plot_line: bool = False, plot_histograms: bool = False, export: bool = False):
+def write_results(aggregate: ScenarioAggregate, results_dict: dict, international_interference: dict[str, float], investment_policies: dict[str, list], export_options: ExportOptions = None) -> None:
+    import polars as pl
+
+    export_options = export_options or ExportOptions()
+    sims_df = pl.DataFrame({
+        "winners": aggregate.winners,
+        "lengths": aggregate.lengths,
+        "reasons": aggregate.reasons,
+    }).with_columns(pl.lit(aggregate.count).alias("runs"), pl.lit(export_options.resolution).alias("resolution"), pl.lit(export_options.window).alias("window"))
+    df = pl.concat([sims_df, pl.DataFrame(results_dict)], how="horizontal")
+    df.write_csv(results_path(international_interference, investment_policies))
+
+def run_monte_carlo_simulation(num_simulations: int, international_interference: dict[str, float] = None, investment_policies: dict[str, list] = None, plot_line: bool = False, plot_histograms: bool = False, export: bool = False, engine: str = "object", batch_size: int = 1000, streaming: bool = False, seed: int = None, export_format: str = "csv", tolerance: float = None, length_tolerance: float = 30, sampler: str = "random", metrics: RunMetrics = None, metrics_path: str = None, progress: bool = False, export_options: ExportOptions = None, cache_dir: str = None, processes: int = None, history_dtype=np.float64):
     timesteps = 3650
-    winners = []
-    reasons = []
-    lengths = []
     russia_results = []
     ukraine_results = []
 
@@ -48,71 +103,113 @@ def run_monte_carlo_simulation(num_simulations: int, international_interference:
         investment_policies['ukraine'] = [.25, .25, .25, .25]
         investment_policies['russia'] = [.25, .25, .25, .25]
 
-    with Pool(processes=12) as pool:
-        results = pool.imap(individual_simulation, [(timesteps, international_interference, investment_policies)] * num_simulations)
-        
-        for result in results:
-            russia, ukraine, length, winner, reason = result
-            russia_results.append(russia)
-            ukraine_results.append(ukraine)
-            winners.append(winner)
-            reasons.append(reason)
-            lengths.append(length)
+    streaming = streaming or engine == "batch"
+    if engine not in ("object", "kernel", "ode", "batch"):
+        raise ValueError(f"Unknown engine: {engine}")
+    aggregate = ScenarioAggregate(timesteps + 1)
+    seed_sequence = np.random.SeedSequence(seed)
+    processes = processes or os.cpu_count()
+    # callers may pass their own RunMetrics to read the phase timings back
+    metrics = RunMetrics(processes, timesteps + 1) if metrics is None else metrics
+    progress = Progress(num_simulations) if progress else None
 
-    print("-----------------")
-    print(f"Ran {num_simulations} Simulations")
-    print(f"Average length of conflict: {np.mean(lengths) / 365.0} years")
-    print(f"Standard deviation of conflict length: {np.std(lengths) / 365.0} years")
-    print(f"Most wins: {max(set(winners), key=winners.count)}")
-    print(f"Number of inconclusive simulations: {winners.count('None')}")
+    # only seeded runs are reproducible, so only those are cached
+    cache = ResultCache(cache_dir) if cache_dir and seed is not None else None
+    # only batch runs with a tolerance split their rounds by the worker count, every other run draws the same runs on any machine
+    chunking = {"processes": processes} if engine == "batch" and tolerance is not None else {}
+    cache_key = None if cache is None else result_key(international_interference, investment_policies, timesteps, seed, num_simulations=num_simulations, engine=engine, batch_size=batch_size, streaming=streaming, tolerance=tolerance, length_tolerance=length_tolerance, sampler=sampler, history_dtype=np.dtype(history_dtype).name, **chunking)
+    cached = cache.get(cache_key) if cache else None
+    if cached is not None and not streaming and (plot_line or (export and cached["columns"] is None)):
+        # per-run histories are not cached, a run that needs them again is simulated again
+        cached = None
+    if cached is not None:
+        aggregate = cached["aggregate"]
+        print(f"Loaded {aggregate.count} simulations from the result cache")
+    else:
+        with Pool(processes=processes) as pool, metrics.phase("simulate"):
+            while aggregate.count < num_simulations:
+                # a fixed run is a single round; with a tolerance, precision is checked after every batch_size runs and num_simulations is the cap
+                round_size = num_simulations - aggregate.count if tolerance is None else min(batch_size, num_simulations - aggregate.count)
+                if engine == "batch":
+                    sizes = chunk_sizes(round_size, batch_size if tolerance is None else -(-round_size // processes))
+                    results = pool.imap(timed_call, [(batch_simulation, (timesteps, international_interference, investment_policies, size, child, sampler)) for size, child in zip(sizes, seed_sequence.spawn(len(sizes)))])
+
+                    for item in results:
+                        result = metrics.receive(item)
+                        aggregate.merge(result)
+                        if progress:
+                            progress.update(result.count)
+                else:
+                    design = design_rows(round_size, sampler, seed_sequence.spawn(1)[0] if sampler != "random" else None)
+                    results = pool.imap(timed_call, [(individual_simulation, (timesteps, international_interference, investment_policies, child, engine, coefficients, history_dtype)) for child, coefficients in zip(seed_sequence.spawn(round_size), design)])
+
+                    for item in results:
+                        russia, ukraine, length, winner, reason = metrics.receive(item)
+                        if progress:
+                            progress.update()
+                        if streaming:
+                            aggregate.add(russia, ukraine, length, winner, reason)
+                        else:
+                            aggregate.add_outcome(length, winner, reason)
+                            russia_results.append(russia)
+                            ukraine_results.append(ukraine)
+
+                if tolerance is not None and aggregate.converged(tolerance, length_tolerance):
+                    print(f"Reached precision after {aggregate.count} of at most {num_simulations} runs")
+                    break
+
+        if progress:
+            progress.close()
+
+    print_summary(aggregate)
 
     if export:
-        sims_df = pl.DataFrame({
-            "winners": winners,
-            "lengths": lengths,
-            "reasons": reasons,
-        })
         results_dict = {}
-        for name, x in [("russia", russia_results), ("ukraine", ukraine_results)]:
-            gdp, military_capability, civilian_industrial_capacity, military_industrial_capacity, military_technology, industrial_technology, price_level, budget, spending = combine_simulation_results(x, 3651, interpolate_means=False)
-            results_dict[f"{name}_gdp"] = calc_confidence_interval_time_series(gdp)[0]
-            results_dict[f"{name}_gdp_lower"] = calc_confidence_interval_time_series(gdp)[1]
-            results_dict[f"{name}_gdp_upper"] = calc_confidence_interval_time_series(gdp)[2]
-            results_dict[f"{name}_military_capability"] = calc_confidence_interval_time_series(military_capability)[0]
-            results_dict[f"{name}_military_capability_lower"] = calc_confidence_interval_time_series(military_capability)[1]
-            results_dict[f"{name}_military_capability_upper"] = calc_confidence_interval_time_series(military_capability)[2]
-            results_dict[f"{name}_civilian_industrial_capacity"] = calc_confidence_interval_time_series(civilian_industrial_capacity)[0]
-            results_dict[f"{name}_civilian_industrial_capacity_lower"] = calc_confidence_interval_time_series(civilian_industrial_capacity)[1]
-            results_dict[f"{name}_civilian_industrial_capacity_upper"] = calc_confidence_interval_time_series(civilian_industrial_capacity)[2]
-            results_dict[f"{name}_military_industrial_capacity"] = calc_confidence_interval_time_series(military_industrial_capacity)[0]
-            results_dict[f"{name}_military_industrial_capacity_lower"] = calc_confidence_interval_time_series(military_industrial_capacity)[1]
-            results_dict[f"{name}_military_industrial_capacity_upper"] = calc_confidence_interval_time_series(military_industrial_capacity)[2]
-            results_dict[f"{name}_military_technology"] = calc_confidence_interval_time_series(military_technology)[0]
-            results_dict[f"{name}_military_technology_lower"] = calc_confidence_interval_time_series(military_technology)[1]
-            results_dict[f"{name}_military_technology_upper"] = calc_confidence_interval_time_series(military_technology)[2]
-            results_dict[f"{name}_industrial_technology"] = calc_confidence_interval_time_series(industrial_technology)[0]
-            results_dict[f"{name}_industrial_technology_lower"] = calc_confidence_interval_time_series(industrial_technology)[1]
-            results_dict[f"{name}_industrial_technology_upper"] = calc_confidence_interval_time_series(industrial_technology)[2]
-            results_dict[f"{name}_price_level"] = calc_confidence_interval_time_series(price_level)[0]
-            results_dict[f"{name}_price_level_lower"] = calc_confidence_interval_time_series(price_level)[1]
-            results_dict[f"{name}_price_level_upper"] = calc_confidence_interval_time_series(price_level)[2]
-            results_dict[f"{name}_budget"] = calc_confidence_interval_time_series(budget)[0]
-            results_dict[f"{name}_budget_lower"] = calc_confidence_interval_time_series(budget)[1]
-            results_dict[f"{name}_budget_upper"] = calc_confidence_interval_time_series(budget)[2]
-            results_dict[f"{name}_spending"] = calc_confidence_interval_time_series(spending)[0]
-            results_dict[f"{name}_spending_lower"] = calc_confidence_interval_time_series(spending)[1]
-            results_dict[f"{name}_spending_upper"] = calc_confidence_interval_time_series(spending)[2]
-
-        df = pl.concat([sims_df, pl.DataFrame(results_dict)], how="horizontal")
-        df.write_csv(f"data/ukraine_{investment_policies.get('ukraine')}_russia_{investment_policies.get('russia')}_aid_{international_interference.get('foreign_aid_ukraine')}_sanctions_{international_interference.get('sanctions_russia')}.csv")
-        del df
+        if streaming:
+            with metrics.phase("confidence_intervals"):
+                results_dict = aggregate.columns()
+        elif cached is not None:
+            results_dict = cached["columns"]
+        else:
+            for name, x in [("russia", russia_results), ("ukraine", ukraine_results)]:
+                with metrics.phase("combine"):
+                    combined = combine_histories(x, timesteps + 1)
+                with metrics.phase("confidence_intervals"):
+                    intervals = calc_confidence_interval_time_series(combined)
+                    # combined is dropped right after, so it can be partially sorted in place rather than copied; inverted_cdf is
+                    # the rule QuantileSketch.quantiles uses, so both export paths define the percentiles the same way
+                    results_dict.update(interval_columns(name, *intervals, np.quantile(combined, QUANTILES, axis=-1, overwrite_input=True, method="inverted_cdf")))
+                del combined
+
+        with metrics.phase("export"):
+            exported = export_columns(results_dict, export_options)
+            if export_format == "parquet":
+                from results_store import ResultsStore
+
+                store = ResultsStore()
+                store.add(aggregate, exported, international_interference, investment_policies, export_options=export_options)
+                store.flush()
+            else:
+                write_results(aggregate, exported, international_interference, investment_policies, export_options)
+
+    if cache is not None and cached is None:
+        # streamed aggregates rebuild their columns; otherwise the exact columns are all that survives the per-run histories
+        cache.put(cache_key, aggregate, results_dict if export and not streaming else None)
+
+    metrics.finish(aggregate.lengths)
+    if metrics_path:
+        metrics.write_json(metrics_path, engine=engine, international_interference=international_interference, investment_policies=investment_policies)
 
     if plot_histograms:
-        plot_monte_carlo_histograms(lengths, winners, reasons)
+        plot_monte_carlo_histograms(aggregate.lengths, aggregate.winners, aggregate.reasons)
     if plot_line:
-        plot_monte_carlo_line([russia_results, ukraine_results], "GDP (Billions, PPP$)", max(lengths))
+        if streaming:
+            plot_trajectory_bands({"Russian Federation": aggregate.russia, "Ukraine": aggregate.ukraine}, "economic_capital", max(aggregate.lengths))
+        else:
+            plot_monte_carlo_line([russia_results, ukraine_results], "economic_capital", max(aggregate.lengths))
 
-    del winners, reasons, lengths, russia_results, ukraine_results
+    del russia_results, ukraine_results
+    return aggregate
         
 
 if __name__ == "__main__":
@@ -0,0 +1,239 @@
+import numpy as np
+from typing import Tuple
+from scipy.integrate import solve_ivp
+
+from classes import Belligerant, Coefficients
+from simulation import create_belligerants, run_simulation, print_endgame_stats
+from schedules import ScenarioSchedule, get_schedule
+
+# the stocks integrated for each side, russia's first; economic capital, price level, budget and spending follow from them
+STOCKS = ("industrial_technology", "military_technology", "civilian_industrial_capacity", "military_industrial_capacity", "military_capability")
+MILITARY_CAPABILITY = STOCKS.index("military_capability")
+# forcing columns: conflict intensity, then attacking intensity, sanctions effect and foreign aid of russia and ukraine
+CONFLICT_INTENSITY, ATTACKING_INTENSITY, SANCTIONS_EFFECT, FOREIGN_AID = 0, 1, 3, 5
+
+def forcing_table(timesteps: int, schedule: ScenarioSchedule, belligerants: Tuple[Belligerant, Belligerant], baseline_russian_attacking_intensity: float) -> np.ndarray:
+    # the daily inputs of the fixed-step update, one row per day
+    days = np.arange(timesteps + 1)
+    russia, ukraine = schedule.attacking_intensities(baseline_russian_attacking_intensity)
+    table = np.empty((timesteps + 1, 7))
+    table[:, CONFLICT_INTENSITY] = schedule.conflict_intensity[np.minimum(days, timesteps - 1)]
+    # the intensities stay at their day 539 values once the ramp ends
+    table[:, ATTACKING_INTENSITY] = russia[np.minimum(days, len(russia) - 1)]
+    table[:, ATTACKING_INTENSITY + 1] = ukraine[np.minimum(days, len(ukraine) - 1)]
+    for side, belligerant in enumerate(belligerants):
+        table[:, SANCTIONS_EFFECT + side] = belligerant.sanctions_by_day
+        table[:, FOREIGN_AID + side] = belligerant.foreign_aid_by_day
+    return table
+
+class ContinuousWar:
+    __slots__ = ("coefficients", "parameters", "forcing", "steady_day", "steady_forcing", "collapse_capital")
+
+    def __init__(self, belligerants: Tuple[Belligerant, Belligerant], coefficients: Coefficients, forcing: np.ndarray) -> None:
+        # the growth equations of Belligerant.update read as derivatives per day, with the daily inputs interpolated linearly
+        self.coefficients: Coefficients = coefficients
+        self.parameters: list[tuple] = [(
+            belligerant.industrial_technology_investment_percentage,
+            belligerant.military_technology_investment_percentage,
+            belligerant.civilian_industrial_investment_percentage,
+            belligerant.military_industrial_investment_percentage,
+            belligerant.tax_revenue_percentage,
+        ) for belligerant in belligerants]
+        self.forcing: np.ndarray = forcing
+        # past the last day any input changes the system is autonomous, which is where the long steps come from
+        changed = np.flatnonzero(np.any(forcing != forcing[-1], axis=1))
+        self.steady_day: int = int(changed[-1]) + 1 if len(changed) else 0
+        self.steady_forcing: list[float] = forcing[-1].tolist()
+        self.collapse_capital: list[float] = [0.6 * belligerant.history.economic_capital[0] for belligerant in belligerants]
+
+    def inputs(self, s: float) -> list[float]:
+        if s >= self.steady_day:
+            return self.steady_forcing
+        day = int(s)
+        weight = s - day
+        return (self.forcing[day] + weight * (self.forcing[day + 1] - self.forcing[day])).tolist()
+
+    def budget(self, side: int, y: np.ndarray, inputs: list[float]) -> Tuple[float, float]:
+        # (capital, budget) as Belligerant.economic_capital_equation and Belligerant.budget compute them
+        c = self.coefficients
+        industrial_technology, _, civilian_industrial_capacity, military_industrial_capacity, military_capability = y[5 * side:5 * side + 5]
+        capital = c.production_efficiency * industrial_technology * civilian_industrial_capacity * inputs[SANCTIONS_EFFECT + side]
+        price_level = 1 + c.elasticity_coefficient * max(0, c.military_demand_coefficient * military_capability - c.production_efficiency * industrial_technology * military_industrial_capacity)
+        budget = (capital * self.parameters[side][4] * 0.35 / 365 + inputs[FOREIGN_AID + side]) / price_level - c.military_consumption_cost_coefficient * military_capability
+        return capital, budget
+
+    def derivatives(self, s: float, y: np.ndarray) -> list[float]:
+        c = self.coefficients
+        inputs = self.inputs(s)
+        derivatives = []
+        for side in range(2):
+            industrial_technology, military_technology, civilian_industrial_capacity, military_industrial_capacity, _ = y[5 * side:5 * side + 5]
+            # a solver stage can overshoot past the military collapse event, where a negative power would be complex
+            M_neg = max(y[5 * (1 - side) + MILITARY_CAPABILITY], 0)
+            positive_budget = max(self.budget(side, y, inputs)[1], 0)
+            industrial_attrition = c.industrial_attrition_coefficient * M_neg ** 1.1
+            it_share, mt_share, cic_share, mic_share, _ = self.parameters[side]
+            derivatives += [
+                c.industrial_technology_investment_coefficient * it_share * positive_budget,
+                c.military_technology_investment_coefficient * mt_share * positive_budget,
+                c.civilian_industrial_investment_coefficient * cic_share * positive_budget - industrial_attrition * civilian_industrial_capacity,
+                c.military_industrial_investment_coefficient * mic_share * positive_budget - industrial_attrition * military_industrial_capacity,
+                c.military_capability_weight * military_technology * c.production_efficiency * industrial_technology * military_industrial_capacity -
+                inputs[ATTACKING_INTENSITY + side] * inputs[CONFLICT_INTENSITY] * c.military_attrition_coefficient * M_neg ** 1.5,
+            ]
+        return derivatives
+
+    def events(self) -> list:
+        # (event, winner side, reason), in increasing precedence as simulation.check_termination_conditions resolves ties
+        events = []
+        for side in range(2):
+            def military_collapse(s, y, side=side):
+                return y[5 * side + MILITARY_CAPABILITY] - 15
+
+            def economic_collapse(s, y, side=side):
+                capital, budget = self.budget(side, y, self.inputs(s))
+                return capital + min(budget, 0) - self.collapse_capital[side]
+
+            events += [(military_collapse, 1 - side, "Enemy Military Collapse"), (economic_collapse, 1 - side, "Enemy Economic Collapse")]
+        for side in (1, 0):
+            def superiority(s, y, side=side):
+                return y[5 * side + MILITARY_CAPABILITY] - 4 * y[5 * (1 - side) + MILITARY_CAPABILITY]
+
+            events.append((superiority, side, "Military Superiority"))
+        for event, _, _ in events:
+            event.terminal = True
+        return events
+
+    def record(self, belligerants: Tuple[Belligerant, Belligerant], days: np.ndarray, states: np.ndarray) -> None:
+        # writes the states sampled at the given days into each History in the fixed-step layout, row d holding day d's stocks
+        c = self.coefficients
+        day = np.minimum(days.astype(int), len(self.forcing) - 2)
+        forcing = self.forcing[day] + (days - day)[:, None] * (self.forcing[day + 1] - self.forcing[day])
+        for side, belligerant in enumerate(belligerants):
+            industrial_technology, military_technology, civilian_industrial_capacity, military_industrial_capacity, military_capability = states[5 * side:5 * side + 5]
+            capital = c.production_efficiency * industrial_technology * civilian_industrial_capacity * forcing[:, SANCTIONS_EFFECT + side]
+            price_level = 1 + c.elasticity_coefficient * np.maximum(0, c.military_demand_coefficient * military_capability - c.production_efficiency * industrial_technology * military_industrial_capacity)
+            budget = (capital * self.parameters[side][4] * 0.35 / 365 + forcing[:, FOREIGN_AID + side]) / price_level - c.military_consumption_cost_coefficient * military_capability
+            spending = np.maximum(budget, 0) * sum(self.parameters[side][:4])
+            history = belligerant.history
+            rows = slice(1, 1 + len(days))
+            history.data[0, rows] = np.ceil(days) - 1
+            history.data[1, rows] = capital + np.minimum(budget, 0)
+            history.data[2, rows] = industrial_technology
+            history.data[3, rows] = military_technology
+            history.data[4, rows] = civilian_industrial_capacity
+            history.data[5, rows] = military_industrial_capacity
+            history.data[6, rows] = military_capability
+            history.data[7, rows] = price_level
+            history.data[8, rows] = budget
+            history.data[9, rows] = spending
+            history.length = 1 + len(days)
+
+            for name, value in zip(STOCKS, states[5 * side:5 * side + 5, -1]):
+                setattr(belligerant, name, float(value))
+            belligerant.economic_capital = float(history.data[1, len(days)])
+            belligerant.current_budget = float(budget[-1])
+            belligerant.current_spending = float(spending[-1])
+            belligerant.attacking_intensity = float(forcing[-1, ATTACKING_INTENSITY + side])
+
+def run_ode_simulation(timesteps: int, coefficients: Coefficients, international_interference, investment_policies, monte_carlo=False, rng=np.random, schedule: ScenarioSchedule = None, history_dtype=np.float64, method: str = "RK45", rtol: float = 1e-6, atol: float = 1e-6, solver_stats: dict = None) -> Tuple[Belligerant, Belligerant, int, str, str]:
+    # same inputs, random draws and results as simulation.run_simulation, but integrated with adaptive steps and the
+    # termination conditions located as roots, so a run that does not end takes a few hundred steps instead of 3650
+    if not international_interference:
+        international_interference: dict[str, float] = {}
+        international_interference['foreign_aid_russia'] = 0
+        international_interference['sanctions_ukraine'] = 0
+        international_interference['foreign_aid_ukraine'] = .24
+        international_interference['sanctions_russia'] = .14
+
+    if not investment_policies:
+        investment_policies: dict[str, list] = {}
+        investment_policies['ukraine'] = [.25, .25, .25, .25]
+        investment_policies['russia'] = [.25, .25, .25, .25]
+
+    if schedule is None:
+        schedule = get_schedule(timesteps, international_interference)
+
+    belligerants = create_belligerants(coefficients, international_interference, investment_policies, monte_carlo, timesteps + 1, rng, schedule, history_dtype)
+    baseline_russian_attacking_intensity = rng.normal(.62,.02)
+    war = ContinuousWar(belligerants, coefficients, forcing_table(timesteps, schedule, belligerants, baseline_russian_attacking_intensity))
+    initial_state = [getattr(belligerant, name) for belligerant in belligerants for name in STOCKS]
+    events = war.events()
+    solution = solve_ivp(war.derivatives, (0, timesteps), initial_state, method=method, rtol=rtol, atol=atol, dense_output=True, events=[event for event, _, _ in events])
+    if solution.status < 0:
+        raise RuntimeError(f"Integration failed: {solution.message}")
+    if solver_stats is not None:
+        solver_stats.update(steps=len(solution.t) - 1, evaluations=solution.nfev)
+
+    fired = [i for i, times in enumerate(solution.t_events) if len(times)]
+    if not fired:
+        days = np.arange(1, timesteps + 1)
+        war.record(belligerants, days, solution.sol(days))
+        return *belligerants, timesteps, "None", "None"
+
+    event = max(fired)
+    end = solution.t_events[event][0]
+    # the fixed-step run reports the day whose update crossed the condition and ends its history on that update
+    t = max(int(np.ceil(end)) - 1, 0)
+    days = np.arange(1, t + 1)
+    war.record(belligerants, np.append(days, end), np.column_stack([solution.sol(days), solution.y_events[event][0]]))
+    _, winner_side, reason = events[event]
+    winner = belligerants[winner_side].name
+    if not monte_carlo:
+        print(f"{winner} has won the war on day {t}: {reason}.")
+        print_endgame_stats(list(belligerants))
+    return *belligerants, t, winner, reason
+
+def compare_integrators(num_runs: int, timesteps: int = 3650, international_interference: dict[str, float] = None, investment_policies: dict[str, list] = None, seed: int = 0, rtol: float = 1e-6, atol: float = 1e-6) -> list[dict]:
+    # runs both integrators on the same coefficient and intensity draws and reports how far apart their outcomes are
+    from sampling import sample_run_coefficients
+    from time import perf_counter
+
+    rows = []
+    for child in np.random.SeedSequence(seed).spawn(num_runs):
+        results = []
+        for simulate, stats in ((run_simulation, {}), (run_ode_simulation, {"solver_stats": {}})):
+            rng = np.random.default_rng(child)
+            start = perf_counter()
+            russia, ukraine, t, winner, reason = simulate(timesteps, sample_run_coefficients(rng), international_interference, investment_policies, monte_carlo=True, rng=rng, **stats)
+            results.append((perf_counter() - start, russia, ukraine, t, winner, reason, stats.get("solver_stats", {})))
+        (euler_time, euler_russia, euler_ukraine, euler_t, euler_winner, euler_reason, _), (ode_time, ode_russia, ode_ukraine, ode_t, ode_winner, ode_reason, solver_stats) = results
+        shared = min(euler_russia.history.length, ode_russia.history.length)
+        # the largest relative gap in military capability over the days both runs cover
+        gap = max(
+            np.max(np.abs(euler.history.military_capability[:shared] - ode.history.military_capability[:shared]) / np.maximum(np.abs(euler.history.military_capability[:shared]), 1e-9))
+            for euler, ode in ((euler_russia, ode_russia), (euler_ukraine, ode_ukraine))
+        )
+        rows.append({
+            "fixed_length": euler_t,
+            "adaptive_length": ode_t,
+            "same_outcome": (euler_winner, euler_reason) == (ode_winner, ode_reason),
+            "fixed_steps": min(euler_t + 1, timesteps),
+            "adaptive_steps": solver_stats["steps"],
+            "adaptive_evaluations": solver_stats["evaluations"],
+            "military_capability_gap": float(gap),
+            "fixed_seconds": euler_time,
+            "adaptive_seconds": ode_time,
+        })
+    return rows
+
+if __name__ == "__main__":
+    import argparse
+    import polars as pl
+
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--runs", type=int, default=50)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--rtol", type=float, default=1e-6)
+    parser.add_argument("--atol", type=float, default=1e-6)
+    args = parser.parse_args()
+
+    comparison = pl.DataFrame(compare_integrators(args.runs, seed=args.seed, rtol=args.rtol, atol=args.atol))
+    with pl.Config(tbl_rows=args.runs, tbl_cols=-1):
+        print(comparison)
+    print(f"Same winner and reason in {comparison['same_outcome'].mean():.1%} of runs")
+    print(f"Mean |length difference| {(comparison['fixed_length'] - comparison['adaptive_length']).abs().mean():.1f} days, worst military capability gap {comparison['military_capability_gap'].max():.2%}")
+    long_runs = comparison.filter(pl.col("fixed_length") > 1000)
+    for label, runs in (("all runs", comparison), ("runs past 1000 days", long_runs)):
+        if len(runs):
+            print(f"{label}: {runs['fixed_steps'].sum() / runs['adaptive_steps'].sum():.1f}x fewer steps, {runs['fixed_seconds'].sum() / runs['adaptive_seconds'].sum():.1f}x the speed")
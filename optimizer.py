@@ -0,0 +1,77 @@
+from monte_carlo_simulation import run_monte_carlo_simulation
+from aggregation import ScenarioAggregate, proportion_half_width
+from scipy.optimize import minimize
+import argparse
+import numpy as np
+import polars as pl
+
+OBJECTIVES = ("win_probability", "length")
+
+def allocation(logits: np.ndarray) -> list[float]:
+    # softmax over three free logits and a fixed zero, so every point is a valid four-way split
+    weights = np.exp(np.append(logits, 0) - np.max(np.append(logits, 0)))
+    return (weights / weights.sum()).tolist()
+
+def objective_value(aggregate: ScenarioAggregate, objective: str) -> float:
+    # minimized, so the win probability is negated
+    if objective == "win_probability":
+        return -aggregate.winners.count("Ukraine") / aggregate.count
+    if objective == "length":
+        return float(np.mean(aggregate.lengths))
+    raise ValueError(f"Unknown objective: {objective}")
+
+def objective_resolution(aggregate: ScenarioAggregate, objective: str, z_score=1.96) -> float:
+    # differences smaller than the Monte Carlo half-width of the objective are not worth chasing
+    if objective == "win_probability":
+        return proportion_half_width(aggregate.winners.count("Ukraine"), aggregate.count, z_score)
+    return z_score * np.std(aggregate.lengths, ddof=1) / np.sqrt(aggregate.count)
+
+def optimize_policy(international_interference: dict[str, float] = None, russia_policy: list = None, objective: str = "win_probability", num_simulations: int = 2000, max_evaluations: int = 200, engine: str = "batch", batch_size: int = 1000, seed: int = 0) -> dict:
+    if not international_interference:
+        international_interference = {'foreign_aid_russia': 0, 'sanctions_ukraine': 0, 'foreign_aid_ukraine': .24, 'sanctions_russia': .14}
+    russia_policy = russia_policy or [.25, .25, .25, .25]
+    evaluations: list[dict] = []
+    cache: dict[tuple, ScenarioAggregate] = {}
+
+    def simulate(ukraine_policy: list[float]) -> ScenarioAggregate:
+        key = tuple(round(share, 12) for share in ukraine_policy)
+        if key not in cache:
+            # every candidate reuses the same seed, so coefficient draws are shared and only the policy differs between them
+            cache[key] = run_monte_carlo_simulation(num_simulations, international_interference, {'ukraine': ukraine_policy, 'russia': russia_policy}, engine=engine, batch_size=batch_size, seed=seed)
+            evaluations.append({"evaluation": len(evaluations), **dict(zip(("military_technology", "industrial_technology", "military_industrial", "civilian_industrial"), ukraine_policy)), "objective": objective_value(cache[key], objective)})
+        return cache[key]
+
+    def evaluate(logits: np.ndarray) -> float:
+        return objective_value(simulate(allocation(logits)), objective)
+
+    # start from the even split with a wide simplex, since the objective is flat at small scales
+    initial = np.zeros(3)
+    resolution = objective_resolution(simulate(allocation(initial)), objective)
+    result = minimize(evaluate, initial, method="Nelder-Mead", options={"maxfev": max_evaluations, "initial_simplex": np.vstack([initial, initial + 1.5 * np.eye(3)]), "xatol": .05, "fatol": resolution})
+
+    best_policy = allocation(result.x)
+    # re-estimate the winner on fresh random numbers, since the search value is biased toward lucky draws
+    validation = run_monte_carlo_simulation(num_simulations, international_interference, {'ukraine': best_policy, 'russia': russia_policy}, engine=engine, batch_size=batch_size, seed=seed + 1)
+    return {
+        "ukraine_policy": best_policy,
+        "objective": objective_value(validation, objective),
+        "resolution": objective_resolution(validation, objective),
+        "evaluations": pl.DataFrame(evaluations),
+    }
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--objective", choices=OBJECTIVES, default="win_probability")
+    parser.add_argument("--num-simulations", type=int, default=2000)
+    parser.add_argument("--max-evaluations", type=int, default=200)
+    parser.add_argument("--russia", type=float, nargs=4, default=[.25, .25, .25, .25])
+    parser.add_argument("--foreign-aid-ukraine", type=float, default=.24)
+    parser.add_argument("--sanctions-russia", type=float, default=.14)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    interference = {'foreign_aid_russia': 0, 'sanctions_ukraine': 0, 'foreign_aid_ukraine': args.foreign_aid_ukraine, 'sanctions_russia': args.sanctions_russia}
+    result = optimize_policy(interference, args.russia, args.objective, args.num_simulations, args.max_evaluations, seed=args.seed)
+    print(f"Best Ukrainian allocation: {[round(share, 3) for share in result['ukraine_policy']]}")
+    print(f"Objective on fresh runs: {result['objective']} +- {result['resolution']}")
+    result["evaluations"].write_csv("data/policy_optimization.csv")
@@ -0,0 +1,92 @@
+import numpy as np
+
+QUANTILES = (.05, .25, .5, .75, .95)
+SKETCH_SIZE = 128
+
+def batch_level(num_runs: int, k: int = SKETCH_SIZE) -> int:
+    # the level whose weight keeps a whole batch of runs within k items
+    level = 0
+    while -(-num_runs // 2 ** level) > k:
+        level += 1
+    return level
+
+def batch_sample(state: np.ndarray, level: int) -> np.ndarray:
+    # every 2**level-th value of each sorted (variables x runs) row, each standing for 2**level runs
+    step = 2 ** level
+    return np.sort(state.astype(np.float32), axis=1)[:, step // 2::step].T
+
+class QuantileSketch:
+    __slots__ = ("k", "levels", "offsets", "pending")
+
+    def __init__(self, k: int = SKETCH_SIZE, levels: list = None) -> None:
+        # a KLL sketch run in lockstep over a whole (variables x days) grid: every cell sees the same number
+        # of values, so each level is one (items, variables, days) array and items at level h weigh 2**h
+        self.k: int = k
+        self.levels: list[np.ndarray] = [] if levels is None else levels
+        self.offsets: list[int] = [0] * len(self.levels)
+        self.pending: list[np.ndarray] = []
+
+    @classmethod
+    def from_sample(cls, sample: np.ndarray, level: int, k: int = SKETCH_SIZE) -> 'QuantileSketch':
+        sketch = cls(k, [None] * level + [sample])
+        sketch.compress()
+        return sketch
+
+    def capacity(self, level: int) -> int:
+        # lower levels shrink geometrically below the top one, which keeps memory O(k) per cell
+        return max(2, int(np.ceil(self.k * (2 / 3) ** (len(self.levels) - 1 - level))))
+
+    def size(self, level: int) -> int:
+        return 0 if self.levels[level] is None else len(self.levels[level])
+
+    def add(self, values: np.ndarray) -> None:
+        self.pending.append(values.astype(np.float32))
+        if len(self.pending) >= self.k:
+            self.flush()
+            self.compress()
+
+    def flush(self) -> None:
+        if self.pending:
+            self.push(0, np.stack(self.pending))
+            self.pending = []
+
+    def push(self, level: int, items: np.ndarray) -> None:
+        while len(self.levels) <= level:
+            self.levels.append(None)
+            self.offsets.append(0)
+        self.levels[level] = items if self.levels[level] is None else np.concatenate([self.levels[level], items])
+
+    def compact(self, level: int) -> None:
+        items = np.sort(self.levels[level], axis=0)
+        even = len(items) - len(items) % 2
+        # alternate between odd and even positions so the rounding error does not drift one way
+        self.push(level + 1, items[self.offsets[level]:even:2])
+        self.offsets[level] ^= 1
+        self.levels[level] = items[even:] if even < len(items) else None
+
+    def compress(self) -> None:
+        while True:
+            full = [level for level in range(len(self.levels)) if self.size(level) > self.capacity(level)]
+            if not full:
+                return
+            self.compact(full[0])
+
+    def merge(self, other: 'QuantileSketch') -> None:
+        self.flush()
+        for level, items in enumerate(other.levels):
+            if items is not None:
+                self.push(level, items)
+        if other.pending:
+            self.push(0, np.stack(other.pending))
+        self.compress()
+
+    def quantiles(self, qs=QUANTILES) -> np.ndarray:
+        # (len(qs), variables, days)
+        self.flush()
+        items = np.concatenate([items for items in self.levels if items is not None])
+        weights = np.concatenate([np.full(len(items), 2.0 ** level) for level, items in enumerate(self.levels) if items is not None])
+        order = np.argsort(items, axis=0)
+        cumulative = np.cumsum(weights[order], axis=0)
+        ranks = np.asarray(qs)[:, None, None] * cumulative[-1]
+        index = np.minimum((cumulative[None] < ranks[:, None]).sum(axis=1), len(items) - 1)
+        return np.take_along_axis(np.take_along_axis(items, order, axis=0), index, axis=0)
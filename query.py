@@ -0,0 +1,135 @@
+from results_store import POLICY_COLUMNS, scenario_id, parameter_columns, scan_results
+from aggregation import proportion_half_width
+from quantiles import QUANTILES
+import argparse
+import glob
+import json
+import os
+import re
+import polars as pl
+
+RESULTS_FILE = re.compile(r"ukraine_(\[.*?\])_russia_(\[.*?\])_aid_(.*?)_sanctions_(.*?)\.csv$")
+RUN_COLUMNS = ("winners", "lengths", "reasons")
+POLICY_PARAMETERS = tuple(f"{side}_{name}_investment" for side in ("ukraine", "russia") for name in POLICY_COLUMNS)
+INTERFERENCE_PARAMETERS = ("foreign_aid_ukraine", "sanctions_russia")
+
+def parse_results_path(path: str) -> tuple[dict[str, float], dict[str, list]]:
+    # inverse of monte_carlo_simulation.results_path; the remaining interference is always 0 in those sweeps
+    match = RESULTS_FILE.search(os.path.basename(path))
+    if match is None:
+        return None
+    ukraine, russia, aid, sanctions = match.groups()
+    international_interference = {'foreign_aid_russia': 0, 'sanctions_ukraine': 0, 'foreign_aid_ukraine': float(aid), 'sanctions_russia': float(sanctions)}
+    return international_interference, {'ukraine': json.loads(ukraine), 'russia': json.loads(russia)}
+
+def csv_parameters(path: str) -> list[pl.Expr]:
+    international_interference, investment_policies = parse_results_path(path)
+    parameters = [pl.lit(scenario_id(international_interference, investment_policies)).alias("scenario_id")]
+    return parameters + [pl.lit(value).alias(name) for name, value in parameter_columns(international_interference, investment_policies).items()]
+
+def csv_files(csv_dir: str, scenario: str = None) -> list[str]:
+    # the parameters are in the file name, so files of other scenarios are skipped without being opened
+    paths = [path for path in sorted(glob.glob(os.path.join(glob.escape(csv_dir), "*.csv"))) if parse_results_path(path) is not None]
+    return paths if scenario is None else [path for path in paths if scenario_id(*parse_results_path(path)) == scenario]
+
+
+def scan_runs(root: str = "data/results", csv_dir: str = "data", scenario: str = None) -> pl.LazyFrame:
+    # one row per simulated run with its scenario's parameters, from the parquet store and every per-scenario CSV
+    frames = [
+        # a CSV's run rows are padded with nulls below the last run when the trajectory columns are longer
+        pl.scan_csv(path, glob=False).select(RUN_COLUMNS).filter(pl.col("winners").is_not_null()).with_columns(csv_parameters(path))
+        for path in csv_files(csv_dir, scenario)
+    ]
+    store = scan_results(root, "runs", scenario)
+    if store is not None:
+        frames.append(store.drop("run"))
+    if not frames:
+        raise FileNotFoundError(f"No scenario results under {root} or {csv_dir}")
+    return pl.concat(frames, how="diagonal_relaxed")
+
+def scan_trajectories(root: str = "data/results", csv_dir: str = "data", scenario: str = None) -> pl.LazyFrame:
+    frames = []
+    for path in csv_files(csv_dir, scenario):
+        frame = pl.scan_csv(path, glob=False)
+        if "day" in frame.collect_schema():
+            frame = frame.filter(pl.col("day").is_not_null())
+        else:
+            # daily CSVs written before the day column existed are numbered by row
+            frame = frame.with_row_index("day").filter(pl.col("russia_gdp").is_not_null())
+        frames.append(frame.drop(RUN_COLUMNS).with_columns(csv_parameters(path)))
+    store = scan_results(root, "trajectories", scenario)
+    if store is not None:
+        frames.append(store)
+    if not frames:
+        raise FileNotFoundError(f"No scenario results under {root} or {csv_dir}")
+    return pl.concat(frames, how="diagonal_relaxed")
+
+def bucket(column: str, width: float) -> pl.Expr:
+    # the shares are rounded to cents, so a share on a bucket edge must not fall into the bucket below it
+    return ((pl.col(column) / width + 1e-9).floor() * width).round(6).alias(column)
+
+def scenario_outcomes(runs: pl.LazyFrame, winner: str = "Ukraine") -> pl.DataFrame:
+    # one row per scenario, the table the regression notebook fits on
+    return runs.group_by("scenario_id", *POLICY_PARAMETERS, *INTERFERENCE_PARAMETERS).agg(
+        pl.len().alias("runs"),
+        (pl.col("winners") == winner).mean().alias(f"{winner.lower()}_win_share"),
+        pl.col("lengths").mean().alias("mean_length"),
+    ).sort("scenario_id").collect()
+
+def win_rates(runs: pl.LazyFrame, width: float = .05, winner: str = "Ukraine", by=INTERFERENCE_PARAMETERS) -> pl.DataFrame:
+    rates = runs.group_by(*[bucket(column, width) for column in by]).agg(
+        pl.len().alias("runs"),
+        pl.col("scenario_id").n_unique().alias("scenarios"),
+        (pl.col("winners") == winner).sum().alias("wins"),
+    ).sort(*by).collect()
+    share = rates["wins"] / rates["runs"]
+    return rates.with_columns(share.alias("win_share"), pl.Series("win_share_half_width", proportion_half_width(rates["wins"].to_numpy(), rates["runs"].to_numpy())))
+
+def length_distribution(runs: pl.LazyFrame, by=POLICY_PARAMETERS, width: float = .1) -> pl.DataFrame:
+    return runs.group_by(*[bucket(column, width) for column in by]).agg(
+        pl.len().alias("runs"),
+        pl.col("lengths").mean().alias("mean_length"),
+        pl.col("lengths").std().alias("std_length"),
+        *[pl.col("lengths").quantile(q).alias(f"length_p{round(q * 100):02d}") for q in QUANTILES],
+    ).sort(*by).collect()
+
+def reason_breakdown(runs: pl.LazyFrame, by=("winners",)) -> pl.DataFrame:
+    return runs.group_by(*by, "reasons").agg(pl.len().alias("runs")).with_columns(
+        (pl.col("runs") / pl.col("runs").sum().over(*by)).alias("share")
+    ).sort(*by, "runs", descending=[False] * len(by) + [True]).collect()
+
+def scenario_frames(scenario: str, root: str = "data/results", csv_dir: str = "data") -> tuple[pl.DataFrame, pl.DataFrame]:
+    runs = scan_runs(root, csv_dir, scenario).collect()
+    trajectories = scan_trajectories(root, csv_dir, scenario).sort("day").collect()
+    return runs, trajectories
+
+def plot_scenario(scenario: str, root: str = "data/results", csv_dir: str = "data") -> None:
+    import data_analysis as da
+
+    runs, trajectories = scenario_frames(scenario, root, csv_dir)
+    if runs.is_empty():
+        raise ValueError(f"No results for scenario {scenario}")
+    da.plot_monte_carlo_histograms(runs['lengths'], runs['winners'], runs['reasons'])
+    da.plot_dashboard_from_csv(trajectories)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("query", choices=["outcomes", "win-rates", "lengths", "reasons", "dashboard"])
+    parser.add_argument("--scenario", help="scenario_id for the dashboard")
+    parser.add_argument("--width", type=float, default=.05, help="bucket width for the aid, sanctions and policy shares")
+    parser.add_argument("--root", default="data/results")
+    parser.add_argument("--csv-dir", default="data")
+    args = parser.parse_args()
+
+    runs = scan_runs(args.root, args.csv_dir)
+    with pl.Config(tbl_rows=50, tbl_cols=-1):
+        if args.query == "outcomes":
+            print(scenario_outcomes(runs))
+        elif args.query == "win-rates":
+            print(win_rates(runs, args.width))
+        elif args.query == "lengths":
+            print(length_distribution(runs, width=args.width))
+        elif args.query == "reasons":
+            print(reason_breakdown(runs))
+        else:
+            plot_scenario(args.scenario, args.root, args.csv_dir)
@@ -0,0 +1,111 @@
+from sampling import COEFFICIENT_PRIORS, FIXED_COEFFICIENTS
+from functools import lru_cache
+import argparse
+import hashlib
+import importlib.util
+import json
+import os
+import pickle
+
+# bump to drop every cached result without touching the model code, e.g. after a change to the data files
+CACHE_VERSION = 1
+# everything a cached result depends on: the equations, schedules, engines, priors, the seeding and chunking of
+# monte_carlo_simulation, and the aggregate and export column format
+MODEL_MODULES = ("classes", "schedules", "simulation", "batch_simulation", "kernels", "ode_simulation", "sampling", "aggregation", "quantiles", "monte_carlo_simulation", "data_analysis")
+
+@lru_cache(maxsize=None)
+def model_version() -> str:
+    # the source is hashed rather than imported, so the numba kernel is never loaded just to key a lookup
+    digest = hashlib.sha1(str(CACHE_VERSION).encode())
+    for module in MODEL_MODULES:
+        with open(importlib.util.find_spec(module).origin, "rb") as f:
+            digest.update(f.read())
+    return digest.hexdigest()[:16]
+
+def result_key(international_interference: dict[str, float], investment_policies: dict[str, list], timesteps: int, seed: int, **settings) -> str:
+    key = json.dumps({
+        "priors": COEFFICIENT_PRIORS,
+        "fixed": FIXED_COEFFICIENTS,
+        "international_interference": international_interference,
+        "investment_policies": investment_policies,
+        "timesteps": timesteps,
+        "seed": seed,
+        "model": model_version(),
+        # run count, engine, sampler, chunking and stopping rule all change which runs are drawn
+        **settings,
+    }, sort_keys=True)
+    return hashlib.sha1(key.encode()).hexdigest()
+
+class ResultCache:
+    def __init__(self, root: str = "data/cache", max_bytes: int = 4 * 1024 ** 3) -> None:
+        # one pickle per key under a directory per model version; file modification times double as the LRU order
+        self.root: str = root
+        self.max_bytes: int = max_bytes
+
+    def path(self, key: str, version: str = None) -> str:
+        return os.path.join(self.root, version or model_version(), f"{key}.pkl")
+
+    def get(self, key: str) -> dict:
+        path = self.path(key)
+        try:
+            with open(path, "rb") as f:
+                entry = pickle.load(f)
+        except (OSError, EOFError, pickle.UnpicklingError):
+            return None
+        os.utime(path)
+        return entry
+
+    def put(self, key: str, aggregate, columns: dict = None) -> None:
+        # columns holds the exact export columns of runs that kept per-run histories instead of streaming them
+        os.makedirs(os.path.dirname(self.path(key)), exist_ok=True)
+        with open(f"{self.path(key)}.tmp", "wb") as f:
+            pickle.dump({"aggregate": aggregate, "columns": columns}, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(f"{self.path(key)}.tmp", self.path(key))
+        self.evict()
+
+    def entries(self) -> list[tuple[str, str, float, int]]:
+        # (version, key, last use, bytes), least recently used first
+        entries = []
+        for version in os.listdir(self.root) if os.path.isdir(self.root) else []:
+            for file in os.listdir(os.path.join(self.root, version)):
+                if file.endswith(".pkl"):
+                    stat = os.stat(os.path.join(self.root, version, file))
+                    entries.append((version, file[:-len(".pkl")], stat.st_mtime, stat.st_size))
+        return sorted(entries, key=lambda entry: entry[2])
+
+    def evict(self) -> None:
+        entries = self.entries()
+        total = sum(entry[3] for entry in entries)
+        for version, key, _, size in entries:
+            if total <= self.max_bytes:
+                break
+            self.remove(key, version)
+            total -= size
+
+    def remove(self, key: str, version: str = None) -> None:
+        try:
+            os.remove(self.path(key, version))
+        except FileNotFoundError:
+            pass
+
+    def invalidate(self, stale_only: bool = False) -> int:
+        # drops every result, or with stale_only those written by another model version
+        removed = 0
+        for version, key, _, _ in self.entries():
+            if not stale_only or version != model_version():
+                self.remove(key, version)
+                removed += 1
+        return removed
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--root", default="data/cache")
+    parser.add_argument("--clear", action="store_true", help="remove every cached result")
+    parser.add_argument("--prune", action="store_true", help="remove results of older model versions")
+    args = parser.parse_args()
+
+    cache = ResultCache(args.root)
+    if args.clear or args.prune:
+        print(f"Removed {cache.invalidate(stale_only=args.prune)} cached results")
+    entries = cache.entries()
+    print(f"{len(entries)} cached results, {sum(entry[3] for entry in entries) / 1024 ** 2:.1f} MB, model version {model_version()}")
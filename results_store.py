@@ -0,0 +1,78 @@
+import glob
+import hashlib
+import json
+import os
+import numpy as np
+import polars as pl
+
+from aggregation import ScenarioAggregate, ExportOptions
+
+POLICY_COLUMNS = ("military_technology", "industrial_technology", "military_industrial", "civilian_industrial")
+INTERFERENCE_COLUMNS = ("foreign_aid_ukraine", "sanctions_russia", "foreign_aid_russia", "sanctions_ukraine")
+
+def scenario_id(international_interference: dict[str, float], investment_policies: dict[str, list]) -> str:
+    key = json.dumps({"international_interference": international_interference, "investment_policies": investment_policies}, sort_keys=True)
+    return hashlib.sha1(key.encode()).hexdigest()[:16]
+
+def parameter_columns(international_interference: dict[str, float], investment_policies: dict[str, list]) -> dict[str, float]:
+    columns = {}
+    for side in ("ukraine", "russia"):
+        for name, value in zip(POLICY_COLUMNS, investment_policies.get(side)):
+            columns[f"{side}_{name}_investment"] = float(value)
+    for name in INTERFERENCE_COLUMNS:
+        columns[name] = float(international_interference.get(name) or 0)
+    return columns
+
+class ResultsStore:
+    def __init__(self, root: str = "data/results", batch_size: int = 32) -> None:
+        # one hive partition per scenario under root/runs and root/trajectories
+        self.root: str = root
+        self.batch_size: int = batch_size
+        self.runs: list[pl.DataFrame] = []
+        self.trajectories: list[pl.DataFrame] = []
+        self.keys: list = []
+
+    def scenario_path(self, international_interference: dict[str, float], investment_policies: dict[str, list]) -> str:
+        return os.path.join(self.root, "trajectories", f"scenario_id={scenario_id(international_interference, investment_policies)}")
+
+    def add(self, aggregate: ScenarioAggregate, results_dict: dict, international_interference: dict[str, float], investment_policies: dict[str, list], key=None, export_options: ExportOptions = None) -> list:
+        export_options = export_options or ExportOptions()
+        parameters = [pl.lit(scenario_id(international_interference, investment_policies)).alias("scenario_id")]
+        parameters += [pl.lit(value).alias(name) for name, value in parameter_columns(international_interference, investment_policies).items()]
+
+        self.runs.append(pl.DataFrame({
+            "run": np.arange(aggregate.count),
+            "winners": aggregate.winners,
+            "lengths": aggregate.lengths,
+            "reasons": aggregate.reasons,
+        }).with_columns(parameters))
+        # results_dict carries its own day column from export_columns
+        self.trajectories.append(pl.DataFrame(results_dict).with_columns(*parameters, pl.lit(aggregate.count).alias("runs"), pl.lit(export_options.resolution).alias("resolution"), pl.lit(export_options.window).alias("window")))
+        self.keys.append(key)
+
+        if len(self.keys) >= self.batch_size:
+            return self.flush()
+        return []
+
+    def flush(self) -> list:
+        for table, frames in (("runs", self.runs), ("trajectories", self.trajectories)):
+            # exports with other precisions or column subsets have other schemas, so each schema is written on its own
+            groups = {}
+            for frame in frames:
+                groups.setdefault(tuple(frame.schema.items()), []).append(frame)
+            for group in groups.values():
+                pl.concat(group).write_parquet(os.path.join(self.root, table), partition_by="scenario_id")
+        flushed = self.keys
+        self.runs, self.trajectories, self.keys = [], [], []
+        return flushed
+
+def scan_results(root: str = "data/results", table: str = "trajectories", scenario: str = None) -> pl.LazyFrame:
+    # one scan per file: exports with other precisions or column subsets have other schemas, which a single scan
+    # over the table rejects, so they are concatenated with missing columns as nulls and floats upcast
+    partitions = sorted(glob.glob(os.path.join(glob.escape(os.path.join(root, table)), f"scenario_id={'*' if scenario is None else glob.escape(scenario)}")))
+    frames = [
+        pl.scan_parquet(path, glob=False).with_columns(pl.lit(os.path.basename(partition).split("=", 1)[1]).alias("scenario_id"))
+        for partition in partitions
+        for path in sorted(glob.glob(os.path.join(glob.escape(partition), "*.parquet")))
+    ]
+    return pl.concat(frames, how="diagonal_relaxed") if frames else None
@@ -1,8 +1,16 @@
-from monte_carlo_simulation import run_monte_carlo_simulation
-import gc
+from monte_carlo_simulation import simulate_chunk, chunk_sizes, print_summary, write_results, results_path
+from aggregation import ScenarioAggregate, ExportOptions, RESOLUTIONS, WINDOWS, PRECISIONS, export_columns, parse_resolution
+from instrumentation import RunMetrics, Progress, timed_call
+from sampling import SAMPLERS
+from dataclasses import asdict
+from multiprocessing import Pool
+import argparse
+import threading
+import json
+import os
 import numpy as np
 
-def run_full_simulation_space(num_simulations: int):
+def generate_scenarios(rng=np.random) -> list[tuple[dict, dict]]:
     international_interference_scenarios: list = []
     investment_policies_scenarios: list = []
 
@@ -13,7 +21,7 @@ def run_full_simulation_space(num_simulations: int):
     #         for military_industrial_percentage in [.15, .25, .35]:
     #             for civilian_industrial_percentage in [.15, .25, .35]:
     for _ in range(num_sims):
-        rand_ints = [round(np.random.uniform(.05, 1), 2) for _ in range(3)]
+        rand_ints = [round(rng.uniform(.05, 1), 2) for _ in range(3)]
         rand_ints = sorted(rand_ints)
 
         military_tech_percentage = rand_ints[0]
@@ -23,7 +31,7 @@ def run_full_simulation_space(num_simulations: int):
 
         ukr = [military_tech_percentage, industrial_tech_percentage, military_industrial_percentage, civilian_industrial_percentage]
 
-        rand_ints = [round(np.random.uniform(.05, 1), 2) for _ in range(3)]
+        rand_ints = [round(rng.uniform(.05, 1), 2) for _ in range(3)]
         rand_ints = sorted(rand_ints)
 
         military_tech_percentage = rand_ints[0]
@@ -42,18 +50,223 @@ def run_full_simulation_space(num_simulations: int):
     # for sanctions_russia in [.07, .14, .21]:
     #     for foreign_aid_ukraine in [.12, .24, .36]:
             international_interference_scenarios.append({
-                'sanctions_russia': round(np.random.uniform(0, .25), 2),
-                'foreign_aid_ukraine':  round(np.random.uniform(0, .5), 2),
+                'sanctions_russia': round(rng.uniform(0, .25), 2),
+                'foreign_aid_ukraine':  round(rng.uniform(0, .5), 2),
                 'foreign_aid_russia': 0,
                 'sanctions_ukraine': 0,
             })
 
     # print(investment_policies_scenarios)
     # print(international_interference_scenarios)
-    for investment in investment_policies_scenarios:
-        for interference in international_interference_scenarios:
-            run_monte_carlo_simulation(num_simulations, interference, investment, export=True)
-            gc.collect()
+    return [(interference, investment) for investment in investment_policies_scenarios for interference in international_interference_scenarios]
+
+def create_manifest(num_simulations: int, chunk_size: int = 500, engine: str = "object", timesteps: int = 3650, seed: int = None, export_format: str = "csv", tolerance: float = None, length_tolerance: float = 30, sampler: str = "random", export_options: ExportOptions = None, history_dtype: str = "float64") -> dict:
+    entropy = np.random.SeedSequence(seed).entropy
+    scenarios = generate_scenarios(np.random.default_rng(np.random.SeedSequence(entropy, spawn_key=(0,))))
+    output_path = results_path
+    if export_format == "parquet":
+        from results_store import ResultsStore
+
+        output_path = ResultsStore().scenario_path
+
+    return {
+        "entropy": entropy,
+        "num_simulations": num_simulations,
+        "chunk_size": chunk_size,
+        "engine": engine,
+        "timesteps": timesteps,
+        "export_format": export_format,
+        "tolerance": tolerance,
+        "length_tolerance": length_tolerance,
+        "sampler": sampler,
+        # per-run histories of the object, kernel and ode engines; the batch engine keeps none
+        "history_dtype": history_dtype,
+        "export": asdict(export_options or ExportOptions()),
+        "scenarios": [
+            {
+                "international_interference": interference,
+                "investment_policies": investment,
+                "spawn_key": [1, index],
+                "output": output_path(interference, investment),
+                "status": "pending",
+            }
+            for index, (interference, investment) in enumerate(scenarios)
+        ],
+    }
+
+def load_manifest(manifest_path: str) -> dict:
+    with open(manifest_path) as f:
+        return json.load(f)
+
+def save_manifest(manifest: dict, manifest_path: str) -> None:
+    # write then rename so an interrupted save never leaves a truncated manifest behind
+    with open(f"{manifest_path}.tmp", "w") as f:
+        json.dump(manifest, f)
+    os.replace(f"{manifest_path}.tmp", manifest_path)
+
+def pending_scenarios(manifest: dict) -> list[int]:
+    return [
+        index for index, scenario in enumerate(manifest["scenarios"])
+        if scenario["status"] != "complete" or not os.path.exists(scenario["output"])
+    ]
+
+class ChunkMerger:
+    def __init__(self, manifest: dict) -> None:
+        # chunks are merged in order and precision is checked after each one, so where a scenario stops does not depend on timing
+        self.max_length: int = manifest["timesteps"] + 1
+        self.num_simulations: int = manifest["num_simulations"]
+        self.tolerance: float = manifest.get("tolerance")
+        self.length_tolerance: float = manifest.get("length_tolerance", 30)
+        self.aggregates: dict[int, ScenarioAggregate] = {}
+        self.finished_chunks: dict[int, dict[int, ScenarioAggregate]] = {}
+        self.merged_chunks: dict[int, int] = {}
+        self.done: set[int] = set()
+
+    def add(self, index: int, chunk_index: int, chunk: ScenarioAggregate) -> ScenarioAggregate:
+        # returns the scenario's aggregate once it is complete; late or repeated chunks are dropped
+        if index in self.done or chunk_index < self.merged_chunks.get(index, 0):
+            return None
+        if index not in self.aggregates:
+            self.aggregates[index] = ScenarioAggregate(self.max_length)
+            self.finished_chunks[index] = {}
+            self.merged_chunks[index] = 0
+        self.finished_chunks[index][chunk_index] = chunk
+
+        aggregate = self.aggregates[index]
+        while self.merged_chunks[index] in self.finished_chunks[index]:
+            aggregate.merge(self.finished_chunks[index].pop(self.merged_chunks[index]))
+            self.merged_chunks[index] += 1
+            if aggregate.count == self.num_simulations or (self.tolerance is not None and aggregate.converged(self.tolerance, self.length_tolerance)):
+                self.done.add(index)
+                del self.aggregates[index], self.finished_chunks[index], self.merged_chunks[index]
+                return aggregate
+        return None
+
+def export_scenario(manifest: dict, index: int, aggregate: ScenarioAggregate, store, export_options: ExportOptions) -> list[int]:
+    # returns the scenarios whose output is now on disk; the parquet store writes in batches
+    scenario = manifest["scenarios"][index]
+    print_summary(aggregate)
+    scenario["runs"] = aggregate.count
+    scenario["wins"] = {winner: aggregate.winners.count(winner) for winner in set(aggregate.winners)}
+    interference, investment = scenario["international_interference"], scenario["investment_policies"]
+    columns = export_columns(aggregate.columns(), export_options)
+    if store is None:
+        write_results(aggregate, columns, interference, investment, export_options)
+        return [index]
+    return store.add(aggregate, columns, interference, investment, key=index, export_options=export_options)
+
+def run_simulation_sweep(manifest: dict, manifest_path: str, processes: int = None, indices: list[int] = None, metrics_path: str = None, progress: bool = False) -> RunMetrics:
+    timesteps = manifest["timesteps"]
+    chunks = chunk_sizes(manifest["num_simulations"], manifest["chunk_size"])
+    export_options = ExportOptions(**manifest.get("export", {}))
+    scenarios = manifest["scenarios"]
+    pending = pending_scenarios(manifest)
+    print(f"{len(scenarios) - len(pending)} of {len(scenarios)} scenarios already complete")
+    if indices is not None:
+        selected = set(indices)
+        pending = [index for index in pending if index in selected]
+    processes = processes or os.cpu_count()
+
+    merger = ChunkMerger(manifest)
+    sweep_metrics = RunMetrics(processes, timesteps + 1)
+    scenario_metrics: dict[int, RunMetrics] = {}
+    scenario_records: dict[int, dict] = {}
+    progress = Progress(len(pending) * manifest["num_simulations"]) if progress else None
+    metrics_path = metrics_path or f"{os.path.splitext(manifest_path)[0]}_metrics.json"
+    # the pool's task thread pulls tasks as fast as it can; the semaphore keeps it a few chunks
+    # ahead of the results, so chunks of scenarios that have already converged are never started
+    in_flight = threading.Semaphore(2 * processes)
+
+    # every chunk draws from its own child of the scenario's SeedSequence, so reruns reproduce it exactly
+    def tasks():
+        for index in pending:
+            seeds = np.random.SeedSequence(manifest["entropy"], spawn_key=scenarios[index]["spawn_key"]).spawn(len(chunks))
+            for chunk_index, (size, seed) in enumerate(zip(chunks, seeds)):
+                in_flight.acquire()
+                if index in merger.done:
+                    in_flight.release()
+                    break
+                if chunk_index == 0:
+                    # a scenario's wall time runs from submitting its first chunk
+                    scenario_metrics[index] = RunMetrics(processes, timesteps + 1)
+                yield (index, chunk_index), timesteps, scenarios[index]["international_interference"], scenarios[index]["investment_policies"], size, manifest["engine"], seed, manifest.get("sampler", "random"), manifest.get("history_dtype", "float64")
+
+    store = None
+    if manifest.get("export_format") == "parquet":
+        from results_store import ResultsStore
+
+        store = ResultsStore()
+
+    # one pool for the whole sweep; chunks of different scenarios interleave so no core waits on a scenario barrier
+    with Pool(processes=processes) as pool, sweep_metrics.phase("simulate"):
+        for item in pool.imap_unordered(timed_call, ((simulate_chunk, task) for task in tasks())):
+            in_flight.release()
+            chunk_metrics = RunMetrics(processes, timesteps + 1)
+            (index, chunk_index), chunk = chunk_metrics.receive(item)
+            # the sweep totals take every chunk, including ones discarded after their scenario converged
+            sweep_metrics.merge(chunk_metrics)
+            if progress:
+                progress.update(chunk.count)
+            if index in merger.done:
+                continue
+            scenario_metrics[index].merge(chunk_metrics)
+            aggregate = merger.add(index, chunk_index, chunk)
+            if aggregate is None:
+                continue
+
+            metrics = scenario_metrics.pop(index)
+            with metrics.phase("export"):
+                completed = export_scenario(manifest, index, aggregate, store, export_options)
+            sweep_metrics.phases["export"] += metrics.phases["export"]
+            sweep_metrics.add_runs(aggregate.lengths)
+            scenario_records[index] = metrics.finish(aggregate.lengths).record()
+
+            for completed_index in completed:
+                scenarios[completed_index]["status"] = "complete"
+            if completed:
+                save_manifest(manifest, manifest_path)
+
+    if progress:
+        progress.close()
+    if store is not None:
+        with sweep_metrics.phase("export"):
+            flushed = store.flush()
+        for completed_index in flushed:
+            scenarios[completed_index]["status"] = "complete"
+        save_manifest(manifest, manifest_path)
+
+    sweep_metrics.finish()
+    sweep_metrics.write_json(metrics_path, scenarios={str(index): record for index, record in scenario_records.items()})
+    return sweep_metrics
+
+def run_full_simulation_space(num_simulations: int, chunk_size: int = 500, processes: int = None, engine: str = "object", seed: int = None, manifest_path: str = "data/sweep_manifest.json", resume: bool = False, export_format: str = "csv", tolerance: float = None, length_tolerance: float = 30, sampler: str = "random", metrics_path: str = None, progress: bool = False, export_options: ExportOptions = None, history_dtype: str = "float64"):
+    if resume and os.path.exists(manifest_path):
+        manifest = load_manifest(manifest_path)
+    else:
+        manifest = create_manifest(num_simulations, chunk_size, engine, seed=seed, export_format=export_format, tolerance=tolerance, length_tolerance=length_tolerance, sampler=sampler, export_options=export_options, history_dtype=history_dtype)
+        save_manifest(manifest, manifest_path)
+
+    return run_simulation_sweep(manifest, manifest_path, processes, metrics_path=metrics_path, progress=progress)
 
 if __name__ == "__main__":
-    run_full_simulation_space(12000)
\ No newline at end of file
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--num-simulations", type=int, default=12000)
+    parser.add_argument("--seed", type=int, default=None)
+    parser.add_argument("--manifest", default="data/sweep_manifest.json")
+    parser.add_argument("--resume", action="store_true")
+    parser.add_argument("--format", choices=["csv", "parquet"], default="csv")
+    parser.add_argument("--tolerance", type=float, default=None, help="stop a scenario once every win and reason share is known to within this half-width")
+    parser.add_argument("--length-tolerance", type=float, default=30, help="half-width in days required of the mean conflict length when --tolerance is set")
+    parser.add_argument("--sampler", choices=SAMPLERS, default="random")
+    parser.add_argument("--engine", choices=["object", "kernel", "ode", "batch"], default="object", help="batch runs a whole chunk as one vectorised simulation")
+    parser.add_argument("--metrics", default=None, help="where to write the sweep's timing and throughput record, next to the manifest by default")
+    parser.add_argument("--progress", action="store_true")
+    parser.add_argument("--resolution", type=parse_resolution, default=1, help=f"days per exported row, a number or one of {', '.join(RESOLUTIONS)}")
+    parser.add_argument("--window", choices=WINDOWS, default="sample", help="keep one day per row or average each window")
+    parser.add_argument("--precision", choices=PRECISIONS, default="float64")
+    parser.add_argument("--history-dtype", choices=PRECISIONS, default="float64", help="precision of each run's history while it is aggregated")
+    parser.add_argument("--columns", nargs="*", default=None, help="column stems to export, e.g. russia_gdp ukraine_military_capability")
+    args = parser.parse_args()
+
+    export_options = ExportOptions(args.resolution, args.window, args.precision, tuple(args.columns) if args.columns else None)
+    run_full_simulation_space(args.num_simulations, engine=args.engine, seed=args.seed, manifest_path=args.manifest, resume=args.resume, export_format=args.format, tolerance=args.tolerance, length_tolerance=args.length_tolerance, sampler=args.sampler, metrics_path=args.metrics, progress=args.progress, export_options=export_options, history_dtype=args.history_dtype)
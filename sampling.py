@@ -0,0 +1,85 @@
+import numpy as np
+from dataclasses import fields
+
+from classes import Coefficients
+
+# prior of every sampled Coefficients field, in the order the random sampler draws them
+COEFFICIENT_PRIORS: dict[str, tuple] = {
+    "military_capability_weight": ("uniform", 5e-5, 7e-4),
+    "sanctions_delay": ("normal_int", 60, 10),
+    "foreign_aid_delay": ("normal_int", 60, 10),
+    "elasticity_coefficient": ("uniform", 8e-5, 6e-4),
+    "military_technology_investment_coefficient": ("uniform", 5e-4, 5e-3),
+    "industrial_technology_investment_coefficient": ("uniform", 1e-4, 1e-3),
+    "military_industrial_investment_coefficient": ("uniform", 1e-1, 1e0),
+    "civilian_industrial_investment_coefficient": ("uniform", 1e-2, 5e-1),
+    "military_consumption_cost_coefficient": ("uniform", 1e-4, 5e-3),
+    "military_demand_coefficient": ("uniform", .5, 6),
+    "military_attrition_coefficient": ("uniform", 5e-6, 6e-4),
+    "industrial_attrition_coefficient": ("uniform", 8e-8, 1e-6),
+    "spending_scaling_coefficient": ("uniform", 1e-1, 1e0),
+}
+
+FIXED_COEFFICIENTS: dict[str, float] = {
+    "production_efficiency": 8,
+    "conflict_intensity": 2.5,
+    "epsilon": 1e-10,
+}
+
+SAMPLERS = ("random", "sobol", "lhs")
+
+def draw_prior(prior: tuple, rng=np.random, size=None):
+    distribution, a, b = prior
+    if distribution == "uniform":
+        return rng.uniform(a, b, size=size)
+    if distribution == "normal_int":
+        value = rng.normal(a, b, size=size)
+        return int(value) if size is None else value.astype(int)
+    raise ValueError(f"Unknown prior distribution: {distribution}")
+
+def transform_prior(prior: tuple, u: np.ndarray) -> np.ndarray:
+    # maps points of the unit interval through the prior's inverse cdf
+    from scipy.stats import norm
+
+    distribution, a, b = prior
+    if distribution == "uniform":
+        return a + (b - a) * u
+    if distribution == "normal_int":
+        # scrambled Sobol and LHS points can land exactly on 0 or 1, where the normal ppf is infinite
+        eps = np.finfo(np.float64).eps
+        return norm.ppf(np.clip(u, eps, 1 - eps), loc=a, scale=b).astype(int)
+    raise ValueError(f"Unknown prior distribution: {distribution}")
+
+def unit_sample(num_runs: int, dimensions: int, method: str, rng=np.random) -> np.ndarray:
+    from scipy.stats import qmc
+
+    seed = rng if isinstance(rng, np.random.Generator) else None
+    if method == "sobol":
+        # Sobol points are balanced in blocks of powers of two, so draw the enclosing block and keep the first num_runs
+        points = qmc.Sobol(dimensions, scramble=True, seed=seed).random_base2(max(int(np.ceil(np.log2(max(num_runs, 1)))), 0))
+        return points[:num_runs]
+    if method == "lhs":
+        return qmc.LatinHypercube(dimensions, seed=seed).random(num_runs)
+    raise ValueError(f"Unknown sampler: {method}")
+
+def sample_coefficients(num_runs: int, rng=np.random, method: str = "random") -> Coefficients:
+    # a Coefficients of arrays, one entry per run
+    if method == "random":
+        sampled = {name: draw_prior(prior, rng, num_runs) for name, prior in COEFFICIENT_PRIORS.items()}
+    else:
+        return coefficients_from_unit(unit_sample(num_runs, len(COEFFICIENT_PRIORS), method, rng))
+    return Coefficients(**FIXED_COEFFICIENTS, **sampled)
+
+def coefficients_from_unit(u: np.ndarray) -> Coefficients:
+    # one row of the unit hypercube per run, one column per COEFFICIENT_PRIORS entry
+    return Coefficients(**FIXED_COEFFICIENTS, **{name: transform_prior(prior, u[:, i]) for i, (name, prior) in enumerate(COEFFICIENT_PRIORS.items())})
+
+def sample_run_coefficients(rng=np.random) -> Coefficients:
+    return Coefficients(**FIXED_COEFFICIENTS, **{name: draw_prior(prior, rng) for name, prior in COEFFICIENT_PRIORS.items()})
+
+def coefficients_row(coefficients: Coefficients, index: int) -> Coefficients:
+    row = {}
+    for field in fields(coefficients):
+        value = getattr(coefficients, field.name)
+        row[field.name] = value.item(index) if isinstance(value, np.ndarray) else value
+    return Coefficients(**row)
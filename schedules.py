@@ -0,0 +1,78 @@
+import numpy as np
+from dataclasses import dataclass
+from functools import lru_cache
+
+@dataclass(slots=True, frozen=True)
+class PiecewiseSchedule:
+    # breakpoints in days since the policy takes effect (after its delay)
+    times: tuple
+    values: tuple
+    interpolate: bool = True
+
+    def evaluate(self, t: np.ndarray) -> np.ndarray:
+        if self.interpolate:
+            return np.interp(t, self.times, self.values)
+        indices = np.searchsorted(self.times, t, side="right") - 1
+        return np.where(indices < 0, self.values[0], np.asarray(self.values)[np.maximum(indices, 0)])
+
+def sanctions_values(policy, t: np.ndarray) -> np.ndarray:
+    if isinstance(policy, PiecewiseSchedule):
+        return policy.evaluate(t)
+    return np.maximum(0, np.minimum(policy, .001 + ((policy - .001) * t / 180)))
+
+def foreign_aid_values(policy, t: np.ndarray) -> np.ndarray:
+    if isinstance(policy, PiecewiseSchedule):
+        return policy.evaluate(t)
+    return np.full(len(t), policy, dtype=np.float64)
+
+class DelayedSeries:
+    __slots__ = ("values", "offset")
+
+    def __init__(self, values: np.ndarray, offset: int) -> None:
+        # values[offset + u] is the series at shifted time u = t - delay
+        self.values: np.ndarray = values
+        self.offset: int = offset
+        self.values.setflags(write=False)
+
+    def __call__(self, t, delay):
+        return self.values[np.clip(t - delay + self.offset, 0, len(self.values) - 1)]
+
+    def by_day(self, delay: int, timesteps: int) -> list[float]:
+        # the series for one run's delay as plain floats, so the daily lookup is a list index
+        return self(np.arange(timesteps), int(delay)).tolist()
+
+class ScenarioSchedule:
+    __slots__ = ("timesteps", "conflict_intensity", "conflict_intensity_by_day", "ramp_steps", "sanctions_effect", "foreign_aid")
+
+    def __init__(self, timesteps: int, international_interference: dict) -> None:
+        t = np.arange(timesteps)
+        self.timesteps: int = timesteps
+        self.conflict_intensity: np.ndarray = np.where(t > 365, 1, -1.5 * t / 365 + 2.5)
+        self.conflict_intensity_by_day: list[float] = self.conflict_intensity.tolist()
+        self.ramp_steps: np.ndarray = np.arange(270, 540) - 270
+
+        # shifted time spans [-timesteps, 2 * timesteps); every schedule is constant past either end
+        shifted = np.arange(-timesteps, 2 * timesteps)
+        self.sanctions_effect: dict[str, DelayedSeries] = {}
+        self.foreign_aid: dict[str, DelayedSeries] = {}
+        for side in ("russia", "ukraine"):
+            self.sanctions_effect[side] = DelayedSeries(1 - sanctions_values(international_interference.get(f"sanctions_{side}"), shifted), timesteps)
+            self.foreign_aid[side] = DelayedSeries(foreign_aid_values(international_interference.get(f"foreign_aid_{side}"), shifted), timesteps)
+
+        self.conflict_intensity.setflags(write=False)
+
+    def attacking_intensities(self, baseline_russian_attacking_intensity):
+        russia = np.empty(540)
+        russia[:270] = 0.7
+        russia[270:] = 0.7 - (.7 - baseline_russian_attacking_intensity) / 270 * self.ramp_steps
+        ukraine = 1 - russia
+        ukraine[:270] = 0.25
+        return russia, ukraine
+
+@lru_cache(maxsize=64)
+def _cached_schedule(timesteps: int, interference: tuple) -> ScenarioSchedule:
+    return ScenarioSchedule(timesteps, dict(interference))
+
+def get_schedule(timesteps: int, international_interference: dict) -> ScenarioSchedule:
+    # built once per process for each distinct scenario and reused read-only by every run
+    return _cached_schedule(timesteps, tuple(sorted(international_interference.items())))
@@ -0,0 +1,128 @@
+from batch_simulation import run_batch_simulation
+from sampling import COEFFICIENT_PRIORS, coefficients_from_unit
+from results_store import scenario_id
+from result_cache import model_version
+from multiprocessing import Pool
+import argparse
+import json
+import os
+import numpy as np
+import polars as pl
+
+OUTPUTS = ("ukraine_win", "length", "russia_final_gdp", "ukraine_final_gdp")
+
+def saltelli_design(num_samples: int, entropy: int) -> tuple[np.ndarray, np.ndarray]:
+    # a scrambled Sobol sequence with a fixed seed, so a larger design extends a smaller one row for row
+    from scipy.stats import qmc
+
+    dimensions = len(COEFFICIENT_PRIORS)
+    rng = np.random.default_rng(np.random.SeedSequence(entropy, spawn_key=(0,)))
+    points = qmc.Sobol(2 * dimensions, scramble=True, seed=rng).random_base2(int(np.log2(num_samples)))
+    return points[:, :dimensions], points[:, dimensions:]
+
+def design_matrix(a: np.ndarray, b: np.ndarray, matrix: int) -> np.ndarray:
+    # 0 is A, 1 is B and 2 + i is A with column i taken from B
+    if matrix < 2:
+        return (a, b)[matrix]
+    mixed = a.copy()
+    mixed[:, matrix - 2] = b[:, matrix - 2]
+    return mixed
+
+def design_outputs(args: tuple) -> tuple:
+    key, timesteps, international_interference, investment_policies, unit_rows, seed = args
+    rng = np.random.default_rng(seed)
+    russia, ukraine, lengths, winners, reasons = run_batch_simulation(timesteps, coefficients_from_unit(unit_rows), international_interference, investment_policies, len(unit_rows), rng=rng)
+    return key, np.vstack([winners == "Ukraine", lengths, russia.economic_capital, ukraine.economic_capital])
+
+def sobol_indices(outputs: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+    # outputs is (2 + dimensions, runs); Saltelli 2010 first-order and Jansen total-order estimators
+    f_a, f_b, f_ab = outputs[0], outputs[1], outputs[2:]
+    variance = np.var(np.concatenate([f_a, f_b]))
+    if variance == 0:
+        return np.zeros(len(f_ab)), np.zeros(len(f_ab))
+    first = np.mean(f_b * (f_ab - f_a), axis=1) / variance
+    total = .5 * np.mean((f_a - f_ab) ** 2, axis=1) / variance
+    return first, total
+
+def bootstrap_half_widths(outputs: np.ndarray, resamples: int = 200, z_score=1.96, rng=np.random) -> tuple[np.ndarray, np.ndarray]:
+    samples = [sobol_indices(outputs[:, rng.integers(0, outputs.shape[1], outputs.shape[1])]) for _ in range(resamples)]
+    return z_score * np.std([s[0] for s in samples], axis=0), z_score * np.std([s[1] for s in samples], axis=0)
+
+def cache_path(international_interference: dict[str, float], investment_policies: dict[str, list], cache_dir: str = "data/sensitivity") -> str:
+    return os.path.join(cache_dir, f"{scenario_id(international_interference, investment_policies)}.npz")
+
+def load_cache(path: str, entropy: int = None, timesteps: int = 3650) -> tuple[int, np.ndarray]:
+    if not os.path.exists(path):
+        return entropy, None
+    cache = np.load(path)
+    # outputs simulated under other prior ranges or another version of the model cannot be extended
+    if "priors" not in cache.files or str(cache["priors"]) != json.dumps(COEFFICIENT_PRIORS) or str(cache["model"]) != model_version():
+        return entropy, None
+    cached_entropy = int(cache["entropy"])
+    if (entropy is not None and cached_entropy != entropy) or int(cache["timesteps"]) != timesteps or tuple(cache["coefficients"]) != tuple(COEFFICIENT_PRIORS):
+        return entropy, None
+    return cached_entropy, cache["outputs"]
+
+def evaluate_design(num_samples: int, international_interference: dict[str, float], investment_policies: dict[str, list], timesteps: int = 3650, chunk_size: int = 256, processes: int = None, seed: int = None, cache_dir: str = "data/sensitivity") -> np.ndarray:
+    # returns (outputs, 2 + dimensions, num_samples); only rows missing from the cache are simulated
+    path = cache_path(international_interference, investment_policies, cache_dir)
+    entropy, cached = load_cache(path, None if seed is None else np.random.SeedSequence(seed).entropy, timesteps)
+    entropy = np.random.SeedSequence().entropy if entropy is None else entropy
+    cached_samples = 0 if cached is None else cached.shape[2]
+    if cached_samples >= num_samples:
+        return cached[:, :, :num_samples]
+
+    a, b = saltelli_design(num_samples, entropy)
+    dimensions = len(COEFFICIENT_PRIORS)
+    outputs = np.empty((len(OUTPUTS), dimensions + 2, num_samples))
+    if cached is not None:
+        outputs[:, :, :cached_samples] = cached
+
+    chunk_size = min(chunk_size, num_samples - cached_samples)
+    # the same chunk of every matrix shares a seed, so the in-run draws are common to A, B and each AB_i row
+    tasks = [
+        ((matrix, start), timesteps, international_interference, investment_policies, design_matrix(a, b, matrix)[start:start + chunk_size], np.random.SeedSequence(entropy, spawn_key=(1, start)))
+        for start in range(cached_samples, num_samples, chunk_size)
+        for matrix in range(dimensions + 2)
+    ]
+    print(f"Simulating {(num_samples - cached_samples) * (dimensions + 2)} runs for {num_samples} design samples ({cached_samples} cached)")
+    with Pool(processes=processes or os.cpu_count()) as pool:
+        for (matrix, start), chunk in pool.imap_unordered(design_outputs, tasks):
+            outputs[:, matrix, start:start + chunk.shape[1]] = chunk
+
+    os.makedirs(cache_dir, exist_ok=True)
+    np.savez(path, outputs=outputs, entropy=str(entropy), timesteps=timesteps, coefficients=np.array(list(COEFFICIENT_PRIORS)), priors=json.dumps(COEFFICIENT_PRIORS), model=model_version())
+    return outputs
+
+def run_sensitivity_analysis(num_samples: int = 1024, international_interference: dict[str, float] = None, investment_policies: dict[str, list] = None, timesteps: int = 3650, chunk_size: int = 256, processes: int = None, seed: int = None, cache_dir: str = "data/sensitivity") -> pl.DataFrame:
+    if not international_interference:
+        international_interference = {'foreign_aid_russia': 0, 'sanctions_ukraine': 0, 'foreign_aid_ukraine': .24, 'sanctions_russia': .14}
+    if not investment_policies:
+        investment_policies = {'ukraine': [.25, .25, .25, .25], 'russia': [.25, .25, .25, .25]}
+    if num_samples & (num_samples - 1):
+        num_samples = 1 << num_samples.bit_length()
+        print(f"Rounding the design up to {num_samples} samples, the Sobol sequence is balanced in powers of two")
+
+    outputs = evaluate_design(num_samples, international_interference, investment_policies, timesteps, chunk_size, processes, seed, cache_dir)
+    rng = np.random.default_rng(0)
+    columns = {"coefficient": list(COEFFICIENT_PRIORS)}
+    for i, output in enumerate(OUTPUTS):
+        first, total = sobol_indices(outputs[i])
+        first_half_width, total_half_width = bootstrap_half_widths(outputs[i], rng=rng)
+        columns[f"{output}_first"] = first
+        columns[f"{output}_first_conf"] = first_half_width
+        columns[f"{output}_total"] = total
+        columns[f"{output}_total_conf"] = total_half_width
+    return pl.DataFrame(columns)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--num-samples", type=int, default=1024)
+    parser.add_argument("--seed", type=int, default=None)
+    parser.add_argument("--cache-dir", default="data/sensitivity")
+    args = parser.parse_args()
+
+    indices = run_sensitivity_analysis(args.num_samples, seed=args.seed, cache_dir=args.cache_dir)
+    with pl.Config(tbl_rows=-1, tbl_cols=-1):
+        print(indices.select("coefficient", *[f"{output}_total" for output in OUTPUTS]).sort("ukraine_win_total", descending=True))
+    indices.write_csv("data/sensitivity_indices.csv")
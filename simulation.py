@@ -2,14 +2,15 @@ import numpy as np
 from typing import Tuple, List
 
 from classes import Belligerant, Coefficients
-import data_analysis as da
+from schedules import ScenarioSchedule, get_schedule
 
-def conflict_intensity(t: int) -> float:
-    return 1 if t > 365 else -1.5 * t / 365 + 2.5
-
-def create_belligerants(coefficients: Coefficients, international_interference: dict, investment_policies: dict, monte_carlo=False) -> Tuple[Belligerant, Belligerant]:
+def create_belligerants(coefficients: Coefficients, international_interference: dict, investment_policies: dict, monte_carlo=False, history_capacity: int = 3651, rng=np.random, schedule: ScenarioSchedule = None, history_dtype=np.float64) -> Tuple[Belligerant, Belligerant]:
     russian_federation: Belligerant
     ukraine: Belligerant
+    schedules: dict = {side: {} for side in ("russia", "ukraine")}
+    if schedule is not None:
+        for side in ("russia", "ukraine"):
+            schedules[side] = {"sanctions_schedule": schedule.sanctions_effect[side], "foreign_aid_schedule": schedule.foreign_aid[side]}
 
     if not monte_carlo:
         russian_federation = Belligerant(
@@ -28,6 +29,9 @@ def create_belligerants(coefficients: Coefficients, international_interference:
             tax_revenue_percentage=0.11,
             sanctions_policy=international_interference.get('sanctions_russia'),
             foreign_aid_policy=international_interference.get('foreign_aid_russia'),
+            history_capacity=history_capacity,
+            history_dtype=history_dtype,
+            **schedules["russia"],
         )
 
         ukraine = Belligerant(
@@ -46,9 +50,12 @@ def create_belligerants(coefficients: Coefficients, international_interference:
             tax_revenue_percentage=0.19,
             sanctions_policy=international_interference.get('sanctions_ukraine'),
             foreign_aid_policy=international_interference.get('foreign_aid_ukraine'),
+            history_capacity=history_capacity,
+            history_dtype=history_dtype,
+            **schedules["ukraine"],
         )
     else:
-        russia_attacking_intensity = np.random.normal(.62,.02)
+        russia_attacking_intensity = rng.normal(.62,.02)
         russian_federation = Belligerant(
             name="Russian Federation",
             coefficients=coefficients,
@@ -62,9 +69,12 @@ def create_belligerants(coefficients: Coefficients, international_interference:
             military_industrial_investment_percentage=investment_policies.get('russia')[2],
             civilian_industrial_investment_percentage=investment_policies.get('russia')[3],
             attacking_intensity=russia_attacking_intensity,
-            tax_revenue_percentage=np.random.normal(0.11, 0.01),
+            tax_revenue_percentage=rng.normal(0.11, 0.01),
             sanctions_policy=international_interference.get('sanctions_russia'),
             foreign_aid_policy=international_interference.get('foreign_aid_russia'),
+            history_capacity=history_capacity,
+            history_dtype=history_dtype,
+            **schedules["russia"],
         )
 
         ukraine = Belligerant(
@@ -80,9 +90,12 @@ def create_belligerants(coefficients: Coefficients, international_interference:
             military_industrial_investment_percentage=investment_policies.get('ukraine')[2],
             civilian_industrial_investment_percentage=investment_policies.get('ukraine')[3],
             attacking_intensity=1-russia_attacking_intensity,
-            tax_revenue_percentage=np.random.normal(0.19, 0.01),
+            tax_revenue_percentage=rng.normal(0.19, 0.01),
             sanctions_policy=international_interference.get('sanctions_ukraine'),
             foreign_aid_policy=international_interference.get('foreign_aid_ukraine'),
+            history_capacity=history_capacity,
+            history_dtype=history_dtype,
+            **schedules["ukraine"],
         )
 
     return russian_federation, ukraine
@@ -125,7 +138,7 @@ def print_endgame_stats(belligerants: List[Belligerant]) -> None:
     for belligerant in belligerants:
         print(f"{belligerant.name} has {belligerant.economic_capital} economic capital, {belligerant.military_capability} military capability, and {belligerant.civilian_industrial_capacity} civilian industrial capacity.")
 
-def run_simulation(timesteps: int, coefficients: Coefficients, international_interference, investment_policies, monte_carlo=False) -> Tuple[Belligerant, Belligerant, int, str, str]:
+def run_simulation(timesteps: int, coefficients: Coefficients, international_interference, investment_policies, monte_carlo=False, rng=np.random, schedule: ScenarioSchedule = None, history_dtype=np.float64) -> Tuple[Belligerant, Belligerant, int, str, str]:
     if not international_interference:
         international_interference: dict[str, float] = {}
         international_interference['foreign_aid_russia'] = 0
@@ -138,19 +151,21 @@ def run_simulation(timesteps: int, coefficients: Coefficients, international_int
         investment_policies['ukraine'] = [.25, .25, .25, .25]
         investment_policies['russia'] = [.25, .25, .25, .25]
 
-    russian_federation, ukraine = create_belligerants(coefficients, international_interference, investment_policies, monte_carlo)
-    baseline_russian_attacking_intensity = np.random.normal(.62,.02)
+    if schedule is None:
+        schedule = get_schedule(timesteps, international_interference)
+
+    russian_federation, ukraine = create_belligerants(coefficients, international_interference, investment_policies, monte_carlo, timesteps + 1, rng, schedule, history_dtype)
+    baseline_russian_attacking_intensity = rng.normal(.62,.02)
+    russian_attacking_intensities, ukrainian_attacking_intensities = (intensities.tolist() for intensities in schedule.attacking_intensities(baseline_russian_attacking_intensity))
+    conflict_intensities = schedule.conflict_intensity_by_day
     for t in range(timesteps):
-        coefficients.conflict_intensity = conflict_intensity(t)
+        coefficients.conflict_intensity = conflict_intensities[t]
         ru_military_capability: float = russian_federation.military_capability
         ua_military_capability: float = ukraine.military_capability
 
-        if t < 270:
-            russian_federation.attacking_intensity = 0.7
-            ukraine.attacking_intensity = 0.25
-        elif t < 540:
-            russian_federation.attacking_intensity = 0.7 - (.7 - baseline_russian_attacking_intensity) / 270 * (t - 270)
-            ukraine.attacking_intensity = 1 - russian_federation.attacking_intensity            
+        if t < 540:
+            russian_federation.attacking_intensity = russian_attacking_intensities[t]
+            ukraine.attacking_intensity = ukrainian_attacking_intensities[t]
 
         russian_federation.update(t, ua_military_capability)
         ukraine.update(t, ru_military_capability)
@@ -162,6 +177,8 @@ def run_simulation(timesteps: int, coefficients: Coefficients, international_int
     return russian_federation, ukraine, timesteps, "None", reason
 
 if __name__ == "__main__":
+    import data_analysis as da
+
     global_coefficients: Coefficients = Coefficients(
         production_efficiency=8,
         military_capability_weight=1.5e-4,
@@ -0,0 +1,250 @@
+from monte_carlo_simulation import batch_simulation
+from aggregation import ScenarioAggregate, ExportOptions, export_columns
+from batch_simulation import WINNERS, REASONS
+from concurrent.futures import ProcessPoolExecutor
+from collections import deque
+import argparse
+import asyncio
+import json
+import os
+import socket
+import numpy as np
+
+TIMESTEPS = 3650
+DEFAULT_ADDRESS = "127.0.0.1:8765"
+
+def chunk_schedule(num_simulations: int, first: int = 64, largest: int = 1000) -> list[int]:
+    # small chunks first so the first answer arrives quickly, then doubling up to largest for throughput
+    sizes = []
+    size = first
+    while sum(sizes) < num_simulations:
+        sizes.append(min(size, num_simulations - sum(sizes)))
+        size = min(2 * size, largest)
+    return sizes
+
+def request_key(request: dict) -> str:
+    # identical concurrent requests share one computation
+    return json.dumps({name: request.get(name) for name in ("international_interference", "investment_policies", "num_simulations", "seed", "sampler", "tolerance", "length_tolerance", "trajectories", "resolution")}, sort_keys=True)
+
+def progress_message(aggregate: ScenarioAggregate, request: dict, done: bool) -> dict:
+    message = {
+        "runs": aggregate.count,
+        "done": done,
+        "win_rates": {winner: aggregate.winners.count(winner) / aggregate.count for winner in WINNERS},
+        "reasons": {reason: aggregate.reasons.count(reason) / aggregate.count for reason in REASONS},
+        "mean_length": float(np.mean(aggregate.lengths)),
+    }
+    if aggregate.count > 1:
+        message["half_widths"] = aggregate.outcome_half_widths()
+    if request.get("trajectories"):
+        # column stems as in the exports, e.g. "russia_gdp", at a coarse resolution to keep messages small
+        options = ExportOptions(request.get("resolution", 30), columns=tuple(request["trajectories"]))
+        message["trajectories"] = {name: values.tolist() for name, values in export_columns(aggregate.columns(), options).items()}
+    return message
+
+class ScenarioJob:
+    def __init__(self, request: dict) -> None:
+        self.request: dict = request
+        self.aggregate: ScenarioAggregate = ScenarioAggregate(TIMESTEPS + 1)
+        entropy = np.random.SeedSequence(request.get("seed")).entropy
+        # chunk i always draws from the same child, so a seeded request reproduces its runs
+        self.chunks = iter(enumerate([
+            (TIMESTEPS, request["international_interference"], request["investment_policies"], size, np.random.SeedSequence(entropy, spawn_key=(i,)), request.get("sampler", "random"))
+            for i, size in enumerate(chunk_schedule(request["num_simulations"]))
+        ]))
+        # chunks finish in any order but are merged in schedule order, so a tolerance stops a seeded request at the same runs
+        self.finished: dict[int, ScenarioAggregate] = {}
+        self.merged: int = 0
+        self.subscribers: set[asyncio.Queue] = set()
+        self.latest: dict = None
+        self.done: bool = False
+
+    def publish(self, message: dict) -> None:
+        self.latest = message
+        for queue in self.subscribers:
+            queue.put_nowait(message)
+
+class SimulationService:
+    def __init__(self, processes: int = None) -> None:
+        self.processes: int = processes or os.cpu_count()
+        # one pool for the life of the service, so no request pays for process start-up or imports
+        self.pool = ProcessPoolExecutor(self.processes)
+        self.jobs: dict[str, ScenarioJob] = {}
+        # jobs take turns at free workers, so a new request is not queued behind every chunk of a large one
+        self.ready: deque[ScenarioJob] = deque()
+        self.slots = asyncio.Semaphore(self.processes)
+        self.wakeup = asyncio.Event()
+
+    async def warm_up(self) -> None:
+        loop = asyncio.get_running_loop()
+        await asyncio.gather(*[loop.run_in_executor(self.pool, chunk_schedule, 1) for _ in range(self.processes)])
+
+    def subscribe(self, request: dict) -> tuple[ScenarioJob, asyncio.Queue]:
+        key = request_key(request)
+        job = self.jobs.get(key)
+        if job is None:
+            job = self.jobs[key] = ScenarioJob(request)
+            self.ready.append(job)
+            self.wakeup.set()
+        queue = asyncio.Queue()
+        job.subscribers.add(queue)
+        if job.latest is not None:
+            queue.put_nowait(job.latest)
+        return job, queue
+
+    def unsubscribe(self, job: ScenarioJob, queue: asyncio.Queue) -> None:
+        job.subscribers.discard(queue)
+        if not job.subscribers:
+            # nobody is listening any more, so its remaining chunks are not started
+            self.finish(job)
+
+    def finish(self, job: ScenarioJob) -> None:
+        job.done = True
+        if self.jobs.get(request_key(job.request)) is job:
+            del self.jobs[request_key(job.request)]
+
+    async def schedule(self) -> None:
+        while True:
+            await self.slots.acquire()
+            while not self.ready:
+                self.wakeup.clear()
+                await self.wakeup.wait()
+            job = self.ready.popleft()
+            chunk = None if job.done else next(job.chunks, None)
+            if chunk is None:
+                self.slots.release()
+                continue
+            self.ready.append(job)
+            asyncio.create_task(self.run_chunk(job, *chunk))
+
+    async def run_chunk(self, job: ScenarioJob, index: int, chunk: tuple) -> None:
+        try:
+            result = await asyncio.get_running_loop().run_in_executor(self.pool, batch_simulation, chunk)
+        except Exception as error:
+            self.finish(job)
+            job.publish({"error": repr(error), "done": True})
+            return
+        finally:
+            self.slots.release()
+        job.finished[index] = result
+        request = job.request
+        while not job.done and job.merged in job.finished:
+            job.aggregate.merge(job.finished.pop(job.merged))
+            job.merged += 1
+            converged = request.get("tolerance") is not None and job.aggregate.converged(request["tolerance"], request.get("length_tolerance", 30))
+            done = job.aggregate.count >= request["num_simulations"] or converged
+            if done:
+                self.finish(job)
+            job.publish(progress_message(job.aggregate, request, done))
+
+    async def handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        # one JSON request per line; every reply is a JSON line and the last one of a request has done set
+        try:
+            while line := await reader.readline():
+                try:
+                    request = validate_request(json.loads(line))
+                except (ValueError, KeyError, TypeError) as error:
+                    writer.write(json.dumps({"error": str(error), "done": True}).encode() + b"\n")
+                    await writer.drain()
+                    continue
+                job, queue = self.subscribe(request)
+                try:
+                    while True:
+                        message = await queue.get()
+                        writer.write(json.dumps(message).encode() + b"\n")
+                        await writer.drain()
+                        if message["done"]:
+                            break
+                finally:
+                    self.unsubscribe(job, queue)
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
+
+    async def serve(self, address: str = DEFAULT_ADDRESS) -> None:
+        await self.warm_up()
+        if ":" in address:
+            host, port = address.rsplit(":", 1)
+            server = await asyncio.start_server(self.handle, host, int(port))
+        else:
+            server = await asyncio.start_unix_server(self.handle, address)
+        print(f"Serving simulations on {address} with {self.processes} workers")
+        scheduler = asyncio.create_task(self.schedule())
+        try:
+            async with server:
+                await server.serve_forever()
+        finally:
+            scheduler.cancel()
+            self.pool.shutdown(cancel_futures=True)
+
+def validate_request(request: dict) -> dict:
+    request = {
+        "international_interference": {'foreign_aid_russia': 0, 'sanctions_ukraine': 0, 'foreign_aid_ukraine': .24, 'sanctions_russia': .14},
+        "investment_policies": {'ukraine': [.25, .25, .25, .25], 'russia': [.25, .25, .25, .25]},
+        "num_simulations": 1000,
+        **request,
+    }
+    # values are stored converted, so a job never starts from a request it cannot run
+    num_simulations = request["num_simulations"]
+    if isinstance(num_simulations, bool) or not float(num_simulations).is_integer() or int(num_simulations) < 1:
+        raise ValueError("num_simulations must be a positive integer")
+    request["num_simulations"] = int(num_simulations)
+    request["investment_policies"] = {side: [float(share) for share in request["investment_policies"][side]] for side in ("ukraine", "russia")}
+    for side, shares in request["investment_policies"].items():
+        if len(shares) != 4 or min(shares) < 0:
+            raise ValueError(f"{side} needs four non-negative investment shares")
+    request["international_interference"] = {name: float(request["international_interference"][name]) for name in ("foreign_aid_russia", "sanctions_ukraine", "foreign_aid_ukraine", "sanctions_russia")}
+    if min(request["international_interference"].values()) < 0:
+        raise ValueError("international_interference values must be non-negative")
+    if request.get("trajectories"):
+        # raises on unknown stems before a job is started for them
+        ExportOptions(int(request.get("resolution", 30)), columns=tuple(request["trajectories"]))
+    return request
+
+def connect(address: str = DEFAULT_ADDRESS) -> socket.socket:
+    if ":" in address:
+        host, port = address.rsplit(":", 1)
+        return socket.create_connection((host, int(port)))
+    client = socket.socket(socket.AF_UNIX)
+    client.connect(address)
+    return client
+
+def request_simulation(request: dict, address: str = DEFAULT_ADDRESS):
+    # blocking client for analysis scripts, yields every partial result until the final one
+    with connect(address) as client, client.makefile("rwb") as stream:
+        stream.write(json.dumps(request).encode() + b"\n")
+        stream.flush()
+        for line in stream:
+            message = json.loads(line)
+            yield message
+            if message["done"]:
+                return
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("role", choices=["serve", "query"])
+    parser.add_argument("--address", default=DEFAULT_ADDRESS, help="host:port, or a path for a Unix socket")
+    parser.add_argument("--processes", type=int, default=None)
+    parser.add_argument("--num-simulations", type=int, default=1000)
+    parser.add_argument("--ukraine", type=float, nargs=4, default=[.25, .25, .25, .25])
+    parser.add_argument("--russia", type=float, nargs=4, default=[.25, .25, .25, .25])
+    parser.add_argument("--foreign-aid-ukraine", type=float, default=.24)
+    parser.add_argument("--sanctions-russia", type=float, default=.14)
+    parser.add_argument("--seed", type=int, default=None)
+    args = parser.parse_args()
+
+    if args.role == "serve":
+        asyncio.run(SimulationService(args.processes).serve(args.address))
+    else:
+        request = {
+            "international_interference": {'foreign_aid_russia': 0, 'sanctions_ukraine': 0, 'foreign_aid_ukraine': args.foreign_aid_ukraine, 'sanctions_russia': args.sanctions_russia},
+            "investment_policies": {'ukraine': args.ukraine, 'russia': args.russia},
+            "num_simulations": args.num_simulations,
+            "seed": args.seed,
+        }
+        for message in request_simulation(request, args.address):
+            if "error" in message:
+                raise SystemExit(message["error"])
+            half_width = message.get("half_widths", {}).get("winner_Ukraine", float("nan"))
+            print(f"{message['runs']} runs: Ukraine wins {message['win_rates']['Ukraine']:.3f} +- {half_width:.3f}, mean length {message['mean_length']:.0f} days")
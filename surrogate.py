@@ -0,0 +1,145 @@
+from run_full_simulation_space import create_manifest, load_manifest, save_manifest, pending_scenarios, run_simulation_sweep
+from results_store import parameter_columns
+import argparse
+import os
+import numpy as np
+import polars as pl
+
+ACQUISITIONS = ("straddle", "uncertainty")
+
+def scenario_features(international_interference: dict[str, float], investment_policies: dict[str, list]) -> np.ndarray:
+    return np.array(list(parameter_columns(international_interference, investment_policies).values()))
+
+def manifest_features(manifest: dict, indices: list[int]) -> np.ndarray:
+    scenarios = manifest["scenarios"]
+    return np.array([scenario_features(scenarios[i]["international_interference"], scenarios[i]["investment_policies"]) for i in indices])
+
+def scenario_summaries(manifest: dict, winner: str = "Ukraine") -> tuple[list[int], np.ndarray, np.ndarray]:
+    # completed scenarios with the number of runs and the wins of winner the sweep recorded for them
+    completed = [i for i, scenario in enumerate(manifest["scenarios"]) if scenario["status"] == "complete" and "wins" in scenario]
+    runs = np.array([manifest["scenarios"][i]["runs"] for i in completed], dtype=np.float64)
+    wins = np.array([manifest["scenarios"][i]["wins"].get(winner, 0) for i in completed], dtype=np.float64)
+    return completed, wins, runs
+
+class GaussianProcessSurrogate:
+    def __init__(self, length_scales=np.geomspace(.3, 10, 12), signal_scales=(.5, 1, 2)) -> None:
+        # hyperparameters are picked from these grids by marginal likelihood on every fit
+        self.length_scales = length_scales
+        self.signal_scales = signal_scales
+        self.x = None
+
+    def kernel(self, a: np.ndarray, b: np.ndarray, length_scale: float = None) -> np.ndarray:
+        length_scale = self.length_scale if length_scale is None else length_scale
+        distances = np.sum(a ** 2, axis=1)[:, None] + np.sum(b ** 2, axis=1)[None, :] - 2 * a @ b.T
+        return np.exp(-.5 * np.maximum(distances, 0) / length_scale ** 2)
+
+    def fit(self, features: np.ndarray, wins: np.ndarray, runs: np.ndarray) -> 'GaussianProcessSurrogate':
+        self.center = features.mean(axis=0)
+        self.scale = np.where(features.std(axis=0) > 0, features.std(axis=0), 1)
+        self.x = (features - self.center) / self.scale
+        p = (wins + 1) / (runs + 2)
+        self.y = wins / runs
+        self.prior_mean = self.y.mean()
+        # each observed share is itself a Monte Carlo estimate, so its binomial variance is the observation noise
+        self.noise = p * (1 - p) / runs + 1e-8
+        variance = max(self.y.var(), 1e-4)
+
+        best = -np.inf
+        for length_scale in self.length_scales:
+            base = self.kernel(self.x, self.x, length_scale)
+            for signal_scale in self.signal_scales:
+                covariance = signal_scale * variance * base + np.diag(self.noise)
+                try:
+                    cholesky = np.linalg.cholesky(covariance)
+                except np.linalg.LinAlgError:
+                    continue
+                alpha = np.linalg.solve(cholesky.T, np.linalg.solve(cholesky, self.y - self.prior_mean))
+                likelihood = -.5 * (self.y - self.prior_mean) @ alpha - np.log(np.diag(cholesky)).sum()
+                if likelihood > best:
+                    best = likelihood
+                    self.length_scale, self.signal_variance = length_scale, signal_scale * variance
+                    self.cholesky, self.alpha = cholesky, alpha
+        return self
+
+    def predict(self, features: np.ndarray, pseudo_features: np.ndarray = None) -> tuple[np.ndarray, np.ndarray]:
+        x = (features - self.center) / self.scale
+        cross = self.signal_variance * self.kernel(x, self.x)
+        mean = np.clip(self.prior_mean + cross @ self.alpha, 0, 1)
+        cholesky = self.cholesky
+        if pseudo_features is not None and len(pseudo_features):
+            # posterior variance does not depend on the observed values, so pending picks can be conditioned on as-is
+            pseudo = (pseudo_features - self.center) / self.scale
+            points = np.vstack([self.x, pseudo])
+            covariance = self.signal_variance * self.kernel(points, points) + np.diag(np.concatenate([self.noise, np.full(len(pseudo), 1e-8)]))
+            cholesky = np.linalg.cholesky(covariance)
+            cross = self.signal_variance * self.kernel(x, points)
+        v = np.linalg.solve(cholesky, cross.T)
+        std = np.sqrt(np.maximum(self.signal_variance - np.sum(v ** 2, axis=0), 0))
+        return mean, std
+
+def acquisition_scores(mean: np.ndarray, std: np.ndarray, acquisition: str = "straddle", threshold: float = .5, z_score=1.96) -> np.ndarray:
+    if acquisition == "uncertainty":
+        return std
+    if acquisition == "straddle":
+        # highest where the interval still straddles the threshold, i.e. where it is unclear which side wins
+        return z_score * std - np.abs(mean - threshold)
+    raise ValueError(f"Unknown acquisition: {acquisition}")
+
+def select_scenarios(surrogate: GaussianProcessSurrogate, candidates: np.ndarray, count: int, acquisition: str = "straddle", threshold: float = .5) -> list[int]:
+    # greedy batch: every pick is conditioned on before the next so one batch does not cluster in one region
+    chosen = []
+    for _ in range(min(count, len(candidates))):
+        mean, std = surrogate.predict(candidates, candidates[chosen])
+        scores = acquisition_scores(mean, std, acquisition, threshold)
+        scores[chosen] = -np.inf
+        chosen.append(int(np.argmax(scores)))
+    return chosen
+
+def predict_scenarios(manifest: dict, surrogate: GaussianProcessSurrogate) -> pl.DataFrame:
+    scenarios = manifest["scenarios"]
+    mean, std = surrogate.predict(manifest_features(manifest, range(len(scenarios))))
+    return pl.DataFrame([
+        {**parameter_columns(scenario["international_interference"], scenario["investment_policies"]), "status": scenario["status"]}
+        for scenario in scenarios
+    ]).with_columns(pl.Series("ukraine_win_probability", mean), pl.Series("ukraine_win_probability_std", std))
+
+def run_active_learning(num_simulations: int, iterations: int = 10, batch: int = 8, initial: int = 16, acquisition: str = "straddle", chunk_size: int = 500, processes: int = None, engine: str = "batch", seed: int = None, manifest_path: str = "data/active_manifest.json", resume: bool = False) -> GaussianProcessSurrogate:
+    if resume and os.path.exists(manifest_path):
+        manifest = load_manifest(manifest_path)
+    else:
+        manifest = create_manifest(num_simulations, chunk_size, engine, seed=seed)
+        save_manifest(manifest, manifest_path)
+    rng = np.random.default_rng(np.random.SeedSequence(manifest["entropy"], spawn_key=(2,)))
+
+    surrogate = GaussianProcessSurrogate()
+    for iteration in range(iterations + 1):
+        completed, wins, runs = scenario_summaries(manifest)
+        pending = pending_scenarios(manifest)
+        if not pending:
+            break
+        if len(completed) < initial:
+            # random start before the surrogate has anything to go on
+            chosen = rng.choice(pending, min(initial - len(completed), len(pending)), replace=False).tolist()
+        else:
+            surrogate.fit(manifest_features(manifest, completed), wins, runs)
+            chosen = [pending[i] for i in select_scenarios(surrogate, manifest_features(manifest, pending), batch, acquisition)]
+            print(f"Iteration {iteration}: {len(completed)} scenarios simulated, largest predictive std {surrogate.predict(manifest_features(manifest, pending))[1].max():.3f}")
+        run_simulation_sweep(manifest, manifest_path, processes, indices=chosen)
+
+    completed, wins, runs = scenario_summaries(manifest)
+    return surrogate.fit(manifest_features(manifest, completed), wins, runs)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--num-simulations", type=int, default=12000)
+    parser.add_argument("--iterations", type=int, default=10)
+    parser.add_argument("--batch", type=int, default=8)
+    parser.add_argument("--initial", type=int, default=16)
+    parser.add_argument("--acquisition", choices=ACQUISITIONS, default="straddle")
+    parser.add_argument("--seed", type=int, default=None)
+    parser.add_argument("--manifest", default="data/active_manifest.json")
+    parser.add_argument("--resume", action="store_true")
+    args = parser.parse_args()
+
+    surrogate = run_active_learning(args.num_simulations, args.iterations, args.batch, args.initial, args.acquisition, seed=args.seed, manifest_path=args.manifest, resume=args.resume)
+    predict_scenarios(load_manifest(args.manifest), surrogate).write_csv("data/surrogate_predictions.csv")
@@ -0,0 +1,8 @@
+import os
+import sys
+
+import matplotlib
+
+# the modules live at the top of the repository and are imported by name, as the scripts do
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+matplotlib.use("Agg")
@@ -0,0 +1,26 @@
+import numpy as np
+import pytest
+
+from aggregation import ExportOptions, column_stems, export_columns, interval_columns
+from classes import HISTORY_VARIABLES
+
+def columns(days: int = 30) -> dict:
+    values = np.arange(len(HISTORY_VARIABLES) * days, dtype=np.float64).reshape(len(HISTORY_VARIABLES), days)
+    return {**interval_columns("russia", values, values - 1, values + 1), **interval_columns("ukraine", values, values - 1, values + 1)}
+
+def test_column_stems_match_the_exported_columns():
+    assert set(column_stems()) == {name for name in columns() if not name.endswith(("_lower", "_upper"))}
+
+def test_unknown_stems_are_named():
+    with pytest.raises(ValueError, match="typo"):
+        ExportOptions(columns=("russia_gdp", "typo"))
+
+def test_sample_window_keeps_the_last_day():
+    exported = export_columns(columns(30), ExportOptions(7, columns=("russia_gdp",)))
+    assert exported["day"].tolist() == [0, 7, 14, 21, 28, 29]
+    assert set(exported) == {"day", "russia_gdp", "russia_gdp_lower", "russia_gdp_upper"}
+
+def test_mean_window_averages_each_window():
+    exported = export_columns(columns(10), ExportOptions(4, "mean", "float32"))
+    assert exported["russia_gdp"].dtype == np.float32
+    np.testing.assert_allclose(exported["russia_gdp"], [1.5, 5.5, 8.5])
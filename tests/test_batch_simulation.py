@@ -0,0 +1,32 @@
+import numpy as np
+
+from batch_simulation import run_batch_simulation, WINNERS, REASONS
+from monte_carlo_simulation import simulate_chunk
+from sampling import sample_coefficients
+
+INTERFERENCE = {"foreign_aid_russia": 0, "sanctions_ukraine": 0, "foreign_aid_ukraine": .24, "sanctions_russia": .14}
+POLICIES = {"russia": [.25, .25, .25, .25], "ukraine": [.25, .25, .25, .25]}
+
+def test_streamed_statistics_match_recorded_histories():
+    rng = np.random.default_rng(0)
+    russia, ukraine, lengths, winners, reasons = run_batch_simulation(720, sample_coefficients(64, rng), INTERFERENCE, POLICIES, 64, record_history=True, rng=rng)
+
+    assert lengths.shape == winners.shape == reasons.shape == (64,)
+    assert set(winners) <= set(WINNERS) and set(reasons) <= set(REASONS)
+    for side in (russia, ukraine):
+        np.testing.assert_allclose(side.history_mean, side.history.mean(axis=2), rtol=1e-9)
+        np.testing.assert_allclose(side.history_m2, side.history.var(axis=2) * 64, rtol=1e-6, atol=1e-9)
+        # at level 0 the sketch seed is the whole sorted batch
+        assert side.sketch_level == 0
+        np.testing.assert_array_equal(side.history_sketch, np.sort(side.history.astype(np.float32), axis=2).transpose(1, 2, 0))
+
+def test_batch_engine_agrees_with_object_engine_in_distribution():
+    runs = 200
+    _, batch = simulate_chunk((None, 365, INTERFERENCE, POLICIES, runs, "batch", np.random.SeedSequence(1), "random", "float64"))
+    _, single = simulate_chunk((None, 365, INTERFERENCE, POLICIES, runs, "object", np.random.SeedSequence(2), "random", "float64"))
+
+    for batch_side, object_side in ((batch.russia, single.russia), (batch.ukraine, single.ukraine)):
+        assert batch_side.count == object_side.count == runs
+        # the two engines draw different runs, so compare the final-day means within a few standard errors
+        standard_error = np.sqrt((batch_side.m2[:, -1] + object_side.m2[:, -1]) / (runs - 1) / runs)
+        assert np.all(np.abs(batch_side.mean[:, -1] - object_side.mean[:, -1]) <= 5 * standard_error + 1e-12)
@@ -0,0 +1,34 @@
+import os
+import time
+
+from distributed_sweep import LeaseQueue, run_coordinator
+from run_full_simulation_space import create_manifest, save_manifest, pending_scenarios
+
+def test_lease_queue_hands_each_job_out_once_and_requeues_expired_leases(tmp_path):
+    queue = LeaseQueue(str(tmp_path))
+    queue.put("a", {"x": 1})
+    queue.put("b", {"x": 2})
+    assert queue.claim() == ("a", {"x": 1})
+    assert queue.claim() == ("b", {"x": 2})
+    assert queue.claim() is None
+
+    queue.complete("a", "done")
+    assert list(queue.results()) == [("a", "done")]
+    os.utime(queue.path("leased", "b"), (time.time() - 100, time.time() - 100))
+    assert queue.requeue_expired(10) == ["b"]
+    assert queue.claim() == ("b", {"x": 2})
+
+def test_a_failing_chunk_marks_its_scenario_failed_instead_of_looping(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    os.makedirs("data")
+    manifest = create_manifest(4, 2, "object", timesteps=60, seed=0)
+    manifest["scenarios"] = manifest["scenarios"][:2]
+    # a policy with too few shares fails inside the worker on every attempt
+    manifest["scenarios"][1]["investment_policies"] = {"ukraine": [.25, .25, .25, .25], "russia": [.5, .5]}
+    save_manifest(manifest, "manifest.json")
+
+    run_coordinator(manifest, "manifest.json", str(tmp_path / "queue"), poll=.05, local_workers=1)
+    assert manifest["scenarios"][0]["status"] == "complete"
+    assert manifest["scenarios"][1]["status"] == "failed"
+    assert "IndexError" in manifest["scenarios"][1]["error"]
+    assert pending_scenarios(manifest) == [1]
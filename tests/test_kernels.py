@@ -0,0 +1,25 @@
+import numpy as np
+import pytest
+
+pytest.importorskip("numba")
+
+from kernels import run_simulation_kernel
+from simulation import run_simulation
+from sampling import sample_run_coefficients
+
+POLICIES = {"russia": [.25, .25, .25, .25], "ukraine": [.25, .25, .25, .25]}
+
+def seeded_run(engine, seed: int, timesteps: int):
+    rng = np.random.default_rng(seed)
+    coefficients = sample_run_coefficients(rng)
+    return engine(timesteps, coefficients, None, POLICIES, monte_carlo=True, rng=rng)
+
+@pytest.mark.parametrize("seed", range(4))
+def test_kernel_matches_object_engine_on_fixed_seeds(seed):
+    russia, ukraine, t, winner, reason = seeded_run(run_simulation, seed, 730)
+    kernel_russia, kernel_ukraine, kernel_t, kernel_winner, kernel_reason = seeded_run(run_simulation_kernel, seed, 730)
+
+    assert (kernel_t, kernel_winner, kernel_reason) == (t, winner, reason)
+    for side, kernel_side in ((russia, kernel_russia), (ukraine, kernel_ukraine)):
+        assert kernel_side.history.length == side.history.length
+        np.testing.assert_allclose(kernel_side.history.data[:, :side.history.length], side.history.data[:, :side.history.length], rtol=1e-9)
@@ -0,0 +1,35 @@
+import numpy as np
+
+from quantiles import QuantileSketch, QUANTILES, batch_level, batch_sample
+
+def rank_errors(estimates: np.ndarray, values: np.ndarray) -> np.ndarray:
+    # values is (runs, variables, days); the fraction of runs at or below each estimate, minus its target q
+    ranks = (values[None] <= estimates[:, None]).mean(axis=1)
+    return np.abs(ranks - np.asarray(QUANTILES)[:, None, None])
+
+def test_sketch_is_exact_below_its_size():
+    values = np.random.default_rng(0).lognormal(size=(100, 3, 5)).astype(np.float32)
+    sketch = QuantileSketch()
+    for run in values:
+        sketch.add(run)
+    expected = np.quantile(values, QUANTILES, axis=0, method="inverted_cdf")
+    np.testing.assert_array_equal(sketch.quantiles(), expected)
+
+def test_streamed_sketch_stays_within_rank_error_bound():
+    values = np.random.default_rng(1).normal(size=(20000, 2, 4)).astype(np.float32)
+    sketch = QuantileSketch()
+    for run in values:
+        sketch.add(run)
+    assert sum(sketch.size(level) for level in range(len(sketch.levels))) < 4 * sketch.k
+    assert rank_errors(sketch.quantiles(), values).max() < .02
+
+def test_merged_batch_sketches_stay_within_rank_error_bound():
+    values = np.random.default_rng(2).exponential(size=(20000, 2, 4)).astype(np.float32)
+    sketch = QuantileSketch()
+    for batch in np.split(values, 20):
+        # batches arrive as (variables x days x runs) states, as the batch engine produces them
+        state = np.moveaxis(batch, 0, -1).reshape(-1, len(batch))
+        level = batch_level(len(batch))
+        sample = batch_sample(state, level).reshape(-1, *batch.shape[1:])
+        sketch.merge(QuantileSketch.from_sample(sample, level))
+    assert rank_errors(sketch.quantiles(), values).max() < .02
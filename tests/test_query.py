@@ -0,0 +1,52 @@
+import numpy as np
+import polars as pl
+import pytest
+
+import query
+from aggregation import ExportOptions, export_columns
+from monte_carlo_simulation import batch_simulation
+from results_store import ResultsStore, scenario_id
+
+TIMESTEPS = 120
+POLICIES = {'ukraine': [.25, .25, .25, .25], 'russia': [.25, .25, .25, .25]}
+
+def interference(aid: float) -> dict:
+    return {'foreign_aid_russia': 0, 'sanctions_ukraine': 0, 'foreign_aid_ukraine': aid, 'sanctions_russia': .14}
+
+@pytest.fixture
+def mixed_store(tmp_path):
+    # one scenario exported weekly in float32 with a single stem, the other daily in float64 with everything
+    store = ResultsStore(str(tmp_path / "results"))
+    for aid, options in ((.2, ExportOptions(7, "mean", "float32", ("russia_gdp",))), (.3, ExportOptions())):
+        aggregate = batch_simulation((TIMESTEPS, interference(aid), POLICIES, 16, np.random.SeedSequence(0), "random"))
+        store.add(aggregate, export_columns(aggregate.columns(), options), interference(aid), POLICIES, export_options=options)
+    store.flush()
+    (tmp_path / "csv").mkdir()
+    return str(tmp_path / "results"), str(tmp_path / "csv")
+
+def test_scan_trajectories_mixes_precisions_and_column_subsets(mixed_store):
+    root, csv_dir = mixed_store
+    trajectories = query.scan_trajectories(root, csv_dir).collect()
+    assert trajectories.schema["russia_gdp"] == pl.Float64
+    assert trajectories["scenario_id"].n_unique() == 2
+
+    subset = trajectories.filter(pl.col("scenario_id") == scenario_id(interference(.2), POLICIES))
+    assert len(subset) == -(-(TIMESTEPS + 1) // 7)
+    assert subset["ukraine_gdp"].null_count() == len(subset)
+    assert subset["russia_gdp"].null_count() == 0
+
+def test_scenario_frames_and_dashboard_for_a_column_subset(mixed_store, monkeypatch):
+    import matplotlib.pyplot as plt
+    import data_analysis as da
+
+    root, csv_dir = mixed_store
+    runs, trajectories = query.scenario_frames(scenario_id(interference(.2), POLICIES), root, csv_dir)
+    assert len(runs) == 16
+    assert "russia_gdp" in trajectories.columns and "ukraine_gdp" not in trajectories.columns
+
+    monkeypatch.setattr(plt, "show", lambda: None)
+    da.plot_dashboard_from_csv(trajectories)
+    titles = [ax.get_title() for ax in plt.gcf().axes]
+    plt.close("all")
+    assert titles[0] == "GDP Over Time"
+    assert titles[1] == "Military Capability Over Time (not exported)"
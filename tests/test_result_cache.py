@@ -0,0 +1,36 @@
+import os
+
+import numpy as np
+
+from monte_carlo_simulation import run_monte_carlo_simulation
+from result_cache import ResultCache
+
+def run(cache_dir: str, **settings):
+    return run_monte_carlo_simulation(8, engine="batch", batch_size=4, seed=3, cache_dir=cache_dir, **settings)
+
+def test_put_get_and_lru_eviction(tmp_path):
+    cache = ResultCache(str(tmp_path), max_bytes=10 ** 9)
+    for key in ("a", "b", "c"):
+        cache.put(key, {"key": key})
+    assert cache.get("a")["aggregate"] == {"key": "a"}
+    assert cache.get("missing") is None
+
+    # "a" was just read, so "b" is the least recently used
+    os.utime(cache.path("b"), (1, 1))
+    cache.max_bytes = sum(entry[3] for entry in cache.entries()) - 1
+    cache.evict()
+    assert {entry[1] for entry in cache.entries()} == {"a", "c"}
+    assert cache.invalidate() == 2
+
+def test_seeded_runs_are_served_from_the_cache_on_any_worker_count(tmp_path, capsys):
+    first = run(str(tmp_path), processes=1)
+    second = run(str(tmp_path), processes=2)
+    assert "Loaded 8 simulations from the result cache" in capsys.readouterr().out
+    assert second.lengths == first.lengths
+    np.testing.assert_array_equal(second.russia.mean, first.russia.mean)
+
+def test_batch_runs_with_a_tolerance_are_keyed_by_worker_count(tmp_path, capsys):
+    run(str(tmp_path), processes=1, tolerance=.5)
+    capsys.readouterr()
+    run(str(tmp_path), processes=2, tolerance=.5)
+    assert "result cache" not in capsys.readouterr().out
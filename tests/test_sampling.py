@@ -0,0 +1,18 @@
+import numpy as np
+import pytest
+
+from sampling import COEFFICIENT_PRIORS, SAMPLERS, sample_coefficients, transform_prior
+
+def test_normal_int_prior_stays_finite_at_the_unit_bounds():
+    delays = transform_prior(COEFFICIENT_PRIORS["sanctions_delay"], np.array([0.0, .5, 1.0]))
+    assert delays[1] == 60
+    # eight to nine standard deviations out, not the int64 minimum an infinite ppf casts to
+    assert -40 < delays[0] < 60 < delays[2] < 160
+
+@pytest.mark.parametrize("sampler", SAMPLERS)
+def test_samplers_stay_within_the_priors(sampler):
+    design = sample_coefficients(64, np.random.default_rng(0), sampler)
+    for name, (distribution, a, b) in COEFFICIENT_PRIORS.items():
+        if distribution == "uniform":
+            values = np.asarray(getattr(design, name))
+            assert values.min() >= a and values.max() <= b
@@ -0,0 +1,56 @@
+import asyncio
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+import simulation_service
+from simulation_service import SimulationService, validate_request, request_key, chunk_schedule
+
+def run_request(request: dict, slow_size: int) -> list[dict]:
+    async def main():
+        service = SimulationService(processes=3)
+        service.pool.shutdown()
+        service.pool = ThreadPoolExecutor(3)
+        scheduler = asyncio.create_task(service.schedule())
+        job, queue = service.subscribe(request)
+        messages = []
+        while not messages or not messages[-1]["done"]:
+            messages.append(await queue.get())
+        scheduler.cancel()
+        service.pool.shutdown()
+        return messages
+
+    simulate = simulation_service.batch_simulation
+
+    def delayed(chunk):
+        # the chunk of slow_size runs finishes last, whatever order the chunks were started in
+        if chunk[3] == slow_size:
+            time.sleep(.5)
+        return simulate(chunk)
+
+    with pytest.MonkeyPatch.context() as patch:
+        patch.setattr(simulation_service, "TIMESTEPS", 100)
+        patch.setattr(simulation_service, "batch_simulation", delayed)
+        return asyncio.run(main())
+
+def test_chunk_schedule_starts_small_and_covers_the_request():
+    assert chunk_schedule(1000) == [64, 128, 256, 512, 40]
+    assert chunk_schedule(10) == [10]
+
+def test_seeded_request_with_tolerance_stops_at_the_same_runs_whatever_finishes_first():
+    request = validate_request({"num_simulations": 448, "seed": 7, "tolerance": .1, "length_tolerance": 30})
+    in_order = run_request(request, slow_size=256)
+    out_of_order = run_request(request, slow_size=64)
+    assert in_order[-1]["done"] and out_of_order[-1]["done"]
+    assert [message["runs"] for message in in_order] == [message["runs"] for message in out_of_order]
+    assert in_order[-1] == out_of_order[-1]
+
+def test_requests_are_validated_and_keyed_by_everything_they_return():
+    request = validate_request({"num_simulations": "100"})
+    assert request["num_simulations"] == 100
+    with pytest.raises(ValueError):
+        validate_request({"num_simulations": 100.5})
+    with pytest.raises(ValueError):
+        validate_request({"trajectories": ["typo"]})
+    assert request_key(request) != request_key({**request, "trajectories": ["russia_gdp"]})
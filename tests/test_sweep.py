@@ -0,0 +1,62 @@
+import os
+
+import numpy as np
+
+from monte_carlo_simulation import simulate_chunk
+from run_full_simulation_space import create_manifest, save_manifest, load_manifest, run_simulation_sweep, pending_scenarios
+
+def small_manifest(**settings) -> dict:
+    manifest = create_manifest(4, 2, timesteps=60, seed=0, **settings)
+    manifest["scenarios"] = manifest["scenarios"][:3]
+    return manifest
+
+def read_outputs(manifest: dict) -> list[bytes]:
+    outputs = []
+    for scenario in manifest["scenarios"]:
+        with open(scenario["output"], "rb") as f:
+            outputs.append(f.read())
+    return outputs
+
+def test_resumed_sweep_skips_finished_scenarios_and_matches_a_full_one(tmp_path, monkeypatch, capsys):
+    monkeypatch.chdir(tmp_path)
+    os.makedirs("data")
+    manifest = small_manifest()
+    save_manifest(manifest, "manifest.json")
+    run_simulation_sweep(manifest, "manifest.json", processes=1, indices=[0])
+    assert pending_scenarios(load_manifest("manifest.json")) == [1, 2]
+    finished = os.path.getmtime(manifest["scenarios"][0]["output"])
+
+    resumed = load_manifest("manifest.json")
+    capsys.readouterr()
+    run_simulation_sweep(resumed, "manifest.json", processes=1)
+    assert "1 of 3 scenarios already complete" in capsys.readouterr().out
+    assert os.path.getmtime(manifest["scenarios"][0]["output"]) == finished
+    assert pending_scenarios(load_manifest("manifest.json")) == []
+    partial = read_outputs(resumed)
+
+    full = small_manifest()
+    save_manifest(full, "manifest.json")
+    run_simulation_sweep(full, "manifest.json", processes=1)
+    assert read_outputs(full) == partial
+
+def test_history_dtype_reaches_the_sweep_chunks(monkeypatch):
+    import monte_carlo_simulation
+
+    manifest = small_manifest(history_dtype="float32")
+    assert manifest["history_dtype"] == "float32"
+    scenario = manifest["scenarios"][0]
+    simulate = monte_carlo_simulation.individual_simulation
+    dtypes = []
+
+    def recording(args):
+        dtypes.append(args[-1])
+        return simulate(args)
+
+    monkeypatch.setattr(monte_carlo_simulation, "individual_simulation", recording)
+    results = [
+        simulate_chunk((0, 200, scenario["international_interference"], scenario["investment_policies"], 4, "object", np.random.SeedSequence(1), "random", dtype))[1]
+        for dtype in ("float64", "float32")
+    ]
+    assert dtypes == ["float64"] * 4 + ["float32"] * 4
+    assert results[0].lengths == results[1].lengths
+    np.testing.assert_allclose(results[0].russia.mean, results[1].russia.mean, rtol=1e-6)